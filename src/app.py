@@ -8,33 +8,70 @@ if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 # -----------------------------------------------------------
 
-IMG_EXT = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
-AUD_EXT = (".mp3", ".wav", ".m4a")
-VID_EXT = (".mp4", ".mov", ".mkv")
-
-def _is_image(meta: dict) -> bool:
-    return str(meta.get("path", "")).lower().endswith(IMG_EXT)
-
-def _is_audio(meta: dict) -> bool:
-    return str(meta.get("path", "")).lower().endswith(AUD_EXT)
-
-def _is_video(meta: dict) -> bool:
-    return str(meta.get("path", "")).lower().endswith(VID_EXT)
-
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
 import streamlit as st
 
-from src.ingest import ingest_path, extract_any, ingest_youtube
-from src.retriever import ask
+from src import jobs
+from src.retriever import ask_stream
 from src.utils import UPLOAD_DIR
 
 Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
+PREVIEW_CHARS = 200
+
+@st.cache_resource(show_spinner="Loading index and models...")
+def _warm() -> bool:
+    """Open the store and load the embedder / reranker once per server, not once per rerun."""
+    from src import indexer, rerank
+    try:
+        indexer.warm()
+        rerank.preload()
+    except Exception as e:
+        print(f"[App] warm-up failed: {e}")
+    return True
+
+@st.cache_resource
+def _job_workers() -> bool:
+    """Background ingestion workers, started once per server and shared by every session."""
+    jobs.start_workers()
+    return True
+
+@st.fragment(run_every=2)
+def _queue_view():
+    """Recent ingestion jobs with progress; refreshes itself while the rest of the page stays put."""
+    recent = jobs.list_jobs(limit=10)
+    if not recent:
+        st.caption("No ingestion jobs yet.")
+    for job in recent:
+        name = Path(job["target"]).name if job["kind"] == "path" else job["target"]
+        st.markdown(f"**#{job['id']}** `{name}` — {job['status']}")
+        if job["status"] in ("pending", "running"):
+            st.progress(min(1.0, job["progress"] or 0.0), text=job.get("message") or "")
+            if not job["cancel"] and st.button("Cancel", key=f"cancel-{job['id']}"):
+                jobs.cancel(job["id"])
+        elif job.get("message"):
+            st.caption(job["message"])
+        preview = (job.get("result") or {}).get("preview")
+        if preview:
+            st.caption(f"Extracted preview: {preview}")
+
+def _write_stream(pieces):
+    """st.write_stream on current Streamlit, a growing placeholder on older versions."""
+    if hasattr(st, "write_stream"):
+        return st.write_stream(pieces)
+    box, text = st.empty(), ""
+    for piece in pieces:
+        text += piece
+        box.markdown(text)
+    return text
 
 # ---------------- UI ----------------
 st.set_page_config(page_title="Multimodal RAG", layout="wide")
 st.title("📚 Multimodal Data Processing System")
+_warm()
+_job_workers()
+submitted = st.session_state.setdefault("submitted", {})   # (name, size) -> job id
 
 with st.sidebar:
     st.header("Upload / Ingest")
@@ -45,36 +82,37 @@ with st.sidebar:
     if up:
         for f in up:
             safe_name = os.path.basename(f.name).replace("\\", "_").replace("/", "_")
-            dest = Path(UPLOAD_DIR) / safe_name
-
-            with open(dest, "wb") as out:
-                out.write(f.getbuffer())
-            st.caption(f"Saved to: {dest}")
-
-            with st.spinner(f"Previewing extraction for {safe_name}..."):
+            key = (safe_name, f.size)
+            # the uploader keeps its files across reruns: queue each upload once
+            if key not in submitted:
+                dest = Path(UPLOAD_DIR) / safe_name
+                with open(dest, "wb") as out:
+                    out.write(f.getbuffer())
                 try:
-                    preview = extract_any(str(dest))
+                    submitted[key] = jobs.submit("path", str(dest), preview=PREVIEW_CHARS)["id"]
                 except Exception as e:
-                    preview = f"[Error extracting: {e}]"
-                st.write("Extracted preview:", (str(preview)[:200] if preview else "[empty]"))
-
-            with st.spinner(f"Indexing {safe_name}..."):
-                try:
-                    ingest_stats = ingest_path(str(dest))
-                    st.success(f"Ingested: {ingest_stats}")
-                except Exception as e:
-                    st.error(f"Indexing failed: {e}")
+                    st.error(f"Could not queue {safe_name}: {e}")
+                    continue
+            st.caption(f"{safe_name}: ingest job #{submitted[key]}")
 
     st.divider()
     st.subheader("Ingest YouTube (audio only)")
     yt_url = st.text_input("Paste a YouTube URL")
     if st.button("Ingest YouTube") and yt_url:
-        with st.spinner("Downloading & transcribing..."):
-            try:
-                stats = ingest_youtube(yt_url.strip())
-                st.success(f"Ingested: {stats}")
-            except Exception as e:
-                st.error(f"YouTube ingest failed: {e}")
+        try:
+            job = jobs.submit("youtube", yt_url.strip())
+            st.success(f"{'Already queued' if job.get('deduped') else 'Queued'} as job #{job['id']}")
+        except Exception as e:
+            st.error(f"YouTube ingest failed: {e}")
+
+    st.divider()
+    with st.expander("Ingestion queue", expanded=True):
+        _queue_view()
+
+    st.divider()
+    with st.expander("Cache stats"):
+        from src import query_cache, rerank
+        st.json({**query_cache.stats(), "rerank": rerank.stats()})
 
 st.divider()
 st.subheader("Scope")
@@ -115,38 +153,18 @@ if ask_clicked and q:
     elif scope == "Only video":
         where = {"type": "video"}
     elif scope == "Only this filename…" and selected_file:
-        where = {"path_contains": selected_file}
+        where = {"name": selected_file}
 
-    with st.spinner("Thinking..."):
+    # the scope is applied by the retriever, so the contexts shown are the ones the answer uses
+    with st.spinner("Retrieving..."):
         try:
-            res = ask(q, where=where)  
+            res = ask_stream(q, where=where)
         except Exception as e:
-            res = {"answer": f"[Error generating answer: {e}]", "contexts": []}
+            res = {"contexts": [], "error": f"[Error retrieving context: {e}]"}
 
     ctxs = res.get("contexts", []) or []
-    if scope == "Only images":
-        ctxs = [(d, m) for (d, m) in ctxs if isinstance(m, dict) and _is_image(m)]
-    elif scope == "Only audio":
-        ctxs = [(d, m) for (d, m) in ctxs if isinstance(m, dict) and _is_audio(m)]
-    elif scope == "Only video":
-        ctxs = [(d, m) for (d, m) in ctxs if isinstance(m, dict) and _is_video(m)]
-    elif scope == "Only this filename…" and selected_file:
-        ctxs = [(d, m) for (d, m) in ctxs if isinstance(m, dict) and selected_file.lower() in str(m.get("path", "")).lower()]
-
-    if ctxs:
-        filtered_context = "\n\n".join(str(d) for d, _ in ctxs)
-        from src.llm import chat_rag
-        try:
-            res["answer"] = chat_rag(q, filtered_context)
-        except Exception as e:
-            res["answer"] = f"[Error generating answer: {e}]"
-    else:
-        res["answer"] = "No relevant context found."
-
-    # Render
-    st.subheader("Answer")
-    st.write(res.get("answer", ""))
 
+    # Render: sources first, then the answer as it is generated
     with st.expander("Show retrieved chunks"):
         if not ctxs:
             st.write("No context retrieved.")
@@ -155,3 +173,14 @@ if ask_clicked and q:
                 src = (meta or {}).get("url") or (meta or {}).get("path", "")
                 st.markdown(f"**Chunk {i}** — `{src}`")
                 st.write(doc)
+
+    st.subheader("Answer")
+    if res.get("error"):
+        st.write(res["error"])
+    elif ctxs:
+        try:
+            _write_stream(res["stream"])
+        except Exception as e:
+            st.write(f"[Error generating answer: {e}]")
+    else:
+        st.write("No relevant context found.")
@@ -0,0 +1,71 @@
+"""
+Import-time benchmark: imports each entry module in a fresh interpreter, reports the
+cumulative import time (python -X importtime) and fails when a module exceeds its budget
+or pulls in a heavy library it should only load on first use.
+
+    python -m src.bench_imports [--runs 5] [--json]
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from statistics import median
+from typing import Dict, List
+
+BUDGET_SCALE = float(os.getenv("IMPORT_BUDGET_SCALE", 1.0))   # >1 on slow CI machines
+
+# module -> (budget in ms, libraries it must not import)
+CHECKS: Dict[str, tuple] = {
+    "src.cli": (50, ("chromadb", "numpy", "PIL", "pytesseract", "yt_dlp", "faster_whisper", "sentence_transformers")),
+    "src.ingest": (150, ("chromadb", "PIL", "pytesseract", "yt_dlp", "faster_whisper", "sentence_transformers")),
+    "src.indexer": (150, ("chromadb", "PIL", "pytesseract", "yt_dlp", "faster_whisper", "sentence_transformers")),
+    "src.retriever": (300, ("chromadb", "PIL", "pytesseract", "yt_dlp", "faster_whisper", "sentence_transformers")),
+}
+
+_PROBE = "import sys, json; import {m}; print(json.dumps(sorted(sys.modules)))"
+
+def measure(module: str) -> Dict:
+    """One cold import of `module` in a child interpreter: total ms and loaded top-level packages."""
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE.format(m=module)],
+                         capture_output=True, text=True)
+    if res.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{res.stderr[-2000:]}")
+    total = 0
+    for line in res.stderr.splitlines():
+        parts = line.split("|")
+        # "import time: self | cumulative | name" -- the top-level row has no indent
+        if len(parts) == 3 and parts[2].strip() == module and not parts[2][1:].startswith(" "):
+            total = int(parts[1])
+    loaded = json.loads(res.stdout.strip().splitlines()[-1])
+    return {"ms": total / 1000.0, "modules": {m.split(".")[0] for m in loaded}}
+
+def run(runs: int = 5) -> List[Dict]:
+    out = []
+    for module, (budget, banned) in CHECKS.items():
+        samples = [measure(module) for _ in range(max(1, runs))]
+        ms = median(s["ms"] for s in samples)
+        heavy = sorted(set(banned) & samples[0]["modules"])
+        limit = budget * BUDGET_SCALE
+        out.append({"module": module, "ms": round(ms, 1), "budget_ms": limit, "heavy_imports": heavy,
+                    "ok": ms <= limit and not heavy})
+    return out
+
+def main():
+    p = argparse.ArgumentParser(prog="bench-imports")
+    p.add_argument("--runs", type=int, default=5, help="Cold imports per module (median is reported)")
+    p.add_argument("--json", action="store_true")
+    args = p.parse_args()
+
+    results = run(args.runs)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            flag = "ok  " if r["ok"] else "FAIL"
+            extra = f"  loads {', '.join(r['heavy_imports'])}" if r["heavy_imports"] else ""
+            print(f"{flag} {r['module']:<16} {r['ms']:>7.1f} ms  (budget {r['budget_ms']:.0f}){extra}")
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+import re
+from typing import List, Tuple
+
+# modes: "structure" packs whole sentences/lines up to CHUNK_SIZE characters and never
+# crosses a "[Slide N]" marker; "tokens" does the same against a CHUNK_TOKENS budget;
+# "fixed" is the original CHUNK_SIZE/CHUNK_OVERLAP character window.
+CHUNK_MODE = os.getenv("CHUNK_MODE", "structure").lower()
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 800))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 120))
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 200))
+CHUNK_OVERLAP_UNITS = int(os.getenv("CHUNK_OVERLAP_UNITS", 0))
+
+_LINE = re.compile(r"[^\n]+")
+_SENT = re.compile(r"\S.*?(?:[.!?]+(?=\s|$)|$)")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_SLIDE = re.compile(r"\[Slide \d+\]")
+
+def count_tokens(text: str) -> int:
+    """Cheap, tokenizer-free token estimate (words and punctuation marks)."""
+    return len(_TOKEN.findall(text or ""))
+
+def settings() -> dict:
+    return {"mode": CHUNK_MODE, "size": CHUNK_SIZE, "overlap": CHUNK_OVERLAP,
+            "tokens": CHUNK_TOKENS, "overlap_units": CHUNK_OVERLAP_UNITS}
+
+def _fixed(n: int, size: int, overlap: int) -> List[Tuple[int, int]]:
+    out, i = [], 0
+    step = max(1, size - overlap)
+    while i < n:
+        out.append((i, min(n, i + size)))
+        i += step
+    return out
+
+def _units(text: str) -> List[Tuple[int, int, bool]]:
+    """(start, end, hard_break_before) for every sentence, in one pass over the text."""
+    out = []
+    for line in _LINE.finditer(text):
+        base, s = line.start(), line.group()
+        hard = bool(_SLIDE.fullmatch(s.strip()))
+        for m in _SENT.finditer(s):
+            end = base + m.start() + len(m.group().rstrip())
+            out.append((base + m.start(), end, hard))
+            hard = False
+    return out
+
+def _split_long(text: str, start: int, end: int, budget: int, by_tokens: bool) -> List[Tuple[int, int]]:
+    """Break one oversized sentence at word boundaries."""
+    out = []
+    if by_tokens:
+        toks = [m.span() for m in _TOKEN.finditer(text, start, end)]
+        for i in range(0, len(toks), budget):
+            part = toks[i:i + budget]
+            out.append((part[0][0], part[-1][1]))
+        return out
+    i = start
+    while i < end:
+        j = min(end, i + budget)
+        if j < end:
+            cut = text.rfind(" ", i + budget // 2, j)
+            j = cut if cut > i else j
+        out.append((i, j))
+        i = j
+        while i < end and text[i].isspace():
+            i += 1
+    return out
+
+def chunk_spans(text: str, mode: str = None) -> List[Tuple[int, int]]:
+    """(start, end) character offsets of each chunk of `text`."""
+    text = text or ""
+    if not text:
+        return []
+    mode = (mode or CHUNK_MODE).lower()
+    if mode == "fixed":
+        return _fixed(len(text), CHUNK_SIZE, CHUNK_OVERLAP)
+
+    by_tokens = mode == "tokens"
+    budget = max(1, CHUNK_TOKENS if by_tokens else CHUNK_SIZE)
+    units = _units(text)
+    sizes = [count_tokens(text[a:b]) if by_tokens else b - a for a, b, _ in units]
+
+    out: List[Tuple[int, int]] = []
+    cur: List[int] = []   # indices into units
+    cur_size = 0
+
+    def size_with(i: int) -> int:
+        if by_tokens:
+            return cur_size + sizes[i]
+        return units[i][1] - units[cur[0]][0] if cur else sizes[i]
+
+    def flush():
+        nonlocal cur, cur_size
+        if not cur:
+            return
+        out.append((units[cur[0]][0], units[cur[-1]][1]))
+        keep = cur[-CHUNK_OVERLAP_UNITS:] if CHUNK_OVERLAP_UNITS > 0 else []
+        if keep and sum(sizes[k] for k in keep) > budget // 2:
+            keep = []
+        cur = keep
+        cur_size = sum(sizes[k] for k in keep) if by_tokens else 0
+
+    for i, (a, b, hard) in enumerate(units):
+        if sizes[i] > budget:
+            # a lone "[Slide N]" marker is not a chunk of its own: it leads the first piece
+            lead = cur[0] if len(cur) == 1 and units[cur[0]][2] and not hard else None
+            room = budget - (sizes[lead] if by_tokens else a - units[lead][0]) if lead is not None else 0
+            if lead is None or room < 1:
+                flush()
+                lead = None
+            cur, cur_size = [], 0
+            if lead is not None:
+                first = _split_long(text, a, b, room, by_tokens)[0]
+                out.append((units[lead][0], first[1]))
+                a = first[1]
+                while a < b and text[a].isspace():
+                    a += 1
+            if a < b:
+                out.extend(_split_long(text, a, b, budget, by_tokens))
+            continue
+        if hard:
+            flush()
+            cur, cur_size = [], 0
+        if cur and size_with(i) > budget:
+            flush()
+            if cur and size_with(i) > budget:
+                cur, cur_size = [], 0
+        new_size = size_with(i)
+        cur.append(i)
+        cur_size = new_size
+    flush()
+    return out
@@ -3,18 +3,45 @@ import json
 import sys
 from pathlib import Path
 
-from src.ingest import ingest_path, ingest_youtube
-from src.retriever import ask
-
 def _print_json(obj):
     print(json.dumps(obj, ensure_ascii=False, indent=2))
 
+def _print_progress(done, total, res):
+    status = res.get("skipped") or f"{res.get('added_chunks', 0)} chunks"
+    print(f"[Ingest] {done}/{total} {res.get('path')} ({status})", file=sys.stderr, flush=True)
+
+def _source(meta: dict) -> str:
+    """Where a chunk came from: path or URL plus page / timestamp when known."""
+    src = meta.get("url") or meta.get("path", "")
+    if meta.get("page_start") is not None:
+        src += f" p.{meta['page_start']}" + (f"-{meta['page_end']}" if meta.get("page_end") != meta["page_start"] else "")
+    elif meta.get("t_start") is not None:
+        src += f" @{float(meta['t_start']):.0f}s"
+    return src
+
+def _read_questions(lines):
+    """Yield question items from JSONL lines; non-JSON lines are taken as plain questions."""
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield {"error": f"invalid JSON on line {n}: {e}"}
+        else:
+            yield line
+
 def main():
     p = argparse.ArgumentParser(prog="multimodal-rag")
     sub = p.add_subparsers(dest="cmd", required=True)
 
     p_ing = sub.add_parser("ingest", help="Ingest a file or folder")
     p_ing.add_argument("path", help="File or directory to ingest")
+    p_ing.add_argument("--force", action="store_true", help="Re-index files the manifest marks as unchanged")
+    p_ing.add_argument("--workers", type=int, default=1,
+                       help="Parallel extraction processes for folders (1 = serial)")
 
     p_yti = sub.add_parser("ingest-yt", help="Ingest a YouTube URL (audio transcript)")
     p_yti.add_argument("url", help="YouTube URL")
@@ -25,20 +52,121 @@ def main():
     p_ask.add_argument("--only", choices=["all","audio","video","images","youtube"], default="all")
     p_ask.add_argument("--file", help="Restrict to filename substring")
     p_ask.add_argument("--url_contains", help="Restrict to URL substring")
+    p_ask.add_argument("--name", help="Restrict to an exact filename")
+    p_ask.add_argument("--ext", help="Restrict to a file extension, e.g. .pdf")
+    p_ask.add_argument("--dir", help="Restrict to files directly in this directory")
+    p_ask.add_argument("--url_host", help="Restrict to a URL host, e.g. youtube.com")
+    p_ask.add_argument("--stream", action="store_true",
+                       help="List the retrieved sources, then print the answer as it is generated")
+
+    p_ab = sub.add_parser("ask-batch", help="Answer many questions, one JSON result per line")
+    p_ab.add_argument("input", nargs="?", default="-",
+                      help='JSONL file ({"question": ..., "id"?, "top_k"?, "where"?} or plain text per line); - = stdin')
+    p_ab.add_argument("--top_k", type=int, default=6)
+    p_ab.add_argument("--concurrency", type=int, help="LLM calls in flight (default ASK_CONCURRENCY)")
+    p_ab.add_argument("--batch", type=int, help="Questions embedded and queried together (default ASK_BATCH)")
+
+    sub.add_parser("stats", help="Show embedding/query cache and rerank statistics")
+
+    p_srv = sub.add_parser("serve", help="Run the HTTP/JSON query server with models kept warm")
+    p_srv.add_argument("--host", help="Bind address (default SERVER_HOST or 127.0.0.1)")
+    p_srv.add_argument("--port", type=int, help="Port (default SERVER_PORT or 8765)")
+
+    p_jobs = sub.add_parser("jobs", help="Background ingestion queue shared with the app")
+    jobs_sub = p_jobs.add_subparsers(dest="jobs_cmd", required=True)
+    p_js = jobs_sub.add_parser("submit", help="Queue a file, folder or YouTube URL for ingestion")
+    p_js.add_argument("target", help="File, directory or YouTube URL")
+    p_js.add_argument("--force", action="store_true", help="Re-index files the manifest marks as unchanged")
+    p_js.add_argument("--workers", type=int, default=1, help="Parallel extraction processes for folders")
+    p_js.add_argument("--wait", action="store_true", help="Process the queue in this process until it is empty")
+    p_jl = jobs_sub.add_parser("list", help="Show queued, running and recent jobs")
+    p_jl.add_argument("--status", help="Only these statuses, e.g. pending,running")
+    p_jl.add_argument("--limit", type=int, default=20)
+    p_jc = jobs_sub.add_parser("cancel", help="Cancel a pending job, or stop a running one after its current file")
+    p_jc.add_argument("id", type=int)
+    p_jw = jobs_sub.add_parser("work", help="Run queue workers (Ctrl+C stops after the current jobs)")
+    p_jw.add_argument("--threads", type=int, help="Worker threads (default JOBS_WORKERS)")
+    p_jw.add_argument("--until-idle", action="store_true", help="Exit once the queue is empty")
+
+    p_tr = sub.add_parser("index-train", help="Train the IVF-PQ index from the stored vectors (VECTOR_BACKEND=ivfpq)")
+    p_tr.add_argument("--nlist", type=int, help="Number of IVF lists (default: about 4*sqrt(n))")
+    p_tr.add_argument("--m", type=int, help="PQ sub-quantizers, i.e. bytes per vector")
+    p_tr.add_argument("--sample", type=int, help="Vectors used for training")
 
     args = p.parse_args()
 
+    # subsystems are imported per command so e.g. `ask` never loads the extractors
     if args.cmd == "ingest":
-        res = ingest_path(args.path)
+        from src.ingest import ingest_path
+        res = ingest_path(args.path, force=args.force, workers=args.workers, progress=_print_progress)
         _print_json(res)
         return
 
     if args.cmd == "ingest-yt":
+        from src.ingest import ingest_youtube
         res = ingest_youtube(args.url)
         _print_json(res)
         return
 
+    if args.cmd == "ask-batch":
+        from src.retriever import ask_many
+        kw = {k: getattr(args, k) for k in ("concurrency", "batch") if getattr(args, k)}
+        f = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+        try:
+            for res in ask_many(_read_questions(f), top_k=args.top_k, **kw):
+                print(json.dumps(res, ensure_ascii=False), flush=True)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+        return
+
+    if args.cmd == "serve":
+        from src import server
+        server.serve(args.host or server.SERVER_HOST, args.port or server.SERVER_PORT)
+        return
+
+    if args.cmd == "jobs":
+        from src import jobs
+        if args.jobs_cmd == "submit":
+            kind = "youtube" if args.target.startswith(("http://", "https://")) else "path"
+            opts = {"force": args.force, "workers": args.workers} if kind == "path" else {}
+            _print_json(jobs.submit(kind, args.target, **opts))
+            if args.wait:
+                jobs.work(until_idle=True)
+        elif args.jobs_cmd == "list":
+            for job in jobs.list_jobs(args.status, args.limit):
+                print(f"#{job['id']:<5} {job['status']:<9} {job['progress'] * 100:5.1f}%  {job['kind']:<7} "
+                      f"{job['target']}" + (f"  ({job['message']})" if job.get("message") else ""))
+        elif args.jobs_cmd == "cancel":
+            job = jobs.cancel(args.id)
+            if job is None:
+                print(f"no job #{args.id}", file=sys.stderr)
+                sys.exit(1)
+            _print_json({k: v for k, v in job.items() if k != "result"})
+        elif args.jobs_cmd == "work":
+            jobs.work(args.threads or jobs.JOBS_WORKERS, until_idle=args.until_idle)
+        return
+
+    if args.cmd == "stats":
+        from src import embed_cache, query_cache, rerank
+        _print_json({"embedding_cache": embed_cache.stats(), "query_cache": query_cache.stats(),
+                     "rerank": rerank.stats()})
+        return
+
+    if args.cmd == "index-train":
+        from src.indexer import get_collection
+        collection = get_collection()
+        if not hasattr(collection, "train"):
+            print("index-train needs VECTOR_BACKEND=ivfpq", file=sys.stderr)
+            sys.exit(2)
+        kw = {"sample": args.sample} if args.sample else {}
+        res = collection.train(nlist=args.nlist, m=args.m, **kw)
+        res["recall@10"] = round(collection.recall(), 3)
+        _print_json(res)
+        return
+
     if args.cmd == "ask":
+        from src.retriever import ask, ask_stream
         where = None
         if args.only == "youtube":
             where = {"source": "youtube"}
@@ -52,6 +180,19 @@ def main():
             where = (where or {}) | {"path_contains": args.file}
         if args.url_contains:
             where = (where or {}) | {"url_contains": args.url_contains}
+        for key in ("name", "ext", "dir", "url_host"):
+            if getattr(args, key):
+                where = (where or {}) | {key: getattr(args, key)}
+
+        if args.stream:
+            res = ask_stream(args.question, top_k=args.top_k, where=where)
+            for i, (_, meta) in enumerate(res["contexts"], 1):
+                print(f"[{i}] {_source(meta or {})}")
+            print(flush=True)
+            for piece in res["stream"]:
+                print(piece, end="", flush=True)
+            print()
+            return
 
         res = ask(args.question, top_k=args.top_k, where=where)
         _print_json(res)
@@ -0,0 +1,149 @@
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.chunking import count_tokens
+
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", 1500))        # 0 = no budget
+MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", 0.7))        # 1 = relevance only
+DUP_SIM = float(os.getenv("CONTEXT_DUP_SIM", 0.95))             # drop hits this similar to a chosen one
+
+_WORD = re.compile(r"\w+")
+
+def _shingles(text: str) -> set:
+    w = _WORD.findall((text or "").lower())
+    return {tuple(w[i:i + 3]) for i in range(max(1, len(w) - 2))}
+
+def _doc_key(meta: Dict):
+    return meta.get("doc_id") or meta.get("path") or meta.get("url")
+
+def _similarity(i: int, j: int, vecs: List[Optional[np.ndarray]], shingles: List[set]) -> float:
+    """Cosine of the stored embeddings when both exist, word-trigram Jaccard otherwise."""
+    if vecs[i] is not None and vecs[j] is not None:
+        return float(vecs[i] @ vecs[j])
+    a, b = shingles[i], shingles[j]
+    return len(a & b) / float(len(a | b) or 1)
+
+def _mmr(hits: List[Tuple[str, Dict]], vecs: List[Optional[np.ndarray]], k: int) -> List[int]:
+    """
+    Maximal marginal relevance over the incoming ranking. Relevance is the rank itself
+    (the order already reflects fusion / reranking); redundancy is the similarity to
+    the hits picked so far. Near-duplicates (>= DUP_SIM) are dropped outright.
+    """
+    n = len(hits)
+    rel = [1.0 - i / float(n) for i in range(n)]
+    shingles = [_shingles(d) for d, _ in hits]
+    chosen: List[int] = []
+    left = list(range(n))
+    while left and len(chosen) < k:
+        best, best_score = None, None
+        for i in list(left):
+            red = max((_similarity(i, j, vecs, shingles) for j in chosen), default=0.0)
+            if red >= DUP_SIM:
+                left.remove(i)
+                continue
+            score = MMR_LAMBDA * rel[i] - (1 - MMR_LAMBDA) * red
+            if best_score is None or score > best_score:
+                best, best_score = i, score
+        if best is None:
+            break
+        chosen.append(best)
+        left.remove(best)
+    return chosen
+
+def _overlap(a: str, b: str, limit: int = 400) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b` (chunk window overlap)."""
+    for n in range(min(len(a), len(b), limit), 0, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+def _join(prev: Tuple[str, Dict], nxt: Tuple[str, Dict]) -> Optional[Tuple[str, Dict]]:
+    """Merge two hits of one document if they overlap or touch; None otherwise."""
+    (da, ma), (db, mb) = prev, nxt
+    if ma.get("char_end") is not None and mb.get("char_start") is not None:
+        gap = mb["char_start"] - ma["char_end"]
+        if gap > 3:   # more than the whitespace between two sentences
+            return None
+        text = da + (" " if gap > 0 else "") + db[max(0, -gap):]
+    elif ma.get("chunk") is not None and mb.get("chunk") == ma["chunk"] + 1:
+        text = da + db[_overlap(da, db):]
+    else:
+        return None
+    meta = dict(ma)
+    for k, v in mb.items():
+        if k.endswith("_end") and k in meta and v is not None:
+            meta[k] = max(meta[k], v)
+        elif k not in meta:
+            meta[k] = v
+    return text, meta
+
+def _order_key(meta: Dict):
+    return (meta.get("char_start") if meta.get("char_start") is not None else -1,
+            meta.get("chunk") if meta.get("chunk") is not None else -1)
+
+def _merge_adjacent(hits: List[Tuple[str, Dict]]) -> List[Tuple[str, Dict]]:
+    """Collapse overlapping / neighbouring chunks of the same document; groups keep their best rank."""
+    groups: Dict = {}
+    for rank, (d, m) in enumerate(hits):
+        groups.setdefault(_doc_key(m) or ("hit", rank), []).append((rank, d, m))
+    merged: List[Tuple[int, str, Dict]] = []
+    for items in groups.values():
+        items.sort(key=lambda x: _order_key(x[2]))
+        cur_rank, cur = items[0][0], (items[0][1], items[0][2])
+        for rank, d, m in items[1:]:
+            joined = _join(cur, (d, m))
+            if joined is None:
+                merged.append((cur_rank, *cur))
+                cur_rank, cur = rank, (d, m)
+            else:
+                cur_rank, cur = min(cur_rank, rank), joined
+        merged.append((cur_rank, *cur))
+    merged.sort(key=lambda x: x[0])
+    return [(d, m) for _, d, m in merged]
+
+def _truncate(text: str, tokens: int) -> str:
+    words = text.split(" ")
+    out, used = [], 0
+    for w in words:
+        used += count_tokens(w)
+        if used > tokens:
+            break
+        out.append(w)
+    return " ".join(out).rstrip() + " …"
+
+def build_context(hits: List[Tuple[str, Dict]], k: int,
+                  vectors: Optional[Sequence[Optional[Sequence[float]]]] = None,
+                  budget: int = CONTEXT_TOKENS) -> Tuple[str, List[Tuple[str, Dict]]]:
+    """
+    Pack ranked hits into a prompt context: pick up to k diverse, non-duplicate hits (MMR),
+    merge neighbouring chunks of one document, and fill at most `budget` tokens.
+    `vectors` are the hits' stored embeddings (None where unknown).
+    Returns (context, hits actually used).
+    """
+    vectors = list(vectors) if vectors is not None else [None] * len(hits)
+    pairs = [((d, m or {}), v) for (d, m), v in zip(hits, vectors) if d]
+    if not pairs:
+        return "", []
+    hits = [h for h, _ in pairs]
+    vecs: List[Optional[np.ndarray]] = []
+    for _, v in pairs:
+        v = None if v is None else np.asarray(v, dtype=np.float32)
+        norm = 0.0 if v is None else float(np.linalg.norm(v))
+        vecs.append(v / norm if norm else None)
+
+    picked = [hits[i] for i in _mmr(hits, vecs, max(1, k))]
+    used: List[Tuple[str, Dict]] = []
+    total = 0
+    for d, m in _merge_adjacent(picked):
+        n = count_tokens(d)
+        if budget > 0 and total + n > budget:
+            if not used:
+                used.append((_truncate(d, budget), m))
+                total = budget
+            continue
+        used.append((d, m))
+        total += n
+    return "\n\n".join(d for d, _ in used), used
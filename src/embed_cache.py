@@ -0,0 +1,151 @@
+import os
+import time
+import hashlib
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+from src.utils import PROJECT_ROOT, connect_sqlite
+
+CACHE_PATH = os.getenv("EMBED_CACHE_PATH", str(PROJECT_ROOT / "data" / "embed_cache.sqlite3"))
+CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", 512))
+CACHE_DTYPE = np.float16 if os.getenv("EMBED_CACHE_DTYPE", "float32").lower() == "float16" else np.float32
+
+_conn = None
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+def enabled() -> bool:
+    return os.getenv("EMBED_CACHE", "1").lower() not in ("0", "false", "no", "off")
+
+def _db():
+    global _conn
+    if _conn is None:
+        _conn = connect_sqlite(CACHE_PATH)
+        _conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                dtype TEXT NOT NULL,
+                vec BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (provider, model, task_type, text_hash)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_access);
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO counters VALUES ('bytes', 0), ('hits', 0), ('misses', 0);
+            """
+        )
+        _conn.commit()
+    return _conn
+
+def _hash(text: str) -> bytes:
+    return hashlib.sha256((text or "").encode("utf-8")).digest()
+
+def get_many(provider: str, model: str, task_type: str, texts: List[str]) -> Dict[int, List[float]]:
+    """Look up cached vectors; returns {index_in_texts: vector} for the hits only."""
+    if not texts:
+        return {}
+    hashes = [_hash(t) for t in texts]
+    found: Dict[bytes, List[float]] = {}
+    uniq = list(set(hashes))
+    with _lock:
+        conn = _db()
+        for i in range(0, len(uniq), 500):
+            part = uniq[i:i + 500]
+            marks = ",".join("?" * len(part))
+            rows = conn.execute(
+                f"SELECT text_hash, dtype, vec FROM embeddings "
+                f"WHERE provider = ? AND model = ? AND task_type = ? AND text_hash IN ({marks})",
+                (provider, model, task_type, *part),
+            ).fetchall()
+            for h, dtype, vec in rows:
+                found[bytes(h)] = np.frombuffer(vec, dtype=dtype).astype(np.float32).tolist()
+
+        hits = {i: found[h] for i, h in enumerate(hashes) if h in found}
+        n_hit, n_miss = len(hits), len(texts) - len(hits)
+        _counters["hits"] += n_hit
+        _counters["misses"] += n_miss
+        with conn:
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_access = ? "
+                    "WHERE provider = ? AND model = ? AND task_type = ? AND text_hash = ?",
+                    [(now, provider, model, task_type, h) for h in found],
+                )
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'hits'", (n_hit,))
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'misses'", (n_miss,))
+    return hits
+
+def put_many(provider: str, model: str, task_type: str, texts: List[str], vectors: List[List[float]]) -> None:
+    if not texts or len(texts) != len(vectors):
+        return
+    now = time.time()
+    dtype = np.dtype(CACHE_DTYPE).name
+    rows = {}
+    for t, v in zip(texts, vectors):
+        rows[_hash(t)] = np.asarray(v, dtype=CACHE_DTYPE).tobytes()
+    with _lock:
+        conn = _db()
+        with conn:
+            added = 0
+            for h, blob in rows.items():
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO embeddings "
+                    "(provider, model, task_type, text_hash, dtype, vec, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (provider, model, task_type, h, dtype, blob, now),
+                )
+                if cur.rowcount > 0:
+                    added += len(blob)
+                    _counters["writes"] += 1
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'bytes'", (added,))
+        _evict(conn)
+
+def _evict(conn) -> None:
+    """Drop least recently used vectors until the cache is back under 90% of its budget."""
+    limit = int(CACHE_MAX_MB * 1024 * 1024)
+    total = conn.execute("SELECT value FROM counters WHERE name = 'bytes'").fetchone()[0]
+    if total <= limit:
+        return
+    target = int(limit * 0.9)
+    with conn:
+        while total > target:
+            rows = conn.execute(
+                "SELECT provider, model, task_type, text_hash, length(vec) FROM embeddings "
+                "ORDER BY last_access LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                total = 0
+                break
+            freed = 0
+            for prov, model, task, h, n in rows:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE provider = ? AND model = ? AND task_type = ? AND text_hash = ?",
+                    (prov, model, task, h),
+                )
+                freed += n
+                _counters["evictions"] += 1
+                if total - freed <= target:
+                    break
+            total -= freed
+        conn.execute("UPDATE counters SET value = ? WHERE name = 'bytes'", (max(0, total),))
+
+def stats() -> Dict:
+    """Process-local counters plus the persisted totals shared by all processes."""
+    out: Dict = {"process": dict(_counters)}
+    try:
+        with _lock:
+            conn = _db()
+            totals = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            totals["entries"] = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        looked_up = totals.get("hits", 0) + totals.get("misses", 0)
+        totals["hit_rate"] = round(totals.get("hits", 0) / looked_up, 4) if looked_up else 0.0
+        out["total"] = totals
+    except Exception as e:
+        out["error"] = str(e)
+    return out
@@ -0,0 +1,131 @@
+import os
+import re
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+class TokenBucket:
+    """Classic token bucket: `rate` requests per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = max(1e-6, float(rate))
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n: float = 1.0) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait_s = (n - self.tokens) / self.rate
+            time.sleep(wait_s)
+
+def plan_batches(texts: List[str], max_texts: int, max_chars: int) -> List[Tuple[int, int]]:
+    """Split texts into contiguous [start, end) ranges that respect both request limits."""
+    out: List[Tuple[int, int]] = []
+    start, chars = 0, 0
+    for i, t in enumerate(texts):
+        n = len(t or "")
+        if i > start and (i - start >= max_texts or chars + n > max_chars):
+            out.append((start, i))
+            start, chars = i, 0
+        chars += n
+    if start < len(texts):
+        out.append((start, len(texts)))
+    return out
+
+def is_retryable(e: Exception) -> bool:
+    code = getattr(e, "code", None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            code = None
+    if isinstance(code, int):
+        return code in RETRY_STATUS
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    msg = str(e)
+    return bool(re.search(r"\b(429|500|502|503|504)\b|exhausted|unavailable|timed? ?out|deadline", msg, re.I))
+
+def _with_retries(fn: Callable, retries: int, base_delay: float, max_delay: float):
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            # full jitter backoff
+            time.sleep(random.uniform(0, min(max_delay, base_delay * (2 ** attempt))))
+            attempt += 1
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def shared_bucket(name: str, per_minute: float) -> TokenBucket:
+    """Process-wide limiter so concurrent embed calls share one request budget."""
+    with _buckets_lock:
+        b = _buckets.get(name)
+        if b is None or b.rate != per_minute / 60.0:
+            b = _buckets[name] = TokenBucket(per_minute / 60.0, capacity=max(1.0, per_minute / 60.0))
+        return b
+
+def run_batched(
+    texts: List[str],
+    embed_batch: Callable[[List[str]], List[List[float]]],
+    max_texts: int = 100,
+    max_chars: int = 100_000,
+    concurrency: int = 4,
+    bucket: Optional[TokenBucket] = None,
+    retries: int = 5,
+    base_delay: float = 0.5,
+    max_delay: float = 30.0,
+) -> List[List[float]]:
+    """
+    Embed `texts` with bounded requests, several in flight, rate limited and retried with
+    jittered backoff on 429/5xx. Results come back in input order; raises if a batch
+    still fails after its retries or returns the wrong number of vectors.
+    """
+    batches = plan_batches(texts, max(1, max_texts), max(1, max_chars))
+    if not batches:
+        return []
+
+    def one(rng: Tuple[int, int]) -> List[List[float]]:
+        part = texts[rng[0]:rng[1]]
+
+        def call():
+            if bucket is not None:
+                bucket.acquire()
+            return embed_batch(part)
+
+        vecs = _with_retries(call, retries, base_delay, max_delay)
+        if not vecs or len(vecs) != len(part):
+            raise RuntimeError(f"embedding batch returned {len(vecs or [])} vectors for {len(part)} texts")
+        return vecs
+
+    if len(batches) == 1 or concurrency <= 1:
+        results = [one(b) for b in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as ex:
+            results = list(ex.map(one, batches))
+    return [v for part in results for v in part]
+
+def gemini_settings() -> dict:
+    return {
+        "max_texts": int(os.getenv("GEMINI_EMBED_MAX_TEXTS", 100)),
+        "max_chars": int(os.getenv("GEMINI_EMBED_MAX_CHARS", 100_000)),
+        "concurrency": int(os.getenv("GEMINI_EMBED_CONCURRENCY", 4)),
+        "bucket": shared_bucket("gemini-embed", float(os.getenv("GEMINI_EMBED_RPM", 1500))),
+        "retries": int(os.getenv("GEMINI_EMBED_RETRIES", 5)),
+    }
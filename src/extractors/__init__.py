@@ -1,14 +1,32 @@
-from .pdf_extractor import extract_pdf
-from .docx_extractor import extract_docx
-from .pptx_extractor import extract_pptx
-from .md_txt_extractor import extract_md, extract_txt
-from .image_extractor import extract_image
-try:
-    from .av_extractor import extract_audio, extract_video
-except Exception:
-    extract_audio = None
-    extract_video = None
-try:
-    from .youtube_extractor import extract_youtube
-except Exception:
-    extract_youtube = None
+import importlib
+
+# name -> submodule; submodules (PIL, pytesseract, Whisper, yt_dlp ...) load on first access
+_EXPORTS = {
+    "extract_pdf": "pdf_extractor",
+    "extract_pdf_pages": "pdf_extractor",
+    "extract_docx": "docx_extractor",
+    "extract_pptx": "pptx_extractor",
+    "extract_md": "md_txt_extractor",
+    "extract_txt": "md_txt_extractor",
+    "extract_image": "image_extractor",
+    "extract_images": "image_extractor",
+    "extract_audio": "av_extractor",
+    "extract_video": "av_extractor",
+    "transcribe_media_segments": "av_extractor",
+    "extract_youtube": "youtube_extractor",
+}
+# optional features resolve to None when their dependencies are missing
+_OPTIONAL = {"av_extractor", "youtube_extractor"}
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    try:
+        value = getattr(importlib.import_module(f".{module}", __name__), name)
+    except Exception:
+        if module not in _OPTIONAL:
+            raise
+        value = None
+    globals()[name] = value
+    return value
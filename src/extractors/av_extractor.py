@@ -1,9 +1,15 @@
 import os, tempfile, subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
 from src.utils import clean_text
+from src.extractors.whisper_models import use_model
 import re
 
+SAMPLE_RATE = 16000
+
 def _ffmpeg_bin() -> str:
     return os.getenv("FFMPEG_BIN", "ffmpeg")
 
@@ -39,38 +45,218 @@ def _postproc(text: str) -> str:
     t = _dedupe_sentences(t)
     return t.strip()
 
+def _transcribe_raw(source) -> str:
+    """Transcribe a file path or a 16 kHz mono float32 NumPy array; returns unprocessed text."""
+    try:
+        with use_model("faster") as model:
+            segments, _info = model.transcribe(
+                source,
+                vad_filter=True,
+                beam_size=5,
+                temperature=0.0,
+            )
+            return " ".join((seg.text or "").strip() for seg in segments)
+    except Exception:
+        pass
+
+    try:
+        with use_model("openai") as model:
+            res = model.transcribe(
+                source,
+                temperature=0.0,
+                beam_size=5,
+                condition_on_previous_text=False,
+                no_speech_threshold=0.6,
+            )
+        return res.get("text", "")
+    except Exception:
+        return ""
+
 def _transcribe_wav(wav_path: str) -> str:
-    model_size = os.getenv("WHISPER_MODEL", "base").strip()
+    return _postproc(_transcribe_raw(wav_path))
 
+def _pcm_stream(in_path: str, block_seconds: float) -> Iterator[np.ndarray]:
+    """
+    Decode any media to 16 kHz mono float32 PCM through an ffmpeg pipe and yield
+    fixed-size blocks, so memory stays bounded and nothing touches the disk.
+    """
+    if not Path(in_path).exists():
+        raise FileNotFoundError(in_path)
+    cmd = [
+        _ffmpeg_bin(), "-nostdin", "-i", in_path,
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "pipe:1"
+    ]
+    block_bytes = max(1, int(block_seconds * SAMPLE_RATE)) * 4
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except Exception as e:
+        raise RuntimeError(f"ffmpeg failed: {e}") from e
+    try:
+        while True:
+            data = proc.stdout.read(block_bytes)
+            if not data:
+                break
+            usable = len(data) - len(data) % 4
+            yield np.frombuffer(data[:usable], dtype=np.float32).copy()
+    finally:
+        proc.stdout.close()
+        rc = proc.wait()
+    if rc not in (0, -13):  # -13: we stopped reading early (SIGPIPE)
+        raise RuntimeError(f"ffmpeg exited with {rc} for {in_path}")
+
+def _quiet_cut(buf: np.ndarray, search_seconds: float = 2.0) -> int:
+    """Index of the quietest 20 ms frame in the tail of buf, so blocks don't split words."""
+    frame = SAMPLE_RATE // 50
+    tail = min(len(buf), int(search_seconds * SAMPLE_RATE))
+    if tail < frame * 2:
+        return len(buf)
+    seg = buf[len(buf) - tail:]
+    n = len(seg) // frame
+    energy = (seg[:n * frame].reshape(n, frame) ** 2).mean(axis=1)
+    return len(buf) - tail + int(np.argmin(energy)) * frame + frame // 2
+
+def _transcribe_stream(in_path: str) -> str:
+    block_seconds = float(os.getenv("AV_STREAM_BLOCK_SECONDS", 300))
+    parts: List[str] = []
+    buf = None
+    for block in _pcm_stream(in_path, block_seconds):
+        if buf is not None:
+            # more audio follows: cut at a quiet spot and carry the rest over
+            cut = _quiet_cut(buf)
+            parts.append(_transcribe_raw(buf[:cut]))
+            block = np.concatenate([buf[cut:], block])
+        buf = block
+    if buf is not None and len(buf) > SAMPLE_RATE // 10:
+        parts.append(_transcribe_raw(buf))
+    return _postproc(" ".join(p for p in parts if p))
+
+def _probe_duration(in_path: str) -> Optional[float]:
+    """Container duration in seconds from ffmpeg's input banner (no decoding)."""
     try:
-        from faster_whisper import WhisperModel
-        model = WhisperModel(model_size, device=os.getenv("WHISPER_DEVICE", "cpu"), compute_type=os.getenv("WHISPER_COMPUTE", "int8"))
-        segments, _info = model.transcribe(
-            wav_path,
-            vad_filter=True,
-            beam_size=5,
-            temperature=0.0,
-        )
-        text = " ".join((seg.text or "").strip() for seg in segments)
-        return _postproc(text)
+        res = subprocess.run([_ffmpeg_bin(), "-nostdin", "-hide_banner", "-i", in_path],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="ignore")
     except Exception:
-        pass
+        return None
+    m = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", res.stderr or "")
+    if not m:
+        return None
+    h, mi, sec = m.groups()
+    return int(h) * 3600 + int(mi) * 60 + float(sec)
 
+def _silences(in_path: str) -> List[Tuple[float, float]]:
+    """(start, end) of silent stretches, found with ffmpeg's silencedetect filter."""
+    noise = os.getenv("AV_SILENCE_DB", "-35dB")
+    min_len = os.getenv("AV_SILENCE_MIN", "0.5")
+    cmd = [_ffmpeg_bin(), "-nostdin", "-hide_banner", "-i", in_path, "-vn",
+           "-af", f"silencedetect=noise={noise}:d={min_len}", "-f", "null", "-"]
     try:
-        import whisper
-        model = whisper.load_model(model_size)
-        res = model.transcribe(
-            wav_path,
-            temperature=0.0,
-            beam_size=5,
-            condition_on_previous_text=False,
-            no_speech_threshold=0.6,
-        )
-        return _postproc(res.get("text", ""))
+        res = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="ignore")
     except Exception:
-        return ""  
+        return []
+    out, start = [], None
+    for line in (res.stderr or "").splitlines():
+        m = re.search(r"silence_start:\s*(-?[\d.]+)", line)
+        if m:
+            start = max(0.0, float(m.group(1)))
+            continue
+        m = re.search(r"silence_end:\s*([\d.]+)", line)
+        if m and start is not None:
+            out.append((start, float(m.group(1))))
+            start = None
+    return out
 
-def extract_audio(path: str) -> str:
+def _plan_segments(duration: float, silences: List[Tuple[float, float]],
+                   target: float, window: float) -> List[Tuple[float, float]]:
+    """Cut roughly every `target` seconds, at the middle of the nearest silence when one is close."""
+    mids = [(a + b) / 2 for a, b in silences]
+    out, start = [], 0.0
+    while duration - start > target + window:
+        ideal = start + target
+        near = [m for m in mids if abs(m - ideal) <= window and m > start + 1.0]
+        cut = min(near, key=lambda m: abs(m - ideal)) if near else ideal
+        out.append((start, cut))
+        start = cut
+    out.append((start, duration))
+    return out
+
+def _decode_range(in_path: str, start: float, length: float) -> np.ndarray:
+    cmd = [
+        _ffmpeg_bin(), "-nostdin", "-ss", f"{max(0.0, start):.3f}", "-t", f"{length:.3f}", "-i", in_path,
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "pipe:1"
+    ]
+    res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    data = res.stdout
+    return np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32)
+
+def _segment_worker_init(cpu_threads: int) -> None:
+    os.environ["WHISPER_CPU_THREADS"] = str(cpu_threads)
+
+def _transcribe_range(in_path: str, start: float, end: float, overlap: float) -> str:
+    a = max(0.0, start - overlap)
+    audio = _decode_range(in_path, a, end + overlap - a)
+    if len(audio) < SAMPLE_RATE // 10:
+        return ""
+    return clean_text(_transcribe_raw(audio))
+
+def _norm_word(w: str) -> str:
+    return re.sub(r"[^\w]", "", w.lower())
+
+def _trim_overlap(prev: str, text: str, max_words: int = 40) -> str:
+    """Drop the leading words of `text` that repeat the tail of `prev` (segment overlap)."""
+    pw = [_norm_word(w) for w in prev.split()[-max_words:]]
+    words = text.split()
+    nw = [_norm_word(w) for w in words[:max_words]]
+    for k in range(min(len(pw), len(nw)), 1, -1):
+        if pw[-k:] == nw[:k]:
+            return " ".join(words[k:])
+    return text
+
+def transcribe_media_segments(path: str) -> List[Dict]:
+    """
+    Transcribe audio/video into [{"start", "end", "text"}] segments (seconds).
+    Media longer than AV_SEGMENT_MIN_SECONDS is split on silence into ~AV_SEGMENT_SECONDS
+    pieces that are transcribed in parallel worker processes and stitched back in order,
+    dropping words and sentences repeated across the overlapping boundaries.
+    """
+    duration = _probe_duration(path)
+    min_len = float(os.getenv("AV_SEGMENT_MIN_SECONDS", 900))
+    workers = int(os.getenv("AV_SEGMENT_WORKERS", min(4, os.cpu_count() or 1)))
+    if not duration or duration < min_len or workers <= 1:
+        text = transcribe_media(path)
+        return [{"start": 0.0, "end": duration or 0.0, "text": text}] if text else []
+
+    target = float(os.getenv("AV_SEGMENT_SECONDS", 300))
+    overlap = float(os.getenv("AV_SEGMENT_OVERLAP", 1.0))
+    plan = _plan_segments(duration, _silences(path), target, window=target * 0.2)
+    print(f"[AV] {path}: {duration:.0f}s in {len(plan)} segments on {workers} workers")
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_segment_worker_init, initargs=(threads,)) as pool:
+        texts = list(pool.map(_transcribe_range, [path] * len(plan),
+                              [a for a, _ in plan], [b for _, b in plan], [overlap] * len(plan)))
+
+    out: List[Dict] = []
+    seen, prev = set(), ""
+    for (a, b), text in zip(plan, texts):
+        text = _trim_overlap(prev, text) if prev else text
+        kept = []
+        for sent in re.split(r'(?<=[.!?])\s+', text.strip()):
+            norm = " ".join(sent.lower().split())
+            if norm and norm not in seen:
+                kept.append(sent.strip())
+                seen.add(norm)
+        text = " ".join(kept)
+        if text:
+            out.append({"start": round(a, 2), "end": round(b, 2), "text": text})
+            prev = text
+    return out
+
+def transcribe_media(path: str) -> str:
+    """Transcribe any audio/video file via a temp WAV (default) or a PCM pipe (AV_DECODE=stream)."""
+    if os.getenv("AV_DECODE", "file").lower() == "stream":
+        return _transcribe_stream(path)
     wav = _to_wav(path)
     try:
         return _transcribe_wav(wav)
@@ -78,10 +264,8 @@ def extract_audio(path: str) -> str:
         try: os.remove(wav)
         except Exception: pass
 
+def extract_audio(path: str) -> str:
+    return "\n".join(seg["text"] for seg in transcribe_media_segments(path))
+
 def extract_video(path: str) -> str:
-    wav = _to_wav(path)  
-    try:
-        return _transcribe_wav(wav)
-    finally:
-        try: os.remove(wav)
-        except Exception: pass
+    return "\n".join(seg["text"] for seg in transcribe_media_segments(path))
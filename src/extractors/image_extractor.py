@@ -1,6 +1,8 @@
 import os
 import re
-from typing import List, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
 from PIL import Image, ImageOps, ImageFilter
 import numpy as np
@@ -13,6 +15,9 @@ if os.getenv("TESSERACT_CMD"):
 if os.getenv("TESSDATA_PREFIX"):
     os.environ["TESSDATA_PREFIX"] = os.getenv("TESSDATA_PREFIX")
 
+_easy_reader = None
+_easy_lock = threading.RLock()
+
 def _prep(img: Image.Image) -> Image.Image:
     """
     Robust preprocessing:
@@ -31,7 +36,8 @@ def _prep(img: Image.Image) -> Image.Image:
     pad = k // 2
     pad_arr = np.pad(arr, pad, mode="edge").astype(np.float32)
 
-    cumsum = pad_arr.cumsum(axis=0).cumsum(axis=1)
+    # integral image with a leading zero row/column so window sums come out h x w
+    cumsum = np.pad(pad_arr.cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
     h, w = arr.shape
     sums = (
         cumsum[k:, k:]
@@ -52,10 +58,45 @@ def _tesseract_pass(img: Image.Image, psm: int) -> str:
     except Exception:
         return ""
 
-def _try_rotations(img: Image.Image) -> List[Tuple[int, Image.Image]]:
-    """Return images rotated by 0, 90, 180, 270 degrees."""
+def _tesseract_conf(img: Image.Image, psm: int) -> float:
+    """Mean word confidence (0-100) of one Tesseract run; 0 when it finds no words."""
+    cfg = f"--oem 3 --psm {psm}"
+    try:
+        data = pytesseract.image_to_data(img, lang="eng", config=cfg, output_type=pytesseract.Output.DICT)
+    except Exception:
+        return 0.0
+    confs: List[float] = []
+    for word, conf in zip(data.get("text", []), data.get("conf", [])):
+        if not (word or "").strip():
+            continue
+        try:
+            c = float(conf)
+        except (TypeError, ValueError):
+            continue
+        if c >= 0:
+            confs.append(c)
+    return sum(confs) / len(confs) if confs else 0.0
+
+def _detect_rotation(img: Image.Image) -> Optional[int]:
+    """
+    Tesseract OSD: counter-clockwise degrees (PIL convention) that make the text upright,
+    or None when OSD is unavailable or not confident.
+    """
+    try:
+        osd = pytesseract.image_to_osd(img, output_type=pytesseract.Output.DICT)
+        if float(osd.get("orientation_conf", 0)) < float(os.getenv("OCR_OSD_MIN_CONF", 2.0)):
+            return None
+        return (360 - int(osd.get("rotate", 0))) % 360
+    except Exception:
+        return None
+
+def _try_rotations(img: Image.Image, first: Optional[int] = None) -> List[Tuple[int, Image.Image]]:
+    """Return images rotated by 0, 90, 180, 270 degrees (the `first` guess leading)."""
     rots = [0, 90, 180, 270]
-    return [(r, img.rotate(r, expand=True)) for r in rots]
+    if first in rots:
+        rots.remove(first)
+        rots.insert(0, first)
+    return [(r, img.rotate(r, expand=True) if r else img) for r in rots]
 
 def _merge_texts(parts: List[str]) -> str:
     joined = "\n".join(p for p in parts if p and p.strip())
@@ -68,12 +109,80 @@ def _merge_texts(parts: List[str]) -> str:
             seen.add(norm.lower())
     return "\n".join(out).strip()
 
-def extract_image(path: str) -> str:
+def _easyocr_reader():
+    """Process-wide EasyOCR reader, created on first use (weights load once per process)."""
+    global _easy_reader
+    with _easy_lock:
+        if _easy_reader is None:
+            import easyocr
+            gpu = os.getenv("EASYOCR_GPU", "0").lower() in ("1", "true", "yes", "on")
+            _easy_reader = easyocr.Reader(["en"], gpu=gpu)
+        return _easy_reader
+
+def _rgb(item) -> np.ndarray:
+    if isinstance(item, np.ndarray):
+        return item
+    return np.asarray(Image.open(item).convert("RGB"))
+
+def _pad(arr: np.ndarray, h: int, w: int) -> np.ndarray:
+    """White-pad an image to h x w (bottom/right) so it stacks with the rest of its batch."""
+    if arr.shape[:2] == (h, w):
+        return arr
+    out = np.full((h, w) + arr.shape[2:], 255, dtype=arr.dtype)
+    out[:arr.shape[0], :arr.shape[1]] = arr
+    return out
+
+def easyocr_batch(paths: List) -> List[str]:
     """
-    OCR an image file. Tries multiple PSMs and rotations; falls back to EasyOCR.
-    Returns cleaned multi-line text (keeps digits/symbols).
+    Run the EasyOCR fallback over many images (paths or NumPy arrays) with one shared
+    reader; '' where it fails. Images go through readtext_batched EASYOCR_BATCH at a time,
+    sorted by size and padded to a common shape (batched detection needs equal shapes).
+    """
+    if not paths:
+        return []
+    try:
+        reader = _easyocr_reader()
+    except Exception:
+        return [""] * len(paths)
+    out = [""] * len(paths)
+    images = []
+    for i, item in enumerate(paths):
+        try:
+            arr = _rgb(item)
+        except Exception:
+            continue
+        if arr.ndim == 2:
+            arr = np.stack([arr] * 3, axis=-1)
+        images.append((i, arr))
+    images.sort(key=lambda x: x[1].shape[0] * x[1].shape[1])
+    size = max(1, int(os.getenv("EASYOCR_BATCH", 8)))
+    with _easy_lock:
+        for s in range(0, len(images), size):
+            chunk = images[s:s + size]
+            h = max(a.shape[0] for _i, a in chunk)
+            w = max(a.shape[1] for _i, a in chunk)
+            try:
+                found = reader.readtext_batched([_pad(a, h, w) for _i, a in chunk], detail=0, batch_size=len(chunk))
+            except Exception as e:
+                print(f"[OCR] EasyOCR batch failed ({e}); reading {len(chunk)} images one by one")
+                found = []
+                for _i, a in chunk:
+                    try:
+                        found.append(reader.readtext(a, detail=0))
+                    except Exception:
+                        found.append([])
+            for (i, _a), lines in zip(chunk, found):
+                out[i] = _merge_texts(lines)
+    return out
+
+def _tesseract_image(img: Image.Image) -> str:
+    """
+    Tesseract part of extract_image. The OSD-detected orientation is probed first with
+    every PSM (word confidences only) and the search stops at the first confident pass.
+    Below OCR_MIN_CONF there is no text worth chasing and '' hands the image to EasyOCR;
+    in between, the other rotations are probed at the best PSM. Only the winning
+    configuration is read with image_to_string, so Tesseract's own line layout is kept.
     """
-    img = Image.open(path)
     prepped = _prep(img)
 
     w, h = prepped.size
@@ -82,24 +191,62 @@ def extract_image(path: str) -> str:
 
     psm_candidates = [7, 6, 3] if likely_single_line else [6, 3, 4, 7]
 
-    tess_results: List[str] = []
-    for deg, rotated in _try_rotations(prepped):
-        for psm in psm_candidates:
-            txt = _tesseract_pass(rotated, psm)
-            if txt and txt.strip():
-                tess_results.append(txt)
-
-    merged = _merge_texts(tess_results)
-
-    if not merged:
+    guess = _detect_rotation(prepped)
+    rotations = _try_rotations(prepped, guess)
+    early_conf = float(os.getenv("OCR_EARLY_EXIT_CONF", 80))
+    min_conf = float(os.getenv("OCR_MIN_CONF", 10))
+    threads = max(1, int(os.getenv("OCR_THREADS", min(4, os.cpu_count() or 1))))
+
+    # pytesseract shells out, so threads give real parallelism here
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        # 1) most likely orientation, best PSM first; stop as soon as a pass is confident
+        _deg, lead = rotations[0]
+        scores = [(_tesseract_conf(lead, psm_candidates[0]), lead, psm_candidates[0])]
+        if scores[0][0] < early_conf:
+            rest_psm = psm_candidates[1:]
+            scores += [(c, lead, p) for c, p in zip(ex.map(lambda p: _tesseract_conf(lead, p), rest_psm), rest_psm)]
+        best = max(scores, key=lambda s: s[0])
+        if best[0] < min_conf:
+            return ""
+        # 2) some text but not convincing: try the other rotations at the winning PSM
+        if best[0] < early_conf:
+            others = [img_r for _d, img_r in rotations[1:]]
+            scores = [(c, img_r, best[2]) for c, img_r in zip(ex.map(lambda r: _tesseract_conf(r, best[2]), others), others)]
+            best = max([best] + scores, key=lambda s: s[0])
+
+    return _merge_texts([_tesseract_pass(best[1], best[2])])
+
+def extract_images(paths: List[str], strict: bool = False) -> List:
+    """
+    Batch OCR: Tesseract per image, then a single batched EasyOCR pass over every image
+    Tesseract found nothing in. Returns cleaned text per path, in order.
+    strict=True puts the exception in place of the text for images that cannot be read,
+    so callers can tell a broken file from an image without text.
+    """
+    merged: List = []
+    for path in paths:
         try:
-            import easyocr
-            reader = easyocr.Reader(["en"], gpu=False)
-            easy_lines = reader.readtext(path, detail=0)
-            merged = _merge_texts(easy_lines)
-        except Exception:
-            merged = ""
+            merged.append(_tesseract_image(Image.open(path)))
+        except Exception as e:
+            merged.append(e if strict else "")
+    empty = [i for i, m in enumerate(merged) if isinstance(m, str) and not m]
+    for i, text in zip(empty, easyocr_batch([paths[i] for i in empty])):
+        merged[i] = text
+    return [m if isinstance(m, Exception) else clean_text(m) for m in merged]
 
-    final = clean_text(merged)
+def extract_image(path: str) -> str:
+    """
+    OCR an image file. Tries multiple PSMs and rotations; falls back to EasyOCR.
+    Returns cleaned multi-line text (keeps digits/symbols).
+    """
+    merged = _tesseract_image(Image.open(path))
+    if not merged:
+        merged = easyocr_batch([path])[0]
+    return clean_text(merged)
 
-    return final
+def ocr_image(img: Image.Image) -> str:
+    """extract_image for an in-memory PIL image (e.g. a scanned PDF page)."""
+    merged = _tesseract_image(img)
+    if not merged:
+        merged = easyocr_batch([np.asarray(img.convert("RGB"))])[0]
+    return clean_text(merged)
@@ -1,26 +1,124 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import List, Tuple
 from src.utils import clean_text
 
-def extract_pdf(path: str) -> str:
-    p = Path(path)
-    if not p.exists() or not p.is_file():
-        return ""
-    text = ""
+def _page_count(path: str) -> int:
+    for mod in ("pypdf", "PyPDF2"):
+        try:
+            lib = __import__(mod)
+            with open(path, "rb") as f:
+                return len(lib.PdfReader(f).pages)
+        except Exception:
+            continue
+    try:
+        from pdfminer.pdfpage import PDFPage
+        with open(path, "rb") as f:
+            return sum(1 for _ in PDFPage.get_pages(f))
+    except Exception:
+        return 0
+
+def _text_pages(path: str, pages: List[int]) -> List[str]:
+    """Text layer of the given 0-based pages, parsing the file once."""
     try:
-        from pdfminer.high_level import extract_text as pdfminer_extract
-        text = pdfminer_extract(str(p)) or ""
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+        wanted = set(pages)
+        out = {}
+        # extract_pages yields the selected pages in document order
+        for i, layout in zip(sorted(wanted), extract_pages(path, page_numbers=wanted)):
+            out[i] = "".join(el.get_text() for el in layout if isinstance(el, LTTextContainer))
+        return [out.get(i, "") for i in pages]
     except Exception:
+        pass
+    for mod in ("pypdf", "PyPDF2"):
         try:
-            import PyPDF2
-            with open(p, "rb") as f:
-                r = PyPDF2.PdfReader(f)
+            lib = __import__(mod)
+            with open(path, "rb") as f:
+                r = lib.PdfReader(f)
                 parts = []
-                for i in range(len(r.pages)):
+                for i in pages:
                     try:
                         parts.append(r.pages[i].extract_text() or "")
                     except Exception:
                         parts.append("")
-                text = "\n".join(parts)
+                return parts
+        except Exception:
+            continue
+    return [""] * len(pages)
+
+def _page_images(path: str, page: int) -> list:
+    """
+    PIL images for OCR of one page: a full render when pypdfium2 is installed,
+    otherwise the images embedded in the page (what a scanner produces).
+    """
+    try:
+        import pypdfium2 as pdfium
+        doc = pdfium.PdfDocument(path)
+        try:
+            return [doc[page].render(scale=float(os.getenv("PDF_OCR_SCALE", 2.0))).to_pil()]
+        finally:
+            doc.close()
+    except Exception:
+        pass
+    try:
+        import pypdf
+        r = pypdf.PdfReader(path)
+        return [im.image for im in r.pages[page].images]
+    except Exception:
+        return []
+
+def _ocr_page(path: str, page: int) -> str:
+    try:
+        from src.extractors.image_extractor import ocr_image
+    except Exception:
+        return ""
+    parts = []
+    for img in _page_images(path, page):
+        try:
+            parts.append(ocr_image(img))
         except Exception:
-            text = ""
-    return clean_text(text)
+            continue
+    return "\n".join(p for p in parts if p)
+
+def _extract_range(path: str, pages: List[int]) -> List[str]:
+    """Worker job: text layer for a run of pages, OCR only for pages that have none."""
+    min_chars = int(os.getenv("PDF_MIN_PAGE_CHARS", 20))
+    ocr = os.getenv("PDF_OCR", "1").lower() not in ("0", "false", "no", "off")
+    out = []
+    for i, text in zip(pages, _text_pages(path, pages)):
+        text = clean_text(text)
+        if ocr and len(text) < min_chars:
+            text = clean_text(_ocr_page(path, i)) or text
+        out.append(text)
+    return out
+
+def extract_pdf_pages(path: str) -> List[Tuple[int, str]]:
+    """
+    Extract a PDF page by page; returns [(page_number starting at 1, text)].
+    Large files are split into page runs handled by PDF_WORKERS processes. Pages without
+    a text layer (scans) go through the image OCR path.
+    """
+    p = Path(path)
+    if not p.exists() or not p.is_file():
+        return []
+    n = _page_count(str(p))
+    if n <= 0:
+        raise ValueError(f"no PDF parser could read {p}")
+
+    workers = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+    min_pages = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 16))
+    if workers <= 1 or n < min_pages:
+        texts = _extract_range(str(p), list(range(n)))
+    else:
+        per = -(-n // workers)
+        runs = [list(range(s, min(n, s + per))) for s in range(0, n, per)]
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            texts = [t for run in pool.map(_extract_range, [str(p)] * len(runs), runs) for t in run]
+    return [(i + 1, t) for i, t in enumerate(texts)]
+
+def extract_pdf(path: str) -> str:
+    return clean_text("\n".join(t for _, t in extract_pdf_pages(path)))
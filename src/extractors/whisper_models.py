@@ -0,0 +1,100 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+# (backend, size, device, compute_type) -> {"model", "last_used", "in_use", "lock"}
+_models: Dict[Tuple[str, str, str, str], Dict] = {}
+_lock = threading.Lock()
+_reaper = None
+
+def _settings() -> Tuple[str, str, str]:
+    return (
+        os.getenv("WHISPER_MODEL", "base").strip(),
+        os.getenv("WHISPER_DEVICE", "cpu"),
+        os.getenv("WHISPER_COMPUTE", "int8"),
+    )
+
+def _load(backend: str, size: str, device: str, compute_type: str):
+    print(f"[Whisper] loading backend={backend} size={size} device={device} compute={compute_type}")
+    if backend == "faster":
+        from faster_whisper import WhisperModel
+        return WhisperModel(size, device=device, compute_type=compute_type,
+                            cpu_threads=int(os.getenv("WHISPER_CPU_THREADS", 0)))
+    import whisper
+    # openai-whisper picks CUDA by itself unless a device is forced
+    return whisper.load_model(size, device=os.getenv("WHISPER_DEVICE") or None)
+
+def _entry(backend: str, size: str, device: str, compute_type: str) -> Dict:
+    key = (backend, size, device, compute_type)
+    with _lock:
+        ent = _models.get(key)
+        if ent is None:
+            ent = _models[key] = {"model": None, "last_used": time.time(), "in_use": 0,
+                                  "lock": threading.Lock()}
+        ent["in_use"] += 1
+    return ent
+
+@contextmanager
+def use_model(backend: str, size: str = None, device: str = None, compute_type: str = None):
+    """
+    Borrow a resident model, loading it on first use. backend is 'faster' (faster-whisper)
+    or 'openai' (openai-whisper); unspecified settings come from WHISPER_* env vars.
+    """
+    d_size, d_device, d_compute = _settings()
+    size, device, compute_type = size or d_size, device or d_device, compute_type or d_compute
+    ent = _entry(backend, size, device, compute_type)
+    try:
+        with ent["lock"]:
+            if ent["model"] is None:
+                ent["model"] = _load(backend, size, device, compute_type)
+        _ensure_reaper()
+        if backend == "faster":
+            yield ent["model"]
+        else:
+            # openai-whisper models are not safe to share between threads mid-decode
+            with ent["lock"]:
+                yield ent["model"]
+    finally:
+        with _lock:
+            ent["in_use"] -= 1
+            ent["last_used"] = time.time()
+
+def preload() -> bool:
+    """Load the configured model now (faster-whisper first, openai-whisper as fallback)."""
+    for backend in ("faster", "openai"):
+        try:
+            with use_model(backend):
+                return True
+        except Exception as e:
+            print(f"[Whisper] preload ({backend}) failed: {e}")
+    return False
+
+def unload_idle(max_idle: float) -> int:
+    """Drop models unused for max_idle seconds. Returns how many were unloaded."""
+    now, dropped = time.time(), 0
+    with _lock:
+        for key, ent in list(_models.items()):
+            if ent["in_use"] == 0 and ent["model"] is not None and now - ent["last_used"] >= max_idle:
+                del _models[key]
+                dropped += 1
+    if dropped:
+        print(f"[Whisper] unloaded {dropped} idle model(s)")
+    return dropped
+
+def _ensure_reaper() -> None:
+    global _reaper
+    idle = float(os.getenv("WHISPER_IDLE_TIMEOUT", 600))
+    if idle <= 0 or (_reaper is not None and _reaper.is_alive()):
+        return
+
+    def loop():
+        while True:
+            time.sleep(max(1.0, idle / 4))
+            unload_idle(idle)
+
+    with _lock:
+        if _reaper is None or not _reaper.is_alive():
+            _reaper = threading.Thread(target=loop, name="whisper-reaper", daemon=True)
+            _reaper.start()
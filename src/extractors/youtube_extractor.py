@@ -3,7 +3,7 @@ import tempfile
 from pathlib import Path
 
 from yt_dlp import YoutubeDL
-from src.extractors.av_extractor import _to_wav, _transcribe_wav
+from src.extractors.av_extractor import transcribe_media
 from src.utils import clean_text
 
 
@@ -109,13 +109,6 @@ def extract_youtube(url: str) -> str:
             return ""
 
         try:
-            wav = _to_wav(str(downloaded_path))
-            try:
-                return _transcribe_wav(wav)
-            finally:
-                try:
-                    os.remove(wav)
-                except Exception:
-                    pass
+            return transcribe_media(str(downloaded_path))
         except Exception:
             return ""
@@ -1,98 +1,350 @@
 import os
+import json
+import threading
 from typing import List, Dict, Tuple, Optional
 from pathlib import Path
 
 from dotenv import load_dotenv
 load_dotenv(override=False)
 
-import chromadb
-from src.llm import embed_texts
+from src.llm import embed_texts, embedding_model
+from src import chunking, registry, query_cache, lexical
+from src.utils import file_lock
 
 CHROMA_DIR = os.getenv("CHROMA_DIR", "./data/chroma")
 PROVIDER = os.getenv("EMBEDDING_PROVIDER", "gemini").lower()
 COLL_NAME = os.getenv("COLLECTION_NAME", f"multimodal-{PROVIDER}")
+# "chroma" (default), "flat" (src.vector_store: mmap'd matrix, exact search)
+# or "ivfpq" (flat store + compressed IVF-PQ index, see src.ivfpq)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+# every process writing to the collection (cli ingest, job workers, the server) takes this
+# lock, so store, registry and BM25 index updates never interleave
+WRITE_LOCK = os.getenv("INDEX_WRITE_LOCK", str(Path(registry.REGISTRY_PATH).parent / f"{COLL_NAME}.write.lock"))
 
-CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 800))
-CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 120))
+CHUNK_SIZE = chunking.CHUNK_SIZE
+CHUNK_OVERLAP = chunking.CHUNK_OVERLAP
 
-Path(CHROMA_DIR).mkdir(parents=True, exist_ok=True)
-client = chromadb.PersistentClient(path=CHROMA_DIR)
-collection = client.get_or_create_collection(COLL_NAME)
-print(f"[Chroma] path={CHROMA_DIR} collection={COLL_NAME}")
+_collection = None
+_collection_lock = threading.Lock()
+
+def _chroma_collection():
+    import chromadb
+    Path(CHROMA_DIR).mkdir(parents=True, exist_ok=True)
+    client = chromadb.PersistentClient(path=CHROMA_DIR)
+    return client.get_or_create_collection(COLL_NAME)
+
+def _open_collection():
+    if VECTOR_BACKEND in ("flat", "ivfpq"):
+        from src import vector_store
+        coll = vector_store.open_store(COLL_NAME, VECTOR_BACKEND)
+        print(f"[Vectors] path={coll.path} collection={COLL_NAME} n={coll.count()}")
+        if coll.count() == 0 and registry.documents(COLL_NAME) and Path(CHROMA_DIR).exists():
+            # switching backends: carry the existing Chroma collection over once
+            n = vector_store.import_collection(_chroma_collection(), coll)
+            print(f"[Vectors] imported {n} chunks from Chroma")
+        return coll
+    coll = _chroma_collection()
+    print(f"[Chroma] path={CHROMA_DIR} collection={COLL_NAME}")
+    return coll
+
+def get_collection():
+    """The vector collection, opened on first use rather than at import."""
+    global _collection
+    if _collection is None:
+        with _collection_lock:
+            if _collection is None:
+                _collection = _open_collection()
+    return _collection
+
+def __getattr__(name: str):
+    # keeps `from src.indexer import collection` working without opening it at import
+    if name == "collection":
+        return get_collection()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+_registry_ready = False
+_lexical_ready = False
+
+def chunk_spans(text: str) -> List[Tuple[int, int]]:
+    """(start, end) character offsets of each chunk of `text` (see src.chunking for modes)."""
+    return chunking.chunk_spans(text)
 
 def chunk(text: str) -> List[str]:
     text = text or ""
-    if not text:
-        return []
-    out, i, n = [], 0, len(text)
-    step = max(1, CHUNK_SIZE - CHUNK_OVERLAP)
-    while i < n:
-        out.append(text[i:i + CHUNK_SIZE])
-        i += step
+    return [text[a:b] for a, b in chunk_spans(text)]
+
+def _span_meta(start: int, end: int, spans: List[Tuple[int, int, Dict]]) -> Dict:
+    """
+    Merge the metadata of the extractor spans (e.g. transcript segments) a chunk overlaps:
+    '*_start' keys keep the minimum, '*_end' keys the maximum, other keys the first value.
+    """
+    out: Dict = {}
+    for s_start, s_end, m in spans:
+        if s_end <= start or s_start >= end:
+            continue
+        for k, v in (m or {}).items():
+            if k not in out:
+                out[k] = v
+            elif k.endswith("_start"):
+                out[k] = min(out[k], v)
+            elif k.endswith("_end"):
+                out[k] = max(out[k], v)
     return out
 
-def add_document(doc_id: str, text: str, meta: Dict) -> Dict[str, int]:
+def prepare_document(doc_id: str, text: str, meta: Dict,
+                     spans: Optional[List[Tuple[int, int, Dict]]] = None) -> Optional[Dict]:
     """
-    Adds a document by chunking + embedding. Uses upsert to avoid duplicate-ID errors.
-    Returns simple stats dict.
+    Chunk a document and build its ids/metadatas without embedding it.
+    `spans` optionally maps character ranges of `text` to extra chunk metadata.
+    Returns None when there is nothing to index.
     """
+    lead = len(text or "") - len((text or "").lstrip())
     text = (text or "").strip()
     if not text:
         print(f"[Index] Skipping empty doc: {doc_id}")
-        return {"chunks": 0, "added": 0}
+        return None
 
-    chunks = chunk(text)
+    offsets = chunk_spans(text)
+    chunks = [text[a:b] for a, b in offsets]
     if not chunks:
         print(f"[Index] No chunks after processing: {doc_id}")
-        return {"chunks": 0, "added": 0}
+        return None
+
+    spans = [(a - lead, b - lead, m) for a, b, m in (spans or [])]
+    metadatas = []
+    for i, (a, b) in enumerate(offsets):
+        extra = _span_meta(a, b, spans) if spans else {}
+        metadatas.append({**(meta or {}), **extra, "doc_id": doc_id, "chunk": i, "char_start": a, "char_end": b})
 
-    embeds = embed_texts(chunks) or []
+    return {
+        "doc_id": doc_id,
+        "chunks": chunks,
+        "ids": [f"{doc_id}-{i}" for i in range(len(chunks))],
+        "metadatas": metadatas,
+    }
+
+def write_document(prepared: Dict, embeds: List[List[float]]) -> Dict[str, int]:
+    """Upsert a prepared document with its embeddings. Returns simple stats dict."""
+    chunks = prepared["chunks"]
     if not embeds or len(embeds) != len(chunks):
-        print(f"[Index] Embedding failure: got {len(embeds)} for {len(chunks)} chunks")
+        print(f"[Index] Embedding failure: got {len(embeds or [])} for {len(chunks)} chunks")
         return {"chunks": len(chunks), "added": 0}
 
     print(f"[Embeddings] provider={PROVIDER} dim={len(embeds[0])} n={len(embeds)}")
 
-    ids = [f"{doc_id}-{i}" for i in range(len(chunks))]
-    metadatas = [{**(meta or {}), "chunk": i} for i in range(len(chunks))]
-
-    # upsert prevents duplicate-id exceptions on re-ingest
-    collection.upsert(documents=chunks, embeddings=embeds, ids=ids, metadatas=metadatas)
+    # Replace in place: upsert overwrites chunks 0..n-1, then only the leftover tail of a
+    # previously longer version is deleted, so the document is never missing mid-update.
+    doc_id = prepared["doc_id"]
+    with file_lock(WRITE_LOCK):
+        _ensure_registry()
+        old_n = registry.get(COLL_NAME, doc_id) or 0
+        collection = get_collection()
+        collection.upsert(documents=chunks, embeddings=embeds, ids=prepared["ids"], metadatas=prepared["metadatas"])
+        if old_n > len(chunks):
+            collection.delete(ids=registry.chunk_ids(doc_id, old_n, start=len(chunks)))
+        registry.put(COLL_NAME, doc_id, len(chunks))
+        try:
+            _ensure_lexical()
+            lexical.index_document(COLL_NAME, doc_id, prepared["ids"], chunks, prepared["metadatas"])
+        except Exception as e:
+            print(f"[Lexical] index failed for {doc_id}: {e}")
+        registry.bump_generation(COLL_NAME)
     return {"chunks": len(chunks), "added": len(chunks)}
 
+def add_document(doc_id: str, text: str, meta: Dict,
+                 spans: Optional[List[Tuple[int, int, Dict]]] = None) -> Dict[str, int]:
+    """
+    Adds a document by chunking + embedding. Uses upsert to avoid duplicate-ID errors.
+    Returns simple stats dict.
+    """
+    prepared = prepare_document(doc_id, text, meta, spans)
+    if prepared is None:
+        return {"chunks": 0, "added": 0}
+
+    embeds = embed_texts(prepared["chunks"]) or []
+    return write_document(prepared, embeds)
+
+def embed_queries(queries: List[str]) -> List[Optional[List[float]]]:
+    """Query embeddings through the in-process LRU/TTL cache; misses are embedded in one batch."""
+    provider = os.getenv("EMBEDDING_PROVIDER", "gemini").lower()
+    model = embedding_model()
+    out: List[Optional[List[float]]] = [query_cache.query_embeddings.get((provider, model, q)) for q in queries]
+    missing = list(dict.fromkeys(q for q, e in zip(queries, out) if e is None))
+    if missing:
+        embs = embed_texts(missing) or []
+        fresh = dict(zip(missing, embs)) if len(embs) == len(missing) else {}
+        for q, e in fresh.items():
+            query_cache.query_embeddings.put((provider, model, q), e)
+        out = [e if e is not None else fresh.get(q) for q, e in zip(queries, out)]
+    return out
+
+def embed_query(query: str) -> Optional[List[float]]:
+    """Query embedding through the in-process LRU/TTL cache."""
+    return embed_queries([query])[0]
+
+def search_many(queries: List[str], top_k: int = 6, where: Optional[Dict] = None) -> List[List[Tuple[str, Dict]]]:
+    """
+    search() for many queries sharing one filter: cached ones are answered from the
+    retrieval cache, the rest are embedded in one batch and sent as one store query.
+    """
+    gen = registry.generation(COLL_NAME)
+    wkey = json.dumps(where or {}, sort_keys=True)
+    keys = [(q, wkey, int(top_k), gen) for q in queries]
+    out: List[Optional[List[Tuple[str, Dict]]]] = [query_cache.retrievals.get(k) for k in keys]
+    todo = [i for i, hits in enumerate(out) if hits is None]
+    if todo:
+        embs = embed_queries([queries[i] for i in todo])
+        valid = [(i, e) for i, e in zip(todo, embs) if e is not None]
+        for i, e in zip(todo, embs):
+            if e is None:
+                out[i] = []
+        if valid:
+            results = get_collection().query(
+                query_embeddings=[e for _, e in valid],
+                n_results=max(1, int(top_k)),
+                where=where or None
+            )
+            for j, (i, _) in enumerate(valid):
+                hits = list(zip(results.get("documents", [])[j], results.get("metadatas", [])[j]))
+                query_cache.retrievals.put(keys[i], hits)
+                out[i] = hits
+    return [list(hits) for hits in out]
+
 def search(query: str, top_k: int = 6, where: Optional[Dict] = None) -> List[Tuple[str, Dict]]:
     """
     Return list of (document_text, metadata) using our own query embeddings.
     Optional `where` supports Chroma metadata filtering, e.g. {"type":"audio"}.
+    Results are cached until the next write/delete bumps the index generation.
     """
-    q_embs = embed_texts([query]) or []
-    if not q_embs:
-        return []
-    q_emb = q_embs[0]
-
-    results = collection.query(
-        query_embeddings=[q_emb],
-        n_results=max(1, int(top_k)),
-        where=where or {}
-    )
-    docs = results.get("documents", [[]])[0]
-    metas = results.get("metadatas", [[]])[0]
-    return list(zip(docs, metas))
+    return search_many([query], top_k, where)[0]
+
+def chunk_id(meta: Dict) -> Optional[str]:
+    """Store id of a hit from its metadata ("<doc_id>-<chunk>"; files use their path, YouTube its URL)."""
+    doc_id = meta.get("doc_id") or meta.get("path") or meta.get("url")
+    if doc_id is None or meta.get("chunk") is None:
+        return None
+    return f"{doc_id}-{meta['chunk']}"
+
+def get_embeddings(ids: List[str]) -> Dict[str, List[float]]:
+    """Stored embeddings of the given chunk ids (missing ids are left out)."""
+    ids = list(dict.fromkeys(i for i in ids if i))
+    if not ids:
+        return {}
+    res = get_collection().get(ids=ids, include=["embeddings"])
+    embs = res.get("embeddings")
+    if embs is None:
+        return {}
+    return dict(zip(res.get("ids", []), embs))
+
+def matches_where(meta: Dict, where: Optional[Dict]) -> bool:
+    """Evaluate a Chroma-style metadata filter ($and/$or/$eq/$ne/$in/$nin) in Python."""
+    if not where:
+        return True
+    for k, cond in where.items():
+        if k == "$and":
+            if not all(matches_where(meta, w) for w in cond):
+                return False
+        elif k == "$or":
+            if not any(matches_where(meta, w) for w in cond):
+                return False
+        elif isinstance(cond, dict):
+            v = meta.get(k)
+            for op, arg in cond.items():
+                if op == "$eq" and v != arg:
+                    return False
+                if op == "$ne" and v == arg:
+                    return False
+                if op == "$in" and v not in arg:
+                    return False
+                if op == "$nin" and v in arg:
+                    return False
+        elif meta.get(k) != cond:
+            return False
+    return True
+
+def lexical_search(query: str, top_k: int = 6, where: Optional[Dict] = None) -> List[Tuple[str, Dict]]:
+    """BM25 keyword search over the same chunks; same return shape and caching as search()."""
+    key = ("lexical", query, json.dumps(where or {}, sort_keys=True), int(top_k), registry.generation(COLL_NAME))
+    cached = query_cache.retrievals.get(key)
+    if cached is not None:
+        return list(cached)
+    _ensure_lexical()
+    # the filter runs inside the BM25 query, so only matching chunks compete for the top_k
+    hits = [(doc, meta) for _cid, doc, meta, _score in lexical.search(COLL_NAME, query, top_k=top_k, where=where)]
+    query_cache.retrievals.put(key, hits)
+    return list(hits)
+
+def _ensure_lexical() -> None:
+    """Build the BM25 index from the collection once if it predates the lexical index."""
+    global _lexical_ready
+    if _lexical_ready:
+        return
+    collection = get_collection()
+    if lexical.count(COLL_NAME) == 0 and collection.count() > 0:
+        offset, page, by_doc = 0, 2000, {}
+        while True:
+            res = collection.get(include=["documents", "metadatas"], limit=page, offset=offset)
+            ids = res.get("ids", []) or []
+            for cid, doc, meta in zip(ids, res.get("documents") or [], res.get("metadatas") or []):
+                doc_id = (meta or {}).get("doc_id") or cid.rpartition("-")[0] or cid
+                by_doc.setdefault(doc_id, []).append((cid, doc or "", meta or {}))
+            if len(ids) < page:
+                break
+            offset += page
+        for doc_id, rows in by_doc.items():
+            lexical.index_document(COLL_NAME, doc_id, [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows])
+        print(f"[Lexical] indexed {sum(len(r) for r in by_doc.values())} existing chunks")
+    _lexical_ready = True
+
+def _ensure_registry() -> None:
+    """Import chunk ids written before the document registry existed (one scan, once)."""
+    global _registry_ready
+    if _registry_ready:
+        return
+    if not registry.is_backfilled(COLL_NAME):
+        ids, offset, page = [], 0, 5000
+        while True:
+            res = get_collection().get(include=[], limit=page, offset=offset)
+            batch = res.get("ids", []) or []
+            ids.extend(batch)
+            if len(batch) < page:
+                break
+            offset += page
+        n = registry.backfill(COLL_NAME, ids)
+        print(f"[Registry] backfilled {n} documents from {len(ids)} chunks")
+    _registry_ready = True
+
+def warm() -> None:
+    """Do the one-time work (registry/BM25 backfills, embedder load) before the first query."""
+    _ensure_registry()
+    _ensure_lexical()
+    embed_query("warm up")
+
+def find_docs(substring: str, limit: int = 1000) -> List[str]:
+    """Doc ids (file paths, URLs) containing `substring`, from the registry's trigram index."""
+    _ensure_registry()
+    return registry.find_docs(COLL_NAME, substring, limit)
 
 def delete_by_prefix(doc_id_prefix: str) -> int:
     """
-    Delete all chunks whose id starts with <doc_id_prefix>- .
+    Delete all chunks of document <doc_id_prefix> (ids <doc_id_prefix>-0 .. -n) using the
+    document registry, without scanning the collection.
     Returns count deleted (best-effort).
     """
-    
     try:
-        
-        res = collection.get(include=["metadatas"])
-        ids = res.get("ids", [])
-        target_ids = [i for i in ids if i.startswith(f"{doc_id_prefix}-")]
-        if target_ids:
-            collection.delete(ids=target_ids)
-        return len(target_ids)
+        with file_lock(WRITE_LOCK):
+            _ensure_registry()
+            n = registry.get(COLL_NAME, doc_id_prefix)
+            if not n:
+                return 0
+            get_collection().delete(ids=registry.chunk_ids(doc_id_prefix, n))
+            registry.remove(COLL_NAME, doc_id_prefix)
+            try:
+                lexical.delete_document(COLL_NAME, doc_id_prefix)
+            except Exception as e:
+                print(f"[Lexical] delete failed for {doc_id_prefix}: {e}")
+            registry.bump_generation(COLL_NAME)
+        return n
     except Exception as e:
         print(f"[Delete] Failed for prefix {doc_id_prefix}: {e}")
         return 0
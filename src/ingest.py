@@ -1,25 +1,13 @@
+import os
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
-from src.extractors.pdf_extractor import extract_pdf
-from src.extractors.docx_extractor import extract_docx
-from src.extractors.pptx_extractor import extract_pptx
-from src.extractors.md_txt_extractor import extract_md, extract_txt
-from src.extractors.image_extractor import extract_image
-
-HAVE_AV = True
-try:
-    from src.extractors.av_extractor import extract_audio, extract_video
-except Exception:
-    HAVE_AV = False
-
-HAVE_YT = True
-try:
-    from src.extractors.youtube_extractor import extract_youtube
-except Exception:
-    HAVE_YT = False
-
-from src.indexer import add_document
+from src import extractors
+from src.indexer import add_document, delete_by_prefix
+from src import chunking
+from src.llm import embedding_model
+from src import manifest
+from src.utils import url_host
 
 SUPPORTED = {
     ".pdf", ".docx", ".pptx", ".ppt", ".md", ".txt",
@@ -36,59 +24,138 @@ EXT_TYPE = {
     ".mp4": "video", ".mov": "video", ".mkv": "video",
 }
 
+# Bump an entry whenever its extractor output changes so the manifest re-indexes those files.
+EXTRACTOR_VERSION = {
+    ".pdf": 2, ".docx": 1, ".pptx": 1, ".ppt": 1, ".md": 1, ".txt": 1,
+    ".png": 2, ".jpg": 2, ".jpeg": 2, ".bmp": 2, ".tif": 2, ".tiff": 2,
+    ".mp3": 2, ".wav": 2, ".m4a": 2,
+    ".mp4": 2, ".mov": 2, ".mkv": 2,
+}
+
+# Bump whenever the metadata stored with every chunk changes (2: "dir", "url_host"), so
+# files indexed with the old fields are re-indexed on the next incremental ingest.
+META_SCHEMA = 2
+
 def _ext(path: Union[str, Path]) -> str:
     return Path(path).suffix.lower()
 
 def _type_for_ext(ext: str) -> Optional[str]:
     return EXT_TYPE.get(ext)
 
+# extension -> extractor in src.extractors; each is imported the first time its kind of file is seen
+EXTRACTOR = {
+    ".pdf": "extract_pdf", ".docx": "extract_docx", ".pptx": "extract_pptx", ".ppt": "extract_pptx",
+    ".md": "extract_md", ".txt": "extract_txt",
+    ".png": "extract_image", ".jpg": "extract_image", ".jpeg": "extract_image",
+    ".bmp": "extract_image", ".tif": "extract_image", ".tiff": "extract_image",
+    ".mp3": "extract_audio", ".wav": "extract_audio", ".m4a": "extract_audio",
+    ".mp4": "extract_video", ".mov": "extract_video", ".mkv": "extract_video",
+}
+
+def _extractor(name: str) -> Optional[Callable]:
+    """src.extractors.<name>, or None when its dependencies are not installed."""
+    try:
+        return getattr(extractors, name)
+    except Exception as e:
+        print(f"[Ingest] {name} unavailable: {e}")
+        return None
+
+def _extract_text(path: str) -> str:
+    """Text of a file by extension; raises when no extractor is available or it fails."""
+    ext = _ext(path)
+    name = EXTRACTOR.get(ext)
+    fn = _extractor(name) if name else None
+    if fn is None:
+        raise RuntimeError(f"no extractor available for {ext or path}")
+    return fn(str(path)) or ""
+
 def extract_any(path: str) -> str:
     """Detect file type by extension and extract text; returns '' on unsupported/disabled features."""
-    p = Path(path)
-    ext = p.suffix.lower()
     try:
-        if ext == ".pdf":
-            return extract_pdf(str(p)) or ""
-        if ext == ".docx":
-            return extract_docx(str(p)) or ""
-        if ext in (".pptx", ".ppt"):
-            return extract_pptx(str(p)) or ""
-        if ext == ".md":
-            return extract_md(str(p)) or ""
-        if ext == ".txt":
-            return extract_txt(str(p)) or ""
-        if ext in (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"):
-            return extract_image(str(p)) or ""
-
-        # Audio
-        if ext in (".mp3", ".wav", ".m4a"):
-            if not HAVE_AV:
-                return ""
-            return extract_audio(str(p)) or ""
-
-        
-        if ext in (".mp4", ".mov", ".mkv"):
-            if not HAVE_AV:
-                return ""
-            return extract_video(str(p)) or ""
-    except Exception as e:
-        return f""
+        return _extract_text(path)
+    except Exception:
+        return ""
+
+def _ingest_settings(ext: str) -> Dict:
+    """Everything that shapes the stored chunks of a file; a change forces re-indexing."""
+    return {
+        "extractor": f"{ext}:{EXTRACTOR_VERSION.get(ext, 0)}",
+        "meta_schema": META_SCHEMA,
+        "chunking": chunking.settings(),
+        "embedding_provider": os.getenv("EMBEDDING_PROVIDER", "gemini").lower(),
+        "embedding_model": embedding_model(),
+    }
+
+def _join_parts(parts: List[Tuple[str, Dict]]) -> Tuple[str, List[Tuple[int, int, Dict]]]:
+    """Join (text, chunk_meta) parts with newlines and remember each part's character range."""
+    texts, spans, pos = [], [], 0
+    for text, meta in parts:
+        text = (text or "").strip()
+        if not text:
+            continue
+        if texts:
+            pos += 1
+        spans.append((pos, pos + len(text), meta))
+        texts.append(text)
+        pos += len(text)
+    return "\n".join(texts), spans
 
-    return ""
+def extract_with_spans(path: str, strict: bool = False) -> Tuple[str, List[Tuple[int, int, Dict]]]:
+    """
+    Like extract_any, but also returns (start, end, meta) character spans for extractors
+    that know where their text came from (PDF page numbers, transcript timestamps).
+    strict=True raises on extractor failure instead of returning an empty document.
+    """
+    ext = _ext(path)
+    try:
+        if ext == ".pdf":
+            pages = _extractor("extract_pdf_pages")(str(path))
+            return _join_parts([(t, {"page_start": n, "page_end": n}) for n, t in pages])
+        transcribe = _extractor("transcribe_media_segments") if EXT_TYPE.get(ext) in ("audio", "video") else None
+        if transcribe is not None:
+            segs = transcribe(str(path))
+            return _join_parts([(s["text"], {"t_start": s["start"], "t_end": s["end"]}) for s in segs])
+        return _extract_text(path), []
+    except Exception:
+        if strict:
+            raise
+        return "", []
 
-def ingest_path(path: str):
+def ingest_path(path: str, force: bool = False, workers: int = 1, progress: Optional[Callable] = None,
+                preview: int = 0, stop: Optional[Callable[[], bool]] = None):
     """
     Ingest a file or a folder.
-    - Directory: returns dict with totals and per-file results.
-    - File: returns per-file result dict.
+    - Directory: returns dict with totals and per-file results. Files whose size/mtime/hash
+      and ingest settings match the manifest are skipped unless force=True.
+      workers > 1 runs the parallel pipeline (process pool extraction, batched embedding,
+      single writer); progress(done, total, result) is called once per file.
+      Images are OCR'd in batches (extract_files), everything else one file at a time.
+      stop() is checked between extraction units; once it returns True the rest are left out.
+    - File: returns per-file result dict (always re-indexed).
+    preview > 0 adds the first `preview` characters of the extracted text to each indexed
+    file's result, so callers need not extract the file a second time to show it.
     """
     p = Path(path)
 
     if p.is_dir():
-        results: List[Dict] = []
-        for f in p.rglob("*"):
-            if f.is_file() and f.suffix.lower() in SUPPORTED:
-                results.append(ingest_path(str(f)))
+        files = [f for f in p.rglob("*") if f.is_file() and f.suffix.lower() in SUPPORTED]
+        if workers and workers > 1:
+            from src.pipeline import ingest_files
+            results = ingest_files(files, workers=workers, incremental=not force, progress=progress, stop=stop,
+                                   preview=preview)
+        else:
+            results: List[Optional[Dict]] = [None] * len(files)
+            done = 0
+            for unit in extract_units(files):
+                if stop and stop():
+                    break
+                jobs = extract_files([str(files[i]) for i in unit], incremental=not force)
+                for i, job in zip(unit, jobs):
+                    results[i] = _index_job(job, preview)
+                    done += 1
+                    if progress:
+                        progress(done, len(files), results[i])
+            results = [r for r in results if r is not None]
         total_chars = sum(r.get("chars", 0) for r in results)
         ingested = sum(1 for r in results if not r.get("skipped"))
         skipped = [r for r in results if r.get("skipped")]
@@ -98,36 +165,153 @@ def ingest_path(path: str):
             "files_ingested": ingested,
             "total_chars": total_chars,
             "skipped_count": len(skipped),
+            "new": sum(1 for r in results if r.get("status") == "new"),
+            "changed": sum(1 for r in results if r.get("status") == "changed"),
+            "unchanged": sum(1 for r in results if r.get("status") == "unchanged"),
             "results": results,
         }
 
-    # File case
+    return _ingest_file(p, incremental=False, preview=preview)
+
+def _ingest_file(p: Path, incremental: bool, preview: int = 0) -> Dict:
+    return _index_job(extract_file(str(p), incremental), preview)
+
+def _index_job(job: Dict, preview: int = 0) -> Dict:
+    if "result" in job:
+        return job["result"]
+    res = index_file(job, lambda j: add_document(doc_id=j["doc_id"], text=j["text"], meta=j["meta"], spans=j.get("spans")))
+    if preview > 0:
+        res["preview"] = job["text"][:preview]
+    return res
+
+def _precheck(p: Path, incremental: bool) -> Dict:
+    """Manifest check: {"result": ...} when the file needs no work, else its status/fp/settings."""
     ext = _ext(p)
     if ext not in SUPPORTED or not p.is_file():
-        return {"path": str(p), "chars": 0, "skipped": "unsupported or not a file"}
+        return {"result": {"path": str(p), "chars": 0, "skipped": "unsupported or not a file"}}
 
+    settings = _ingest_settings(ext)
     try:
-        text = (extract_any(str(p)) or "").strip()
+        status, fp = manifest.check(str(p), settings)
     except Exception as e:
-        return {"path": str(p), "chars": 0, "skipped": f"extract failed: {e}"}
+        print(f"[Manifest] check failed for {p}: {e}")
+        status, fp = "new", None
 
-    if not text:
-        return {"path": str(p), "chars": 0, "skipped": "no text extracted"}
+    if incremental and status == "unchanged":
+        return {"result": {"path": str(p), "chars": 0, "skipped": "unchanged", "status": status}}
+    return {"status": status, "fp": fp, "settings": settings}
 
+def _job(p: Path, text: str, spans: List, check: Dict) -> Dict:
+    ext = _ext(p)
     meta = {
         "source": "file",
         "path": str(p),
         "name": p.name,
         "ext": ext,
+        "dir": str(p.parent),
         "type": _type_for_ext(ext) or "text",
     }
+    return {"doc_id": str(p), "path": str(p), "text": (text or "").strip(), "spans": spans, "meta": meta,
+            "status": check["status"], "fp": check["fp"], "settings": check["settings"]}
+
+def _failed(p: Path, e: Exception, check: Dict) -> Dict:
+    # a failed extraction is not an empty document: leave the manifest and any indexed
+    # chunks alone so the file is retried on the next run
+    return {"result": {"path": str(p), "chars": 0, "skipped": f"extract failed: {e}", "status": check["status"]}}
+
+def extract_file(path: str, incremental: bool) -> Dict:
+    """
+    First ingest stage (safe to run in a worker process): manifest check + extraction.
+    Returns {"result": ...} when the file is already done with, otherwise a job for index_file.
+    """
+    p = Path(path)
+    check = _precheck(p, incremental)
+    if "result" in check:
+        return check
+    try:
+        text, spans = extract_with_spans(str(p), strict=True)
+    except Exception as e:
+        return _failed(p, e, check)
+    return _job(p, text, spans, check)
+
+def extract_files(paths: List[str], incremental: bool) -> List[Dict]:
+    """
+    extract_file for several files, in order. Images that need extraction are OCR'd together
+    through extract_images, so the EasyOCR fallback runs batched over all of them.
+    """
+    out: List[Optional[Dict]] = [None] * len(paths)
+    ocr = []
+    for i, path in enumerate(paths):
+        p = Path(path)
+        if EXT_TYPE.get(_ext(p)) != "image":
+            out[i] = extract_file(str(p), incremental)
+            continue
+        check = _precheck(p, incremental)
+        if "result" in check:
+            out[i] = check
+        else:
+            ocr.append((i, p, check))
+    if ocr:
+        try:
+            batch = _extractor("extract_images")
+            if batch is None:
+                raise RuntimeError("no extractor available for images")
+            texts = batch([str(p) for _i, p, _c in ocr], strict=True)
+        except Exception as e:
+            texts = [e] * len(ocr)
+        for (i, p, check), text in zip(ocr, texts):
+            out[i] = _failed(p, text, check) if isinstance(text, Exception) else _job(p, text, [], check)
+    return out
+
+def extract_units(files: List[Path]) -> List[List[int]]:
+    """
+    Split `files` into extraction units (lists of indexes into `files`), ordered by their
+    first file: every non-image file alone, images INGEST_IMAGE_BATCH at a time.
+    """
+    size = max(1, int(os.getenv("INGEST_IMAGE_BATCH", 16)))
+    units, images = [], None
+    for i, f in enumerate(files):
+        if EXT_TYPE.get(_ext(f)) != "image":
+            units.append([i])
+            continue
+        if images is None or len(images) >= size:
+            images = []
+            units.append(images)
+        images.append(i)
+    return units
+
+def index_file(job: Dict, index: Callable[[Dict], Dict]) -> Dict:
+    """
+    Second ingest stage (must run in the single writer): index the extracted text through
+    `index(job)` (which replaces any previous version of the document) and update the manifest.
+    """
+    p = Path(job["path"])
+    status, text = job["status"], job["text"]
+
+    if not text:
+        # extraction succeeded but found no text (extract_file reports failures itself)
+        if status != "new":
+            delete_by_prefix(job["doc_id"])
+        # remember empty results too, so photos without text are not OCR'd on every run
+        _record(p, job["settings"], 0, job["fp"])
+        return {"path": str(p), "chars": 0, "skipped": "no text extracted", "status": status}
 
-    stats = add_document(doc_id=str(p), text=text, meta=meta)
-    return {"path": str(p), "chars": len(text), "added_chunks": stats.get("added", 0) if isinstance(stats, dict) else None}
+    stats = index(job)
+    added = stats.get("added", 0) if isinstance(stats, dict) else None
+    if added:
+        _record(p, job["settings"], added, job["fp"])
+    return {"path": str(p), "chars": len(text), "added_chunks": added, "status": status}
+
+def _record(p: Path, settings: Dict, chunks: int, fp: Optional[Dict]) -> None:
+    try:
+        manifest.record(str(p), settings, chunks, fp)
+    except Exception as e:
+        print(f"[Manifest] record failed for {p}: {e}")
 
 def ingest_youtube(url: str):
     """Download YT audio and ingest the transcript as a doc."""
-    if not HAVE_YT:
+    extract_youtube = _extractor("extract_youtube")
+    if extract_youtube is None:
         return {"youtube": url, "chars": 0, "skipped": "yt modules not available"}
 
     try:
@@ -138,6 +322,6 @@ def ingest_youtube(url: str):
     if not text:
         return {"youtube": url, "chars": 0, "skipped": "no text extracted"}
 
-    meta = {"source": "youtube", "url": url, "type": "audio", "ext": ".yt"}
+    meta = {"source": "youtube", "url": url, "url_host": url_host(url), "type": "audio", "ext": ".yt"}
     stats = add_document(doc_id=url, text=text, meta=meta)
     return {"youtube": url, "chars": len(text), "added_chunks": stats.get("added", 0) if isinstance(stats, dict) else None}
@@ -0,0 +1,234 @@
+import os
+import math
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.vector_store import FlatStore, VECTOR_DTYPE, _normalize, _top_k
+
+IVF_NLIST = int(os.getenv("IVF_NLIST", 0))          # coarse lists; 0 = about 4 * sqrt(n)
+IVF_PQ_M = int(os.getenv("IVF_PQ_M", 32))           # PQ sub-quantizers (bytes per vector)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16))       # lists visited per query
+IVF_RERANK = int(os.getenv("IVF_RERANK", 200))      # shortlist re-scored with the full vectors
+IVF_TRAIN_SAMPLE = int(os.getenv("IVF_TRAIN_SAMPLE", 100000))
+_BLOCK = 8192
+
+def _mm(f: Path, dtype, shape: Tuple[int, ...]) -> np.memmap:
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if not f.exists() or f.stat().st_size < size:
+        with open(f, "ab") as fh:
+            fh.truncate(size)
+    return np.memmap(f, dtype=dtype, mode="r+", shape=shape)
+
+def _nearest(X: np.ndarray, C: np.ndarray) -> np.ndarray:
+    """Index of the nearest (L2) row of C for every row of X."""
+    cn = (C * C).sum(1)
+    out = np.empty(len(X), dtype=np.int32)
+    for s in range(0, len(X), _BLOCK):
+        out[s:s + _BLOCK] = np.argmin(cn - 2.0 * (X[s:s + _BLOCK] @ C.T), axis=1)
+    return out
+
+def kmeans(X: np.ndarray, k: int, iters: int = 20, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd's k-means; empty clusters are re-seeded from random points."""
+    rng = np.random.default_rng(seed)
+    k = max(1, min(k, len(X)))
+    C = X[rng.choice(len(X), k, replace=False)].astype(np.float32)
+    for _ in range(iters):
+        a = _nearest(X, C)
+        counts = np.bincount(a, minlength=k)
+        order = np.argsort(a, kind="stable")
+        full = counts > 0
+        starts = np.searchsorted(a[order], np.flatnonzero(full))
+        C[full] = np.add.reduceat(X[order], starts, axis=0) / counts[full, None]
+        if not full.all():
+            C[~full] = X[rng.choice(len(X), int((~full).sum()))]
+    return C
+
+class IVFPQStore(FlatStore):
+    """
+    FlatStore plus a compressed approximate index: vectors are assigned to IVF lists
+    (k-means centroids) and their residuals product-quantized to IVF_PQ_M bytes.
+    A query visits the IVF_NPROBE closest lists, ranks them by the PQ estimate and
+    re-scores the IVF_RERANK best against the full vectors, which stay on disk in the
+    memory map and are only touched for that shortlist.
+
+    Until train() is called (and for rows added since that could not be encoded)
+    search is exact. Writes after training are encoded incrementally.
+    """
+
+    def __init__(self, path: str, dtype: str = VECTOR_DTYPE):
+        self._model: Optional[Dict[str, np.ndarray]] = None
+        self._lists = None       # int32 per row: IVF list + 1, 0 = not encoded
+        self._codes = None       # uint8 (rows, M)
+        self._inv = None         # (row order, list offsets), rebuilt after writes
+        self._model_mtime = None
+        self._load_model(Path(path) / "ivfpq.npz")
+        super().__init__(path, dtype)
+
+    def _load_model(self, f: Path) -> None:
+        mtime = f.stat().st_mtime_ns if f.exists() else None
+        if mtime == self._model_mtime:
+            return
+        self._model = None
+        if mtime is not None:
+            with np.load(f) as z:
+                self._model = {"centroids": z["centroids"], "codebooks": z["codebooks"]}
+        self._model_mtime = mtime
+
+    # ---- files ----
+
+    def _open(self, capacity: int) -> None:
+        super()._open(capacity)
+        self._open_codes(capacity)
+
+    def _open_codes(self, capacity: int) -> None:
+        self._lists = self._codes = None
+        if self._model is None or not capacity:
+            return
+        m = self._model["codebooks"].shape[0]
+        self._lists = _mm(self.path / "lists.i32", np.int32, (capacity,))
+        self._codes = _mm(self.path / "codes.u8", np.uint8, (capacity, m))
+
+    # ---- encoding ----
+
+    def _encode(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        C, CB = self._model["centroids"], self._model["codebooks"]
+        m, _, dsub = CB.shape
+        a = _nearest(X, C)
+        R = X - C[a]
+        if R.shape[1] < m * dsub:
+            R = np.pad(R, ((0, 0), (0, m * dsub - R.shape[1])))
+        codes = np.empty((len(X), m), dtype=np.uint8)
+        for i in range(m):
+            codes[:, i] = _nearest(R[:, i * dsub:(i + 1) * dsub], CB[i])
+        return a, codes
+
+    def _on_upsert(self, rows: np.ndarray, vecs: np.ndarray) -> None:
+        if self._model is None:
+            return
+        if self._lists is None or len(self._lists) < self._mat.shape[0]:
+            self._open_codes(self._mat.shape[0])
+        a, codes = self._encode(vecs)
+        self._lists[rows] = a + 1
+        self._codes[rows] = codes
+        self._lists.flush()
+        self._codes.flush()
+        self._inv = None
+
+    def _on_delete(self, rows: np.ndarray) -> None:
+        if self._lists is not None:
+            self._lists[rows] = 0
+            self._lists.flush()
+        self._inv = None
+
+    def _on_reload(self) -> None:
+        # another process wrote rows or retrained: pick up its model and code files
+        self._load_model(self.path / "ivfpq.npz")
+        self._open_codes(self._mat.shape[0] if self._mat is not None else 0)
+        self._inv = None
+
+    def train(self, nlist: Optional[int] = None, m: Optional[int] = None,
+              sample: int = IVF_TRAIN_SAMPLE, iters: int = 12) -> Dict:
+        """(Re)build centroids and codebooks from the stored vectors, then encode every row."""
+        with self._writing():
+            live = np.flatnonzero(self._alive[:self._rows])
+            if len(live) < 256:
+                raise ValueError(f"need at least 256 vectors to train, have {len(live)}")
+            rng = np.random.default_rng(0)
+            pick = np.sort(rng.choice(live, min(max(256, sample), len(live)), replace=False))
+            X = np.asarray(self._mat[pick], dtype=np.float32)
+
+            nlist = nlist or IVF_NLIST or int(4 * math.sqrt(len(live)))
+            nlist = max(1, min(nlist, len(X) // 39 or 1))   # ~39+ training points per list
+            C = kmeans(X, nlist, iters)
+            m = max(1, min(m or IVF_PQ_M, self.dim))
+            dsub = -(-self.dim // m)
+            # 256 centroids per sub-space need far fewer points than the coarse quantizer
+            Xp = X[rng.choice(len(X), min(len(X), 256 * 64), replace=False)]
+            R = Xp - C[_nearest(Xp, C)]
+            R = np.pad(R, ((0, 0), (0, m * dsub - self.dim)))
+            CB = np.stack([kmeans(R[:, i * dsub:(i + 1) * dsub], 256, iters) for i in range(m)])
+
+            tmp = self.path / "ivfpq.tmp.npz"
+            np.savez(tmp, centroids=C, codebooks=CB)
+            os.replace(tmp, self.path / "ivfpq.npz")
+            self._model = {"centroids": C, "codebooks": CB}
+            self._model_mtime = (self.path / "ivfpq.npz").stat().st_mtime_ns
+            for f in ("lists.i32", "codes.u8"):
+                (self.path / f).unlink(missing_ok=True)
+            self._open_codes(self._mat.shape[0])
+            for s in range(0, len(live), _BLOCK):
+                rows = live[s:s + _BLOCK]
+                a, codes = self._encode(np.asarray(self._mat[rows], dtype=np.float32))
+                self._lists[rows] = a + 1
+                self._codes[rows] = codes
+            self._lists.flush()
+            self._codes.flush()
+            self._inv = None
+            with self._db:
+                self._save_info()   # other processes reload the model on their next operation
+        return {"vectors": int(len(live)), "train_sample": int(len(X)), "nlist": int(len(C)),
+                "m": int(m), "bytes_per_vector": int(m) + 4}
+
+    # ---- search ----
+
+    def _inverted(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._inv is None:
+            lists = np.asarray(self._lists[:self._rows])
+            order = np.argsort(lists, kind="stable")
+            offsets = np.searchsorted(lists[order], np.arange(len(self._model["centroids"]) + 2))
+            self._inv = (order, offsets)
+        return self._inv
+
+    def _search(self, Q: np.ndarray, k: int, cand: Optional[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if self._model is None or self._lists is None:
+            return super()._search(Q, k, cand)
+        C, CB = self._model["centroids"], self._model["codebooks"]
+        m, _, dsub = CB.shape
+        nlist = len(C)
+        nprobe = max(1, min(IVF_NPROBE, nlist))
+        # a selective prefilter leaves fewer rows than the probed lists would hold: score them exactly
+        if cand is not None and len(cand) <= self._rows * nprobe / nlist:
+            return super()._search(Q, k, cand)
+
+        order, offsets = self._inverted()
+        keep = self._alive[:self._rows].copy()
+        if cand is not None:
+            keep[:] = False
+            keep[cand] = True
+        coarse = Q @ C.T
+        Qp = np.pad(Q, ((0, 0), (0, m * dsub - Q.shape[1])))
+        unencoded = order[offsets[0]:offsets[1]]
+        unencoded = unencoded[keep[unencoded]]
+        out = []
+        for j in range(len(Q)):
+            probe = np.argpartition(-coarse[j], nprobe - 1)[:nprobe] + 1
+            rows = np.concatenate([order[offsets[lst]:offsets[lst + 1]] for lst in probe])
+            rows = rows[keep[rows]]
+            # inner product = q.centroid + q.residual, the latter looked up per sub-quantizer
+            table = np.einsum("md,mkd->mk", Qp[j].reshape(m, dsub), CB)
+            approx = coarse[j, self._lists[rows] - 1] + table[np.arange(m), self._codes[rows]].sum(1)
+            depth = max(k, IVF_RERANK)
+            if len(rows) > depth:
+                rows = rows[np.argpartition(-approx, depth - 1)[:depth]]
+            shortlist = np.sort(np.concatenate([rows, unencoded]))
+            exact = self._scores(shortlist, Q[j:j + 1])[:, 0]
+            out.append(_top_k(shortlist, exact, k))
+        return out
+
+    def recall(self, n_queries: int = 50, k: int = 10, noise: float = 0.05) -> float:
+        """recall@k of the approximate search against exact search, on perturbed stored vectors."""
+        with self._lock:
+            self._sync()
+            live = np.flatnonzero(self._alive[:self._rows])
+            if not len(live) or self._model is None:
+                return 1.0
+            rng = np.random.default_rng(1)
+            pick = rng.choice(live, min(n_queries, len(live)), replace=False)
+            Q = np.asarray(self._mat[np.sort(pick)], dtype=np.float32)
+            Q = _normalize(Q + noise * rng.standard_normal(Q.shape).astype(np.float32) / math.sqrt(self.dim))
+            approx = self._search(Q, k, None)
+            exact = FlatStore._search(self, Q, k, None)
+        hits = sum(len(set(a[0].tolist()) & set(e[0].tolist())) for a, e in zip(approx, exact))
+        return hits / float(sum(len(e[0]) for e in exact) or 1)
@@ -0,0 +1,297 @@
+"""
+Persistent ingestion job queue (SQLite). The app, the CLI and any number of worker
+processes share one queue, so batch and interactive ingest go through the same
+throttled set of workers:
+
+  submit()  -> pending -> running -> done | failed | cancelled
+
+Extraction runs in parallel across workers; the index writes themselves are serialized
+by the indexer's cross-process write lock (src.indexer.WRITE_LOCK).
+
+A job is identified by (kind, target): submitting a target that is already pending or
+running returns that job instead of queueing a second copy, and a pending job takes over
+the stronger options of the new request (force, more workers, a preview). Cancelling a
+pending job is immediate; a running one stops between files (a single file that is being
+transcribed runs to completion).
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from src.utils import PROJECT_ROOT, connect_sqlite
+
+JOBS_PATH = os.getenv("JOBS_PATH", str(PROJECT_ROOT / "data" / "jobs.sqlite3"))
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", 1))            # worker threads per process
+JOBS_POLL = float(os.getenv("JOBS_POLL", 1.0))              # seconds between polls when idle
+JOBS_STALE_SECONDS = float(os.getenv("JOBS_STALE_SECONDS", 3600))  # running w/o heartbeat -> requeued
+
+KINDS = ("path", "youtube")
+
+_conn = None
+_lock = threading.RLock()
+_threads: List[threading.Thread] = []
+_stop = threading.Event()
+
+def _db():
+    global _conn
+    if _conn is None:
+        _conn = connect_sqlite(JOBS_PATH)
+        _conn.row_factory = sqlite3.Row
+        _conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                target TEXT NOT NULL,
+                options TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                result TEXT,
+                cancel INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                created REAL NOT NULL,
+                started REAL,
+                updated REAL,
+                finished REAL
+            );
+            -- at most one active job per target
+            CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_target ON jobs(kind, target)
+                WHERE status IN ('pending', 'running');
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, id);
+            """
+        )
+        _conn.commit()
+    return _conn
+
+def _row(r: Optional[sqlite3.Row]) -> Optional[Dict]:
+    if r is None:
+        return None
+    job = dict(r)
+    job["options"] = json.loads(job["options"] or "{}")
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel"] = bool(job["cancel"])
+    return job
+
+def _merge_options(old: Dict, new: Dict) -> Dict:
+    """Combine two requests for one target: flags are OR'd, numbers take the maximum."""
+    out = dict(old)
+    for k, v in new.items():
+        cur = out.get(k)
+        if isinstance(v, bool) or isinstance(cur, bool):
+            out[k] = bool(cur) or bool(v)
+        elif isinstance(v, (int, float)) and isinstance(cur, (int, float)):
+            out[k] = max(cur, v)
+        elif v is not None:
+            out[k] = v
+    return out
+
+def _target(kind: str, target: str) -> str:
+    if kind not in KINDS:
+        raise ValueError(f"unknown job kind {kind!r}, expected one of {KINDS}")
+    return os.path.abspath(target) if kind == "path" else target
+
+def active(kind: str, target: str) -> Optional[Dict]:
+    """The pending or running job for a target, if any."""
+    with _lock:
+        return _row(_db().execute("SELECT * FROM jobs WHERE kind=? AND target=? AND status IN ('pending', 'running')",
+                                  (kind, _target(kind, target))).fetchone())
+
+def submit(kind: str, target: str, **options) -> Dict:
+    """
+    Queue a job, or return the pending/running job for the same target (with "deduped": True).
+    A pending job absorbs the new options; a running one keeps its own.
+    """
+    target = _target(kind, target)
+    opts = json.dumps(options, sort_keys=True)
+    with _lock:
+        db = _db()
+        try:
+            cur = db.execute("INSERT INTO jobs(kind, target, options, status, created) VALUES (?, ?, ?, 'pending', ?)",
+                             (kind, target, opts, time.time()))
+            db.commit()
+            return get(cur.lastrowid)
+        except sqlite3.IntegrityError:
+            db.rollback()
+            job = active(kind, target)
+            if job is None:   # finished in between: queue it after all
+                return submit(kind, target, **options)
+            merged = _merge_options(job["options"], options)
+            if job["status"] == "pending" and merged != job["options"]:
+                db.execute("UPDATE jobs SET options=? WHERE id=? AND status='pending'",
+                           (json.dumps(merged, sort_keys=True), job["id"]))
+                db.commit()
+                job = get(job["id"])
+            return {**job, "deduped": True}
+
+def get(job_id: int) -> Optional[Dict]:
+    with _lock:
+        return _row(_db().execute("SELECT * FROM jobs WHERE id=?", (int(job_id),)).fetchone())
+
+def list_jobs(status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+    """Newest first; `status` may be one status or a comma-separated list."""
+    with _lock:
+        if status:
+            wanted = [s.strip() for s in status.split(",") if s.strip()]
+            rows = _db().execute(f"SELECT * FROM jobs WHERE status IN ({','.join('?' * len(wanted))}) ORDER BY id DESC LIMIT ?",
+                                 (*wanted, int(limit))).fetchall()
+        else:
+            rows = _db().execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (int(limit),)).fetchall()
+    return [_row(r) for r in rows]
+
+def counts() -> Dict[str, int]:
+    with _lock:
+        rows = _db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    return {s: n for s, n in rows}
+
+def cancel(job_id: int) -> Optional[Dict]:
+    """Cancel a pending job now, or ask a running one to stop after its current file."""
+    with _lock:
+        db = _db()
+        now = time.time()
+        db.execute("UPDATE jobs SET status='cancelled', cancel=1, finished=?, updated=? WHERE id=? AND status='pending'",
+                   (now, now, int(job_id)))
+        db.execute("UPDATE jobs SET cancel=1 WHERE id=? AND status='running'", (int(job_id),))
+        db.commit()
+    return get(job_id)
+
+def requeue_stale(max_age: float = JOBS_STALE_SECONDS) -> int:
+    """Put running jobs whose worker stopped reporting (crashed process) back in the queue."""
+    with _lock:
+        db = _db()
+        cur = db.execute("UPDATE jobs SET status='pending', worker=NULL, progress=0 "
+                         "WHERE status='running' AND COALESCE(updated, started, created) < ?",
+                         (time.time() - max_age,))
+        db.commit()
+    return cur.rowcount
+
+def _claim(worker: str) -> Optional[Dict]:
+    with _lock:
+        db = _db()
+        db.execute("BEGIN IMMEDIATE")   # claim atomically across processes
+        try:
+            r = db.execute("SELECT id FROM jobs WHERE status='pending' ORDER BY id LIMIT 1").fetchone()
+            if r is None:
+                db.rollback()
+                return None
+            now = time.time()
+            db.execute("UPDATE jobs SET status='running', worker=?, started=?, updated=?, progress=0 WHERE id=?",
+                       (worker, now, now, r[0]))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    return get(r[0])
+
+def _update(job_id: int, **fields) -> None:
+    fields["updated"] = time.time()
+    if "result" in fields:
+        fields["result"] = json.dumps(fields["result"], ensure_ascii=False, default=str)
+    with _lock:
+        db = _db()
+        db.execute(f"UPDATE jobs SET {', '.join(k + '=?' for k in fields)} WHERE id=?", (*fields.values(), job_id))
+        db.commit()
+
+def _cancel_requested(job_id: int) -> bool:
+    with _lock:
+        r = _db().execute("SELECT cancel FROM jobs WHERE id=?", (job_id,)).fetchone()
+    return bool(r and r[0])
+
+def _execute(job: Dict) -> Dict:
+    """Run one claimed job through the regular ingest functions."""
+    from src.ingest import ingest_path, ingest_youtube
+
+    opts = job["options"]
+    if job["kind"] == "youtube":
+        return ingest_youtube(job["target"])
+
+    def progress(done, total, res):
+        _update(job["id"], progress=done / float(total or 1), message=f"{done}/{total} {res.get('path')}")
+
+    return ingest_path(job["target"], force=bool(opts.get("force")), workers=int(opts.get("workers") or 1),
+                       progress=progress, preview=int(opts.get("preview") or 0),
+                       stop=lambda: _cancel_requested(job["id"]))
+
+def run_one(worker: Optional[str] = None) -> Optional[Dict]:
+    """Claim and run the oldest pending job. Returns the finished job, None when the queue is empty."""
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    job = _claim(worker)
+    if job is None:
+        return None
+    print(f"[Jobs] #{job['id']} {job['kind']} {job['target']} started")
+    # keep the heartbeat fresh while a single long file (no progress callbacks) is processed
+    done = threading.Event()
+    def heartbeat():
+        while not done.wait(60):
+            _update(job["id"])
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        result = _execute(job)
+        fields = {"status": "done", "progress": 1.0}
+        if _cancel_requested(job["id"]):
+            fields = {"status": "cancelled"}   # keep the progress it reached
+        _update(job["id"], result=result, finished=time.time(),
+                message=result.get("skipped") if isinstance(result, dict) else None, **fields)
+    except Exception as e:
+        print(f"[Jobs] #{job['id']} failed: {e}")
+        _update(job["id"], status="failed", message=str(e), finished=time.time())
+    finally:
+        done.set()
+    job = get(job["id"])
+    print(f"[Jobs] #{job['id']} {job['status']}")
+    return job
+
+def work(threads: int = JOBS_WORKERS, until_idle: bool = False, stop: Optional[threading.Event] = None) -> None:
+    """
+    Process the queue with `threads` worker threads until `stop` is set (or, with
+    until_idle, until the queue is empty). Several processes may work the same queue:
+    claims are atomic and index writes go through the indexer's write lock.
+    """
+    stop = stop or threading.Event()
+    requeue_stale()
+
+    def loop():
+        while not stop.is_set():
+            try:
+                job = run_one()
+            except Exception as e:
+                print(f"[Jobs] worker error: {e}")
+                job = None
+            if job is None:
+                if until_idle:
+                    return
+                stop.wait(JOBS_POLL)
+
+    pool = [threading.Thread(target=loop, name=f"jobs-{i}", daemon=True) for i in range(max(1, threads))]
+    for t in pool:
+        t.start()
+    try:
+        for t in pool:
+            while t.is_alive():
+                t.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        print("[Jobs] stopping after the current jobs")
+        for t in pool:
+            t.join()
+
+def start_workers(threads: int = JOBS_WORKERS) -> None:
+    """Start background worker threads in this process (once); used by the app and the server."""
+    with _lock:
+        if any(t.is_alive() for t in _threads):
+            return
+        _stop.clear()
+        t = threading.Thread(target=work, kwargs={"threads": threads, "stop": _stop}, name="jobs", daemon=True)
+        t.start()
+        _threads[:] = [t]
+
+def stop_workers(wait: bool = True) -> None:
+    """Stop the background workers once their current jobs finish."""
+    _stop.set()
+    if wait:
+        for t in list(_threads):
+            t.join()
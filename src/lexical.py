@@ -0,0 +1,140 @@
+import os
+import re
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.utils import PROJECT_ROOT, connect_sqlite
+
+LEXICAL_DIR = os.getenv("LEXICAL_DIR", str(PROJECT_ROOT / "data" / "lexical"))
+
+# identifiers such as ERR-1042 or part_no_7 stay single tokens
+_TOKENIZE = "unicode61 remove_diacritics 2 tokenchars '-_'"
+_QUERY_TOKEN = re.compile(r"[\w][\w\-]*")
+
+# metadata kept as columns so filters run in SQL (the filter keys retriever._plan pushes down)
+FIELDS = ("source", "type", "name", "ext", "dir", "path", "url", "url_host")
+
+_conns: Dict[str, object] = {}
+_lock = threading.RLock()
+
+def _db(collection: str):
+    conn = _conns.get(collection)
+    if conn is None:
+        conn = connect_sqlite(os.path.join(LEXICAL_DIR, f"{collection}.sqlite3"))
+        conn.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS chunks (
+                rowid INTEGER PRIMARY KEY,
+                chunk_id TEXT UNIQUE NOT NULL,
+                doc_id TEXT NOT NULL,
+                document TEXT NOT NULL,
+                meta TEXT NOT NULL,
+                {", ".join(f"{f} TEXT" for f in FIELDS)}
+            );
+            CREATE INDEX IF NOT EXISTS chunks_doc ON chunks (doc_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                document, content='chunks', content_rowid='rowid', tokenize="{_TOKENIZE}"
+            );
+            """
+        )
+        conn.commit()
+        _conns[collection] = conn
+    return conn
+
+def _delete_rows(conn, rows) -> None:
+    for rowid, document in rows:
+        # external-content FTS5: postings are removed by replaying the old text
+        conn.execute("INSERT INTO chunks_fts(chunks_fts, rowid, document) VALUES ('delete', ?, ?)", (rowid, document))
+        conn.execute("DELETE FROM chunks WHERE rowid = ?", (rowid,))
+
+def index_document(collection: str, doc_id: str, ids: List[str], texts: List[str], metas: List[Dict]) -> None:
+    """Replace the lexical postings of one document."""
+    with _lock:
+        conn = _db(collection)
+        with conn:
+            _delete_rows(conn, conn.execute("SELECT rowid, document FROM chunks WHERE doc_id = ?", (doc_id,)).fetchall())
+            for cid, text, meta in zip(ids, texts, metas):
+                meta = meta or {}
+                cur = conn.execute(
+                    f"INSERT INTO chunks (chunk_id, doc_id, document, meta, {', '.join(FIELDS)}) "
+                    f"VALUES (?, ?, ?, ?, {', '.join('?' * len(FIELDS))})",
+                    (cid, doc_id, text or "", json.dumps(meta, ensure_ascii=False), *(meta.get(f) for f in FIELDS)),
+                )
+                conn.execute("INSERT INTO chunks_fts(rowid, document) VALUES (?, ?)", (cur.lastrowid, text or ""))
+
+def delete_document(collection: str, doc_id: str) -> int:
+    with _lock:
+        conn = _db(collection)
+        with conn:
+            rows = conn.execute("SELECT rowid, document FROM chunks WHERE doc_id = ?", (doc_id,)).fetchall()
+            _delete_rows(conn, rows)
+    return len(rows)
+
+def count(collection: str) -> int:
+    with _lock:
+        return _db(collection).execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+def match_query(query: str, max_terms: int = 32) -> str:
+    """Turn free text into an FTS5 OR-query of quoted terms (no FTS syntax leaks through)."""
+    terms = list(dict.fromkeys(t.lower().strip("-") for t in _QUERY_TOKEN.findall(query or "")))
+    terms = [t for t in terms if t][:max_terms]
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+def where_sql(where: Optional[Dict]) -> Tuple[str, List]:
+    """
+    Chroma-style filter ($and/$or/$eq/$ne/$in/$nin) as a SQL condition over the metadata
+    columns, with the same semantics as indexer.matches_where. Raises ValueError for keys
+    that are not columns.
+    """
+    parts, args = [], []
+    for k, cond in (where or {}).items():
+        if k in ("$and", "$or"):
+            subs = [where_sql(w) for w in cond]
+            if subs:
+                parts.append("(" + f" {k[1:].upper()} ".join(sql for sql, _a in subs) + ")")
+                args += [a for _sql, sub_args in subs for a in sub_args]
+            continue
+        if k not in FIELDS:
+            raise ValueError(f"lexical index cannot filter on {k!r}")
+        col = f"c.{k}"
+        for op, arg in (cond.items() if isinstance(cond, dict) else [("$eq", cond)]):
+            if op == "$eq":
+                parts.append(f"{col} = ?")
+                args.append(arg)
+            elif op == "$ne":
+                parts.append(f"{col} IS NOT ?")
+                args.append(arg)
+            elif op in ("$in", "$nin"):
+                arg = list(arg)
+                inside = f"{col} IN ({', '.join('?' * len(arg))})" if arg else "0"
+                parts.append(inside if op == "$in" else f"({col} IS NULL OR NOT {inside})")
+                args += arg
+            else:
+                raise ValueError(f"unsupported filter operator {op!r}")
+    return " AND ".join(parts) or "1", args
+
+def search(collection: str, query: str, top_k: int = 20,
+           where: Optional[Dict] = None) -> List[Tuple[str, str, Dict, float]]:
+    """
+    BM25 search. Returns [(chunk_id, document, metadata, score)], best first.
+    `where` (see where_sql) is applied inside the query, so only matching chunks compete
+    for the top_k.
+    """
+    q = match_query(query)
+    if not q:
+        return []
+    cond, args = where_sql(where)
+    with _lock:
+        try:
+            rows = _db(collection).execute(
+                "SELECT c.chunk_id, c.document, c.meta, bm25(chunks_fts) AS s "
+                "FROM chunks_fts JOIN chunks c ON c.rowid = chunks_fts.rowid "
+                f"WHERE chunks_fts MATCH ? AND {cond} ORDER BY s LIMIT ?",
+                (q, *args, max(1, int(top_k))),
+            ).fetchall()
+        except Exception as e:
+            print(f"[Lexical] query failed: {e}")
+            return []
+    # sqlite's bm25() is lower-is-better; flip it so larger means more relevant
+    return [(cid, doc, json.loads(meta), -score) for cid, doc, meta, score in rows]
@@ -1,6 +1,6 @@
 import os
 import re
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
 def _env(k: str, d: str = "") -> str:
     return os.getenv(k, d)
@@ -16,55 +16,67 @@ def _get_genai():
         if not key:
             print("GEMINI INIT: missing GOOGLE_API_KEY")
             return None
-        genai.configure(api_key=key, transport="rest")
+        opts = {"api_endpoint": _env("GEMINI_API_ENDPOINT")} if _env("GEMINI_API_ENDPOINT") else None
+        genai.configure(api_key=key, transport="rest", client_options=opts)
         _genai = genai
         return _genai
     except Exception as e:
         print("GEMINI INIT ERROR:", e)
         return None
 
-def _embed_gemini(texts: List[str]) -> Optional[List[List[float]]]:
+def _gemini_batch(genai, texts: List[str], task_type: str) -> List[List[float]]:
+    """One request's worth of texts; errors propagate so the scheduler can retry them."""
+    model = _env("MODEL_GEMINI", "text-embedding-004")
+    if hasattr(genai, "batch_embed_contents"):
+        out = genai.batch_embed_contents(
+            model=model,
+            contents=[{"parts": [t or ""]} for t in texts],
+            task_type=task_type,
+        )
+        if isinstance(out, dict) and "embeddings" in out:
+            return [e["values"] for e in out["embeddings"]]
+        if hasattr(out, "embeddings"):
+            return [getattr(e, "values", e) for e in out.embeddings]
+
+    embs: List[List[float]] = []
+    for t in texts:
+        res = genai.embed_content(
+            model=model,
+            content={"parts": [t or ""]},
+            task_type=task_type,
+        )
+        if isinstance(res, dict) and "embedding" in res and "values" in res["embedding"]:
+            embs.append(res["embedding"]["values"])
+        elif hasattr(res, "embedding"):
+            val = getattr(res.embedding, "values", None)
+            if val:
+                embs.append(val)
+    return embs
+
+def _embed_gemini(texts: List[str], task_type: str = "retrieval_document") -> Optional[List[List[float]]]:
     genai = _get_genai()
     if genai is None:
         return None
+    from src.embed_scheduler import run_batched, gemini_settings
     try:
-        if hasattr(genai, "batch_embed_contents"):
-            out = genai.batch_embed_contents(
-                model=_env("MODEL_GEMINI", "text-embedding-004"),
-                contents=[{"parts": [t or ""]} for t in texts],
-                task_type="retrieval_document",
-            )
-            if isinstance(out, dict) and "embeddings" in out:
-                return [e["values"] for e in out["embeddings"]]
-            if hasattr(out, "embeddings"):
-                return [getattr(e, "values", e) for e in out.embeddings]
-
-        embs: List[List[float]] = []
-        for t in texts:
-            res = genai.embed_content(
-                model=_env("MODEL_GEMINI", "text-embedding-004"),
-                content={"parts": [t or ""]},
-                task_type="retrieval_document",
-            )
-            if isinstance(res, dict) and "embedding" in res and "values" in res["embedding"]:
-                embs.append(res["embedding"]["values"])
-            elif hasattr(res, "embedding"):
-                val = getattr(res.embedding, "values", None)
-                if val:
-                    embs.append(val)
+        embs = run_batched(texts, lambda part: _gemini_batch(genai, part, task_type), **gemini_settings())
         return embs if embs else None
     except Exception as e:
         print("GEMINI EMBED ERROR:", e)
         return None
 
 _local_sbert = None
+LOCAL_EMBED_MODEL = "all-MiniLM-L6-v2"
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    provider = _env("EMBEDDING_PROVIDER", "gemini").lower()
-    texts = [t if isinstance(t, str) else "" for t in texts]
+def embedding_model() -> str:
+    """Name of the model that embed_texts currently uses (for manifests/caches)."""
+    if _env("EMBEDDING_PROVIDER", "gemini").lower() == "gemini":
+        return _env("MODEL_GEMINI", "text-embedding-004")
+    return LOCAL_EMBED_MODEL
 
+def _embed_uncached(texts: List[str], provider: str, task_type: str) -> List[List[float]]:
     if provider == "gemini":
-        embs = _embed_gemini(texts)
+        embs = _embed_gemini(texts, task_type)
         if not embs:
             raise RuntimeError("Gemini embedding failed (no fallback). Check key/model/network.")
         return embs
@@ -73,10 +85,42 @@ def embed_texts(texts: List[str]) -> List[List[float]]:
     global _local_sbert
     if _local_sbert is None:
         from sentence_transformers import SentenceTransformer
-        _local_sbert = SentenceTransformer("all-MiniLM-L6-v2")
+        _local_sbert = SentenceTransformer(LOCAL_EMBED_MODEL)
     arr = _local_sbert.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
     return arr.tolist()
 
+def embed_texts(texts: List[str], task_type: str = "retrieval_document") -> List[List[float]]:
+    provider = _env("EMBEDDING_PROVIDER", "gemini").lower()
+    texts = [t if isinstance(t, str) else "" for t in texts]
+
+    from src import embed_cache
+    if not texts or not embed_cache.enabled():
+        return _embed_uncached(texts, provider, task_type)
+
+    model = embedding_model()
+    try:
+        cached = embed_cache.get_many(provider, model, task_type, texts)
+    except Exception as e:
+        print("EMBED CACHE ERROR:", e)
+        cached = {}
+
+    missing = [i for i in range(len(texts)) if i not in cached]
+    if missing:
+        # embed each distinct missing text once
+        uniq = list(dict.fromkeys(texts[i] for i in missing))
+        fresh = _embed_uncached(uniq, provider, task_type)
+        if len(fresh) != len(uniq):
+            return fresh
+        by_text = dict(zip(uniq, fresh))
+        for i in missing:
+            cached[i] = by_text[texts[i]]
+        try:
+            embed_cache.put_many(provider, model, task_type, uniq, fresh)
+        except Exception as e:
+            print("EMBED CACHE ERROR:", e)
+
+    return [cached[i] for i in range(len(texts))]
+
 def _answer_locally(prompt: str, context: str) -> str:
     if not context.strip():
         return "No relevant context found."
@@ -111,6 +155,9 @@ def _system_prompt() -> str:
         "list them explicitly."
     )
 
+def _full_prompt(prompt: str, context: str) -> str:
+    return f"{_system_prompt()}\n\nContext:\n{context}\n\nQuestion: {prompt}"
+
 def chat_rag(prompt: str, context: str) -> str:
     provider = _env("CHAT_PROVIDER", "local").lower()
 
@@ -124,9 +171,38 @@ def chat_rag(prompt: str, context: str) -> str:
     try:
         model_name = _env("CHAT_MODEL", "gemini-1.5-flash")
         model = genai.GenerativeModel(model_name)
-        full = f"{_system_prompt()}\n\nContext:\n{context}\n\nQuestion: {prompt}"
-        resp = model.generate_content(full)
+        resp = model.generate_content(_full_prompt(prompt, context))
         return getattr(resp, "text", "") or _answer_locally(prompt, context)
     except Exception as e:
         print("GEMINI CALL FAILED:", e)
         return _answer_locally(prompt, context)
+
+def chat_rag_stream(prompt: str, context: str) -> Iterator[str]:
+    """
+    Like chat_rag, but yields the answer in pieces as Gemini produces them.
+    Nothing is requested until the first piece is read. Falls back to the local
+    answer if Gemini is unavailable or fails before producing any text.
+    """
+    provider = _env("CHAT_PROVIDER", "local").lower()
+    genai = _get_genai() if provider == "gemini" else None
+    if genai is None:
+        yield _answer_locally(prompt, context)
+        return
+
+    sent = False
+    try:
+        model_name = _env("CHAT_MODEL", "gemini-1.5-flash")
+        model = genai.GenerativeModel(model_name)
+        for part in model.generate_content(_full_prompt(prompt, context), stream=True):
+            try:
+                text = part.text
+            except Exception:
+                # e.g. a safety-blocked or empty candidate
+                text = ""
+            if text:
+                sent = True
+                yield text
+    except Exception as e:
+        print("GEMINI STREAM FAILED:", e)
+    if not sent:
+        yield _answer_locally(prompt, context)
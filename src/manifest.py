@@ -0,0 +1,87 @@
+import os
+import json
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+from src.utils import PROJECT_ROOT, connect_sqlite, file_sha256
+
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", str(PROJECT_ROOT / "data" / "manifest.sqlite3"))
+
+_conn = None
+# one connection shared by the pipeline writer and the job worker threads
+_lock = threading.RLock()
+
+def _db():
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = connect_sqlite(MANIFEST_PATH)
+            _conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    settings TEXT NOT NULL,
+                    chunks INTEGER NOT NULL DEFAULT 0,
+                    indexed_at REAL NOT NULL
+                )
+                """
+            )
+            _conn.commit()
+        return _conn
+
+def _settings_key(settings: Dict) -> str:
+    return json.dumps(settings or {}, sort_keys=True)
+
+def check(path: str, settings: Dict) -> Tuple[str, Dict]:
+    """
+    Compare a file against its manifest entry.
+    Returns (status, fingerprint) where status is 'new', 'changed' or 'unchanged'.
+    The content hash is only computed when size/mtime no longer match.
+    """
+    st = os.stat(path)
+    fp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": None}
+    with _lock:
+        row = _db().execute(
+            "SELECT size, mtime_ns, sha256, settings FROM files WHERE path = ?", (str(path),)
+        ).fetchone()
+    if row is None:
+        return "new", fp
+
+    size, mtime_ns, sha, stored = row
+    if stored != _settings_key(settings):
+        return "changed", fp
+    if size == fp["size"] and mtime_ns == fp["mtime_ns"]:
+        fp["sha256"] = sha
+        return "unchanged", fp
+
+    # touched but maybe not modified (copy, re-upload, checkout)
+    fp["sha256"] = file_sha256(path)
+    if fp["sha256"] != sha:
+        return "changed", fp
+    with _lock, _db() as conn:
+        conn.execute(
+            "UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+            (fp["size"], fp["mtime_ns"], str(path)),
+        )
+    return "unchanged", fp
+
+def record(path: str, settings: Dict, chunks: int, fp: Optional[Dict] = None) -> None:
+    """Store (or refresh) the manifest entry after a successful ingest."""
+    if fp is None:
+        st = os.stat(path)
+        fp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": None}
+    sha = fp.get("sha256") or file_sha256(path)
+    with _lock, _db() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256, settings, chunks, indexed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(path), fp["size"], fp["mtime_ns"], sha, _settings_key(settings), int(chunks), time.time()),
+        )
+
+def forget(path: str) -> None:
+    with _lock, _db() as conn:
+        conn.execute("DELETE FROM files WHERE path = ?", (str(path),))
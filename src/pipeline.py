@@ -0,0 +1,190 @@
+"""
+Parallel directory ingest:
+
+  process pool (extract_files) ->  bounded queue  ->  embedder thread (batched embed_texts)
+                               ->  bounded queue  ->  writer thread (Chroma upserts, manifest)
+
+At most `workers * 2` extraction units (one file, or a batch of images) are in flight at
+any time, so memory stays bounded no matter how large the folder is.
+"""
+import os
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from src.indexer import prepare_document, write_document
+from src.ingest import extract_units
+from src.llm import embed_texts
+
+EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", 64))
+
+_DONE = object()
+
+def _worker_init(workers: int) -> None:
+    """Runs once per extraction process; warm models stay resident for every file it handles."""
+    # share the cores with the other extraction processes instead of oversubscribing them
+    share = str(max(1, (os.cpu_count() or 1) // max(1, workers)))
+    os.environ.setdefault("AV_SEGMENT_WORKERS", share)
+    os.environ.setdefault("PDF_WORKERS", share)
+    if os.getenv("WHISPER_PRELOAD", "0").lower() in ("1", "true", "yes", "on"):
+        try:
+            from src.extractors.whisper_models import preload
+            preload()
+        except Exception as e:
+            print(f"[Pipeline] whisper preload failed: {e}")
+
+def _extract(paths: List[str], incremental: bool) -> List[Dict]:
+    from src.ingest import extract_files
+    try:
+        return extract_files(paths, incremental)
+    except Exception as e:
+        return [{"result": {"path": path, "chars": 0, "skipped": f"extract failed: {e}"}} for path in paths]
+
+def _embedder(in_q: "queue.Queue", out_q: "queue.Queue") -> None:
+    """Group small documents into one embed_texts call; flush when the input runs dry."""
+    pending: List[Dict] = []
+    n_chunks = 0
+
+    def flush():
+        nonlocal pending, n_chunks
+        if not pending:
+            return
+        texts = [c for job in pending if job.get("prepared") for c in job["prepared"]["chunks"]]
+        embeds: List[List[float]] = []
+        if texts:
+            try:
+                embeds = embed_texts(texts) or []
+            except Exception as e:
+                print(f"[Pipeline] embedding failed: {e}")
+            if len(embeds) != len(texts):
+                embeds = []
+        i = 0
+        for job in pending:
+            if job.get("prepared"):
+                n = len(job["prepared"]["chunks"])
+                job["embeds"] = embeds[i:i + n]
+                i += n
+            out_q.put(job)
+        pending, n_chunks = [], 0
+
+    while True:
+        try:
+            job = in_q.get(timeout=0.5)
+        except queue.Empty:
+            flush()
+            continue
+        if job is _DONE:
+            flush()
+            out_q.put(_DONE)
+            return
+        if "result" not in job and job.get("text"):
+            try:
+                job["prepared"] = prepare_document(job["doc_id"], job["text"], job["meta"], job.get("spans"))
+            except Exception as e:
+                # one bad document must not take the thread (and the queues behind it) down
+                job = {"result": {"path": job.get("path"), "chars": 0, "skipped": f"index failed: {e}",
+                                  "status": job.get("status")}, "_idx": job["_idx"]}
+            if job.get("prepared"):
+                n_chunks += len(job["prepared"]["chunks"])
+        pending.append(job)
+        if n_chunks >= EMBED_BATCH:
+            flush()
+
+def _put(q: "queue.Queue", item, consumer: threading.Thread) -> None:
+    """Blocking put that gives up once the thread draining `q` has died."""
+    while True:
+        try:
+            q.put(item, timeout=1.0)
+            return
+        except queue.Full:
+            if not consumer.is_alive():
+                raise RuntimeError(f"{consumer.name} thread stopped")
+
+def _write(job: Dict, preview: int = 0) -> Dict:
+    from src.ingest import index_file
+    if "result" in job:
+        return job["result"]
+
+    def index(j: Dict) -> Dict:
+        if not j.get("prepared"):
+            return {"chunks": 0, "added": 0}
+        return write_document(j["prepared"], j.get("embeds") or [])
+
+    res = index_file(job, index)
+    if preview > 0:
+        res["preview"] = job["text"][:preview]
+    return res
+
+def ingest_files(files: List[Path], workers: int, incremental: bool = True,
+                 progress: Optional[Callable] = None, stop: Optional[Callable[[], bool]] = None,
+                 preview: int = 0) -> List[Dict]:
+    """
+    Ingest many files through the pipeline. Returns per-file result dicts in the
+    same order as `files`, identical in shape to the serial ingest results.
+    Once stop() returns True no further files are started; those already in flight finish
+    and the files never started are left out of the results. preview works as in ingest_path.
+    """
+    total = len(files)
+    results: List[Optional[Dict]] = [None] * total
+    embed_q: "queue.Queue" = queue.Queue(maxsize=workers * 2)
+    write_q: "queue.Queue" = queue.Queue(maxsize=workers * 2)
+
+    def writer():
+        done = 0
+        while True:
+            job = write_q.get()
+            if job is _DONE:
+                return
+            try:
+                res = _write(job, preview)
+            except Exception as e:
+                res = {"path": job.get("path"), "chars": 0, "skipped": f"index failed: {e}"}
+            results[job["_idx"]] = res
+            done += 1
+            if progress:
+                try:
+                    progress(done, total, res)
+                except Exception:
+                    pass
+
+    t_embed = threading.Thread(target=_embedder, args=(embed_q, write_q), name="embedder", daemon=True)
+    t_write = threading.Thread(target=writer, name="writer", daemon=True)
+    t_embed.start()
+    t_write.start()
+
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_worker_init, initargs=(workers,)) as pool:
+            # images travel in batches (one EasyOCR pass each), other files one by one
+            todo = extract_units(files)[::-1]
+            running = {}
+            while todo or running:
+                if todo and stop and stop():
+                    todo = []
+                while todo and len(running) < workers * 2:
+                    unit = todo.pop()
+                    running[pool.submit(_extract, [str(files[i]) for i in unit], incremental)] = unit
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    unit = running.pop(fut)
+                    try:
+                        jobs = fut.result()
+                    except Exception as e:
+                        jobs = [{"result": {"path": str(files[i]), "chars": 0, "skipped": f"extract failed: {e}"}}
+                                for i in unit]
+                    for idx, job in zip(unit, jobs):
+                        job["_idx"] = idx
+                        _put(embed_q, job, t_embed)
+    finally:
+        try:
+            _put(embed_q, _DONE, t_embed)
+        except RuntimeError:
+            write_q.put(_DONE)   # the embedder is gone; let the writer finish what it has
+        t_embed.join()
+        t_write.join()
+
+    # like the serial loop: files never started (stop) are left out, the rest keep their order
+    return [r for r in results if r is not None]
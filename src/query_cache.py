@@ -0,0 +1,56 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self.data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None and (self.ttl <= 0 or time.monotonic() - item[0] < self.ttl):
+                self.data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self.data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self.lock:
+            self.data[key] = (time.monotonic(), value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {"size": len(self.data), "maxsize": self.maxsize, "hits": self.hits,
+                    "misses": self.misses, "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 1024))
+_TTL = float(os.getenv("QUERY_CACHE_TTL", 3600))
+
+# query text -> embedding (never stale for a given provider/model, which is part of the key)
+query_embeddings = TTLCache(_SIZE, _TTL)
+# (query, where, top_k, index generation) -> hits
+retrievals = TTLCache(_SIZE, _TTL)
+
+def stats() -> Dict:
+    return {"query_embeddings": query_embeddings.stats(), "retrieval": retrievals.stats()}
@@ -0,0 +1,162 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.utils import PROJECT_ROOT, connect_sqlite
+
+REGISTRY_PATH = os.getenv("REGISTRY_PATH", str(PROJECT_ROOT / "data" / "registry.sqlite3"))
+
+_conn = None
+_lock = threading.RLock()
+
+def _db():
+    global _conn
+    if _conn is None:
+        _conn = connect_sqlite(REGISTRY_PATH)
+        _conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                collection TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                n_chunks INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (collection, doc_id)
+            );
+            CREATE TABLE IF NOT EXISTS collections (
+                collection TEXT PRIMARY KEY,
+                backfilled INTEGER NOT NULL DEFAULT 0,
+                generation INTEGER NOT NULL DEFAULT 0
+            );
+            """
+        )
+        try:
+            # registries created before index generations existed
+            _conn.execute("ALTER TABLE collections ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass
+        _init_names(_conn)
+        _conn.commit()
+    return _conn
+
+_names = False   # trigram index over doc ids (paths / URLs) available
+
+def _init_names(conn) -> None:
+    """Substring index over doc ids: FTS5 trigram table, filled once from existing documents."""
+    global _names
+    try:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'doc_names'").fetchone()
+        if not exists:
+            conn.execute("CREATE VIRTUAL TABLE doc_names USING fts5(collection UNINDEXED, doc_id, tokenize='trigram')")
+            conn.execute("INSERT INTO doc_names (collection, doc_id) SELECT collection, doc_id FROM documents")
+        _names = True
+    except sqlite3.OperationalError:
+        # SQLite < 3.34 has no trigram tokenizer; find_docs falls back to LIKE
+        _names = False
+
+def _set_name(conn, collection: str, doc_id: str, present: bool) -> None:
+    if not _names:
+        return
+    conn.execute("DELETE FROM doc_names WHERE collection = ? AND doc_id = ?", (collection, doc_id))
+    if present:
+        conn.execute("INSERT INTO doc_names (collection, doc_id) VALUES (?, ?)", (collection, doc_id))
+
+def chunk_ids(doc_id: str, n: int, start: int = 0) -> List[str]:
+    return [f"{doc_id}-{i}" for i in range(start, n)]
+
+def get(collection: str, doc_id: str) -> Optional[int]:
+    """Number of chunks stored for doc_id, or None if the document is unknown."""
+    with _lock:
+        row = _db().execute(
+            "SELECT n_chunks FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc_id)
+        ).fetchone()
+    return row[0] if row else None
+
+def put(collection: str, doc_id: str, n_chunks: int) -> None:
+    with _lock:
+        conn = _db()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (collection, doc_id, n_chunks, updated_at) VALUES (?, ?, ?, ?)",
+                (collection, doc_id, int(n_chunks), time.time()),
+            )
+            _set_name(conn, collection, doc_id, True)
+
+def remove(collection: str, doc_id: str) -> None:
+    with _lock:
+        conn = _db()
+        with conn:
+            conn.execute("DELETE FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc_id))
+            _set_name(conn, collection, doc_id, False)
+
+def documents(collection: str) -> List[Tuple[str, int]]:
+    with _lock:
+        return _db().execute(
+            "SELECT doc_id, n_chunks FROM documents WHERE collection = ? ORDER BY doc_id", (collection,)
+        ).fetchall()
+
+def find_docs(collection: str, substring: str, limit: int = 1000) -> List[str]:
+    """Doc ids (file paths, URLs) containing `substring`, case-insensitively."""
+    sub = (substring or "").strip()
+    if not sub:
+        return []
+    with _lock:
+        conn = _db()
+        if _names and len(sub) >= 3:
+            # a quoted trigram query is a substring match; re-check to keep LIKE semantics exact
+            rows = conn.execute(
+                "SELECT doc_id FROM doc_names WHERE doc_names MATCH ? AND collection = ? LIMIT ?",
+                ('doc_id : "' + sub.replace('"', '""') + '"', collection, int(limit)),
+            ).fetchall()
+        else:
+            pat = sub.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            rows = conn.execute(
+                "SELECT doc_id FROM documents WHERE collection = ? AND doc_id LIKE ? ESCAPE '\\' LIMIT ?",
+                (collection, f"%{pat}%", int(limit)),
+            ).fetchall()
+    low = sub.lower()
+    return [d for (d,) in rows if low in d.lower()]
+
+def generation(collection: str) -> int:
+    """Index generation: bumped on every write/delete so query caches can tell they are stale."""
+    with _lock:
+        row = _db().execute("SELECT generation FROM collections WHERE collection = ?", (collection,)).fetchone()
+    return row[0] if row else 0
+
+def bump_generation(collection: str) -> int:
+    with _lock:
+        conn = _db()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO collections (collection) VALUES (?)", (collection,))
+            conn.execute("UPDATE collections SET generation = generation + 1 WHERE collection = ?", (collection,))
+    return generation(collection)
+
+def is_backfilled(collection: str) -> bool:
+    with _lock:
+        row = _db().execute("SELECT backfilled FROM collections WHERE collection = ?", (collection,)).fetchone()
+    return bool(row and row[0])
+
+def backfill(collection: str, ids: Iterable[str]) -> int:
+    """
+    One-time import of chunk ids ("<doc_id>-<i>") written before the registry existed.
+    Returns the number of documents recorded.
+    """
+    counts: Dict[str, int] = {}
+    for cid in ids:
+        doc_id, _, idx = cid.rpartition("-")
+        if doc_id and idx.isdigit():
+            counts[doc_id] = max(counts.get(doc_id, 0), int(idx) + 1)
+    now = time.time()
+    with _lock:
+        conn = _db()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO documents (collection, doc_id, n_chunks, updated_at) VALUES (?, ?, ?, ?)",
+                [(collection, d, n, now) for d, n in counts.items()],
+            )
+            for d in counts:
+                _set_name(conn, collection, d, True)
+            conn.execute("INSERT OR IGNORE INTO collections (collection) VALUES (?)", (collection,))
+            conn.execute("UPDATE collections SET backfilled = 1 WHERE collection = ?", (collection,))
+    return len(counts)
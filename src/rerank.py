@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from src.query_cache import TTLCache
+
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 20))   # hits scored per query
+RERANK_BATCH = int(os.getenv("RERANK_BATCH", 32))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 400))  # skip when the estimate is above this
+RERANK_PROBE_EVERY = int(os.getenv("RERANK_PROBE_EVERY", 20))  # while over budget, still rerank every Nth query
+_MIN_OBSERVE = 4   # smaller batches are mostly per-call overhead and would inflate the per-pair cost
+
+_model = None
+_model_lock = threading.Lock()
+_scores = TTLCache(int(os.getenv("RERANK_CACHE_SIZE", 20000)), float(os.getenv("QUERY_CACHE_TTL", 3600)))
+
+# moving average of the scoring cost per (query, chunk) pair, in ms; this estimate and the
+# counters below are shared by concurrent queries and only touched under _state_lock
+_state_lock = threading.Lock()
+_ms_per_pair: Optional[float] = None
+_skips = 0   # queries skipped since the last full batch
+_counts = {"reranked": 0, "skipped_budget": 0, "failed": 0}
+
+def enabled() -> bool:
+    return os.getenv("RERANK", "0").lower() in ("1", "true", "yes", "on")
+
+def _get_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            from sentence_transformers import CrossEncoder
+            _model = CrossEncoder(RERANK_MODEL, device="cpu")
+    return _model
+
+def preload() -> None:
+    if enabled():
+        _get_model()
+
+def _observe(ms: float, pairs: int, fresh: bool = False) -> None:
+    """Fold a batch timing into the per-pair estimate; `fresh` (a probe) replaces it. Caller holds _state_lock."""
+    global _ms_per_pair
+    if pairs < _MIN_OBSERVE and _ms_per_pair is not None:
+        return
+    per = ms / max(1, pairs)
+    _ms_per_pair = per if _ms_per_pair is None or fresh else 0.8 * _ms_per_pair + 0.2 * per
+
+def rerank(query: str, hits: List[Tuple[str, Dict]], top_k: int,
+           keys: Optional[List[Hashable]] = None) -> List[Tuple[str, Dict]]:
+    """
+    Re-order `hits` by cross-encoder relevance and keep top_k. Cached pairs are free;
+    the rest are scored in one batch unless that is estimated to exceed RERANK_BUDGET_MS,
+    in which case the incoming order is kept. Every RERANK_PROBE_EVERY-th such query is
+    scored anyway, so the estimate follows the machine when it gets faster again.
+    Scores are added as meta["rerank_score"].
+    """
+    global _skips
+    if len(hits) <= 1:
+        return hits[:top_k]
+    keys = keys or [i for i in range(len(hits))]
+    cache_keys = [(RERANK_MODEL, query, k, hash(d)) for k, (d, _) in zip(keys, hits)]
+    scores = [_scores.get(k) for k in cache_keys]
+    todo = [i for i, s in enumerate(scores) if s is None]
+
+    if todo:
+        with _state_lock:
+            probe = _ms_per_pair is not None and _ms_per_pair * len(todo) > RERANK_BUDGET_MS
+            if probe:
+                _skips += 1
+                if _skips < RERANK_PROBE_EVERY:
+                    _counts["skipped_budget"] += 1
+                    return hits[:top_k]
+            _skips = 0
+        try:
+            model = _get_model()
+            t0 = time.perf_counter()
+            out = model.predict([(query, hits[i][0]) for i in todo], batch_size=RERANK_BATCH,
+                                show_progress_bar=False)
+            ms = (time.perf_counter() - t0) * 1000
+        except Exception as e:
+            with _state_lock:
+                _counts["failed"] += 1
+            print(f"[Rerank] scoring failed: {e}")
+            return hits[:top_k]
+        with _state_lock:
+            _observe(ms, len(todo), fresh=probe)
+        for i, s in zip(todo, out):
+            scores[i] = float(s)
+            _scores.put(cache_keys[i], scores[i])
+
+    with _state_lock:
+        _counts["reranked"] += 1
+    order = sorted(range(len(hits)), key=lambda i: -scores[i])[:top_k]
+    return [(hits[i][0], {**(hits[i][1] or {}), "rerank_score": round(scores[i], 4)}) for i in order]
+
+def stats() -> Dict:
+    with _state_lock:
+        counts, ms = dict(_counts), _ms_per_pair
+    return {"enabled": enabled(), "model": RERANK_MODEL, **counts,
+            "ms_per_pair": round(ms, 3) if ms is not None else None,
+            "score_cache": _scores.stats()}
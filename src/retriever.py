@@ -1,6 +1,21 @@
-from typing import Dict, List, Tuple, Optional
+import os
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional, Union
 
-from src.indexer import search
+from src import rerank
+from src.context_builder import build_context
+from src.indexer import search, search_many, lexical_search, find_docs, chunk_id, get_embeddings
+from src.utils import url_host
+
+HYBRID = os.getenv("HYBRID", "1").lower() in ("1", "true", "yes", "on")
+RRF_K = int(os.getenv("RRF_K", 60))
+ALLOWLIST_MAX = int(os.getenv("FILTER_ALLOWLIST_MAX", 1000))
+MAX_FETCH = int(os.getenv("RETRIEVE_MAX_FETCH", 512))
+ASK_BATCH = int(os.getenv("ASK_BATCH", 64))              # questions embedded / queried together
+ASK_CONCURRENCY = int(os.getenv("ASK_CONCURRENCY", 4))   # LLM calls in flight
 
 IMG_EXT = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
 AUD_EXT = (".mp3", ".wav", ".m4a")
@@ -24,6 +39,17 @@ def _is_video(meta: Dict) -> bool:
         return True
     return str(meta.get("path", "")).lower().endswith(VID_EXT)
 
+def _norm_ext(ext: str) -> str:
+    ext = str(ext or "").lower()
+    return ext if ext.startswith(".") or not ext else f".{ext}"
+
+# chunks indexed before "dir"/"url_host" were stored lack them; derive them from path/url
+def _dir(meta: Dict) -> str:
+    return meta["dir"] if "dir" in meta else os.path.dirname(str(meta.get("path", "")))
+
+def _url_host(meta: Dict) -> str:
+    return meta["url_host"] if "url_host" in meta else url_host(str(meta.get("url", "")))
+
 def _keep(meta: Dict, where: Optional[Dict]) -> bool:
     if not where:
         return True
@@ -36,6 +62,14 @@ def _keep(meta: Dict, where: Optional[Dict]) -> bool:
         return False
     if t == "video" and not _is_video(meta):
         return False
+    if "name" in where and meta.get("name") != where["name"]:
+        return False
+    if "dir" in where and _dir(meta) != where["dir"]:
+        return False
+    if "ext" in where and str(meta.get("ext", "")).lower() != _norm_ext(where["ext"]):
+        return False
+    if "url_host" in where and _url_host(meta) != url_host(where["url_host"]):
+        return False
     pc = where.get("path_contains")
     if pc and pc.lower() not in str(meta.get("path", "")).lower():
         return False
@@ -44,37 +78,242 @@ def _keep(meta: Dict, where: Optional[Dict]) -> bool:
         return False
     return True
 
-def _where_pushdown(where: Optional[Dict]) -> Optional[Dict]:
+# pushdown that no document can satisfy
+_NOTHING: Dict = {"$nothing": True}
+
+def _and(clauses: List[Dict]) -> Optional[Dict]:
+    """Chroma wants several conditions spelled out as {"$and": [...]}."""
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def _plan(where: Optional[Dict]) -> Tuple[Optional[Dict], bool]:
     """
-    Convert UI filters to Chroma-compatible exact-match filters where possible.
-    (Chroma doesn't support 'contains', so we only forward exact keys.)
+    Translate UI filters into a store-side `where` clause.
+    Returns (clause, exact): exact means the clause expresses the whole filter, so no
+    hits are lost to post-filtering. Substring filters become doc allowlists through
+    the registry's trigram index; a clause of _NOTHING means nothing can match.
     """
     if not where:
-        return None
-    out: Dict = {}
-    if "source" in where:
-        out["source"] = where["source"]
-    if "type" in where:
-        out["type"] = where["type"]
-    return out or None
+        return None, True
+    clauses: List[Dict] = []
+    exact = True
+    for k in ("source", "type", "name"):
+        if k in where:
+            clauses.append({k: where[k]})
+    if "ext" in where:
+        clauses.append({"ext": _norm_ext(where["ext"])})
+    derived = []
+    if "dir" in where:
+        derived.append(("dir", str(where["dir"]), "path", os.path.dirname))
+    if "url_host" in where:
+        derived.append(("url_host", url_host(where["url_host"]), "url", url_host))
+    for key, value, field, derive in derived:
+        # older chunks lack the key: match them by doc id (their path/url) as well
+        ids = find_docs(value, limit=ALLOWLIST_MAX + 1) if value else []
+        if len(ids) > ALLOWLIST_MAX:
+            exact = False   # too broad to enumerate; _keep derives the key from path/url
+            continue
+        legacy = [i for i in ids if derive(i) == value]
+        clauses.append({"$or": [{key: value}, {field: {"$in": legacy}}]} if legacy else {key: value})
+    for key, field in (("path_contains", "path"), ("url_contains", "url")):
+        if not where.get(key):
+            continue
+        ids = find_docs(where[key], limit=ALLOWLIST_MAX + 1)
+        if not ids:
+            return _NOTHING, True
+        if len(ids) > ALLOWLIST_MAX:
+            exact = False   # too broad to enumerate; filter the fetched hits instead
+        else:
+            clauses.append({field: {"$in": ids}})
+    return _and(clauses), exact
 
-def ask(question: str, top_k: int = 6, where: Optional[Dict] = None) -> Dict:
-    top_k = max(1, int(top_k))
+def _where_pushdown(where: Optional[Dict]) -> Optional[Dict]:
+    """Store-side part of the UI filters (see _plan)."""
+    return _plan(where)[0]
 
-    pushdown = _where_pushdown(where)
-    raw_hits: List[Tuple[str, Dict]] = search(question, top_k=top_k * 3, where=pushdown)
+def _hit_key(doc: str, meta: Dict):
+    return chunk_id(meta) or (meta.get("path") or meta.get("url"), doc)
 
-    hits = []
-    for d, m in raw_hits:
-        m = m or {}
-        if _keep(m, where):
-            hits.append((d, m))
-            if len(hits) >= top_k:
-                break
+def fuse(rankings: List[List[Tuple[str, Dict]]], k: int = RRF_K) -> List[Tuple[str, Dict]]:
+    """Reciprocal rank fusion: each list adds 1 / (k + rank) to the hits it contains."""
+    scores: Dict = {}
+    first: Dict = {}
+    for hits in rankings:
+        for rank, (d, m) in enumerate(hits):
+            key = _hit_key(d, m or {})
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            first.setdefault(key, (d, m))
+    return [first[key] for key in sorted(scores, key=lambda x: -scores[x])]
+
+def _candidates(question: str, n: int, pushdown: Optional[Dict]) -> Tuple[List[Tuple[str, Dict]], bool]:
+    """Dense (and, with HYBRID, BM25) hits fused by rank; the flag says both lists ran dry."""
+    dense = search(question, top_k=n, where=pushdown)
+    if not HYBRID:
+        return dense, len(dense) < n
+    try:
+        lexical = lexical_search(question, top_k=n, where=pushdown)
+    except Exception as e:
+        print(f"[Retriever] lexical search failed: {e}")
+        lexical = []
+    # BM25 first: on equal fused scores an exact-term hit (an error code, an identifier) wins the tie
+    fused = fuse([lexical, dense]) if lexical else dense
+    return fused, len(dense) < n and len(lexical) < n
 
-    context = "\n\n".join(d for d, _ in hits) if hits else ""
+def retrieve(question: str, top_k: int, where: Optional[Dict]) -> List[Tuple[str, Dict]]:
+    """
+    Up to top_k hits satisfying `where`. Filters that can be pushed down are fetched
+    exactly; otherwise the fetch depth grows geometrically until enough hits survive
+    the local filter, the store runs out, or RETRIEVE_MAX_FETCH is reached.
+    """
+    pushdown, exact = _plan(where)
+    if pushdown is _NOTHING:
+        return []
+    fetch = top_k if exact else top_k * 2
+    while True:
+        raw, exhausted = _candidates(question, fetch, pushdown)
+        hits = [(d, m or {}) for d, m in raw if _keep(m or {}, where)]
+        if exact or len(hits) >= top_k or exhausted or fetch >= MAX_FETCH:
+            return hits[:top_k]
+        fetch = min(MAX_FETCH, fetch * 4)
+
+def _pool(top_k: int) -> int:
+    """Candidates handed to the context builder: twice top_k, so MMR has room to diversify."""
+    pool = max(1, int(top_k)) * 2
+    return max(pool, rerank.RERANK_CANDIDATES) if rerank.enabled() else pool
+
+def _answer_hits(question: str, top_k: int, where: Optional[Dict]) -> List[Tuple[str, Dict]]:
+    cands = retrieve(question, _pool(top_k), where)
+    if rerank.enabled():
+        # score the wider candidate pool, keep only the best ones
+        return rerank.rerank(question, cands, max(1, int(top_k)) * 2, keys=[_hit_key(d, m) for d, m in cands])
+    return cands
+
+def _context(hits: List[Tuple[str, Dict]], top_k: int) -> Tuple[str, List[Tuple[str, Dict]]]:
+    try:
+        stored = get_embeddings([chunk_id(m or {}) for _, m in hits])
+    except Exception as e:
+        print(f"[Retriever] could not load hit embeddings: {e}")
+        stored = {}
+    vectors = [stored.get(chunk_id(m or {})) for _, m in hits]
+    return build_context(hits, max(1, int(top_k)), vectors)
+
+def ask(question: str, top_k: int = 6, where: Optional[Dict] = None) -> Dict:
+    context, hits = _context(_answer_hits(question, top_k, where), top_k)
 
     from src.llm import chat_rag
     answer = chat_rag(question, context) if context else "No relevant context found."
 
     return {"answer": answer, "contexts": hits}
+
+def ask_stream(question: str, top_k: int = 6, where: Optional[Dict] = None) -> Dict:
+    """
+    Retrieve now, generate later: returns {"contexts", "stream"} where "stream" yields
+    the answer text piece by piece and only starts the LLM call when it is iterated,
+    so callers can show the contexts first.
+    """
+    context, hits = _context(_answer_hits(question, top_k, where), top_k)
+
+    from src.llm import chat_rag_stream
+    stream = chat_rag_stream(question, context) if context else iter(["No relevant context found."])
+
+    return {"contexts": hits, "stream": stream}
+
+def _request(item: Union[str, Dict], idx: int, top_k: int, where: Optional[Dict]) -> Dict:
+    """Normalize one ask_many input; a bad item gets an "error" instead of raising."""
+    if isinstance(item, str):
+        item = {"question": item}
+    if not isinstance(item, dict):
+        return {"id": idx, "question": None, "top_k": top_k, "where": where,
+                "error": f"expected a question string or object, got {type(item).__name__}"}
+    req = {"id": item.get("id", idx), "question": item.get("question"), "top_k": top_k,
+           "where": item.get("where", where)}
+    try:
+        req["top_k"] = max(1, int(item.get("top_k") or top_k))
+    except (TypeError, ValueError):
+        req["error"] = f"invalid top_k: {item.get('top_k')!r}"
+        return req
+    if item.get("error"):
+        req["error"] = item["error"]
+    elif not isinstance(req["question"], str) or not req["question"].strip():
+        req["error"] = "missing question"
+    elif req["where"] is not None and not isinstance(req["where"], dict):
+        req["error"] = "where must be an object"
+    return req
+
+def _prefetch(reqs: List[Dict]) -> None:
+    """Warm the retrieval cache with one batched embed + one store query per distinct filter."""
+    groups: Dict[Tuple[str, int], Tuple[Optional[Dict], List[str]]] = {}
+    for r in reqs:
+        if r.get("error"):
+            continue
+        pushdown, exact = _plan(r["where"])
+        if pushdown is _NOTHING:
+            continue
+        n = _pool(r["top_k"])
+        fetch = n if exact else n * 2   # the first round retrieve() will ask for
+        key = (json.dumps(pushdown or {}, sort_keys=True), fetch)
+        groups.setdefault(key, (pushdown, []))[1].append(r["question"])
+    for (_, fetch), (pushdown, questions) in groups.items():
+        search_many(list(dict.fromkeys(questions)), top_k=fetch, where=pushdown)
+
+def _result(req: Dict, hits: List[Tuple[str, Dict]], fut, error: Optional[str]) -> Dict:
+    out = {"id": req["id"], "question": req["question"]}
+    if error is None and fut is not None:
+        try:
+            out["answer"] = fut.result()
+        except Exception as e:
+            error = f"answer failed: {e}"
+    elif error is None:
+        out["answer"] = "No relevant context found."
+    if error is not None:
+        out["error"] = error
+    out["contexts"] = hits
+    return out
+
+def ask_many(items: Iterable[Union[str, Dict]], top_k: int = 6, where: Optional[Dict] = None,
+             concurrency: int = ASK_CONCURRENCY, batch: int = ASK_BATCH) -> Iterator[Dict]:
+    """
+    Answer a stream of questions (strings or {"question", "id"?, "top_k"?, "where"?} dicts).
+    Each window of `batch` questions is embedded and sent to the vector store together;
+    LLM calls run `concurrency` at a time while the next window is retrieved.
+    Yields one result dict per input, in input order, as soon as it is ready.
+    """
+    from src.llm import chat_rag
+    concurrency = max(1, int(concurrency))
+    batch = max(1, int(batch))
+    pending: deque = deque()
+    it = iter(items)
+    idx = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            window = list(islice(it, batch))
+            if not window:
+                break
+            reqs = []
+            for i, item in enumerate(window):
+                try:
+                    reqs.append(_request(item, idx + i, top_k, where))
+                except Exception as e:
+                    reqs.append({"id": idx + i, "question": None, "error": f"invalid item: {e}"})
+            idx += len(window)
+            try:
+                _prefetch(reqs)
+            except Exception as e:
+                print(f"[Retriever] batched prefetch failed, querying one by one: {e}")
+            for r in reqs:
+                if r.get("error"):
+                    pending.append((r, [], None, r["error"]))
+                else:
+                    try:
+                        context, hits = _context(_answer_hits(r["question"], r["top_k"], r["where"]), r["top_k"])
+                        fut = pool.submit(chat_rag, r["question"], context) if context else None
+                        pending.append((r, hits, fut, None))
+                    except Exception as e:
+                        pending.append((r, [], None, f"retrieval failed: {e}"))
+                # emit finished results in order; block only when too much is in flight
+                while pending and (pending[0][2] is None or pending[0][2].done()
+                                   or len(pending) > concurrency * 4):
+                    yield _result(*pending.popleft())
+        while pending:
+            yield _result(*pending.popleft())
@@ -0,0 +1,357 @@
+"""
+Long-lived HTTP/JSON server that keeps the vector store, embedder and (optionally) the
+reranker, Whisper and OCR models resident between requests:
+
+  GET  /health
+  GET  /stats
+  POST /ask        {"question", "top_k"?, "where"?, "stream"?}   stream -> NDJSON deltas
+  POST /ask-batch  {"questions": [...], "top_k"?, "where"?}      -> NDJSON, input order
+  POST /ingest     {"path", "force"?, "workers"?, "preview"?} | {"url"}   -> queued job
+  POST /job        {"id", "cancel"?}                              -> job status
+  POST /delete     {"doc_id"}
+
+Requests are parsed on an asyncio loop; queries run on a thread pool and deletes on a
+single writer thread. Ingest requests go to the shared job queue (src.jobs), which this
+process also works with JOBS_WORKERS threads, so the server, the app and the CLI share one
+throttled, deduplicated ingest path. When more than SERVER_MAX_INFLIGHT queries,
+SERVER_MAX_INGEST_QUEUE writes or SERVER_MAX_INGEST_QUEUE pending jobs are waiting, new
+ones get 503 + Retry-After at once instead of queueing behind them.
+"""
+import os
+import json
+import signal
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", 8765))
+QUERY_THREADS = int(os.getenv("SERVER_QUERY_THREADS", 8))
+MAX_INFLIGHT = int(os.getenv("SERVER_MAX_INFLIGHT", 32))
+MAX_INGEST_QUEUE = int(os.getenv("SERVER_MAX_INGEST_QUEUE", 4))
+MAX_INGEST_WORKERS = int(os.getenv("SERVER_MAX_INGEST_WORKERS", os.cpu_count() or 1))
+MAX_BODY = int(os.getenv("SERVER_MAX_BODY", 10 * 1024 * 1024))
+WARM = [w.strip() for w in os.getenv("SERVER_WARM", "embedder,rerank").split(",") if w.strip()]
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+_END = object()
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class _Gate:
+    """Admission counter (only touched from the event loop, so no lock is needed)."""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self.active = 0
+        self.rejected = 0
+
+    def enter(self) -> None:
+        if self.active >= self.limit:
+            self.rejected += 1
+            raise HTTPError(503, "server busy, retry shortly")
+        self.active += 1
+
+    def leave(self) -> None:
+        self.active -= 1
+
+class Server:
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT):
+        self.host, self.port = host, port
+        self.queries = ThreadPoolExecutor(max_workers=max(1, QUERY_THREADS), thread_name_prefix="query")
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer")
+        self.query_gate = _Gate(MAX_INFLIGHT)
+        self.write_gate = _Gate(MAX_INGEST_QUEUE)
+        self.served = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # ---- lifecycle ----
+
+    def warm(self) -> None:
+        """Load everything a first request would otherwise pay for."""
+        from src import indexer, rerank
+        if "embedder" in WARM:
+            indexer.warm()
+        if "rerank" in WARM:
+            rerank.preload()
+        if "whisper" in WARM:
+            from src.extractors.whisper_models import preload
+            preload()
+        if "ocr" in WARM:
+            from src.extractors.image_extractor import _easyocr_reader
+            _easyocr_reader()
+
+    async def serve(self) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.queries, self.warm)
+        from src import jobs
+        jobs.start_workers()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=1 << 16)
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        print(f"[Server] listening on http://{self.host}:{self.port}")
+        async with self._server:
+            await stop.wait()
+            print("[Server] shutting down, finishing in-flight requests")
+            self._server.close()
+            await self._server.wait_closed()
+        self.queries.shutdown(wait=True)
+        self.writer.shutdown(wait=True)
+        from src import jobs
+        print("[Server] waiting for running ingest jobs")
+        jobs.stop_workers()
+
+    # ---- HTTP plumbing ----
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, _version = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers: Dict[str, str] = {}
+        while True:
+            h = await reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = h.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411, "chunked request bodies are not supported")
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY:
+            raise HTTPError(413, f"body larger than {MAX_BODY} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), urlsplit(target).path, headers, body
+
+    @staticmethod
+    def _head(status: int, ctype: str, keep_alive: bool, extra: Dict[str, str]) -> bytes:
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", f"Content-Type: {ctype}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines += [f"{k}: {v}" for k, v in extra.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, obj: Any, keep_alive: bool) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        extra = {"Content-Length": str(len(body))}
+        if status == 503:
+            extra["Retry-After"] = "1"
+        writer.write(self._head(status, "application/json; charset=utf-8", keep_alive, extra) + body)
+        await writer.drain()
+
+    async def _send_ndjson(self, writer: asyncio.StreamWriter, items: Iterator[Any], keep_alive: bool) -> None:
+        """Stream a blocking iterator as chunked NDJSON, pulling each item on the query pool."""
+        loop = asyncio.get_running_loop()
+        writer.write(self._head(200, "application/x-ndjson; charset=utf-8", keep_alive,
+                                {"Transfer-Encoding": "chunked"}))
+        failed = False
+        while not failed:
+            try:
+                item = await loop.run_in_executor(self.queries, next, items, _END)
+            except Exception as e:
+                # the status line is already out; report the failure in-band and stop
+                item, failed = {"error": str(e)}, True
+            if item is _END:
+                break
+            data = (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+            writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    req = await self._read_request(reader)
+                    if req is None:
+                        break
+                    method, path, headers, body = req
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    await self._dispatch(writer, method, path, body, keep_alive)
+                    self.served += 1
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": str(e)}, keep_alive)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    print(f"[Server] request failed: {e}")
+                    await self._send_json(writer, 500, {"error": str(e)}, False)
+                    break
+                if not keep_alive:
+                    break
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    # ---- endpoints ----
+
+    async def _dispatch(self, writer: asyncio.StreamWriter, method: str, path: str, body: bytes,
+                        keep_alive: bool) -> None:
+        routes = {"/health": "GET", "/stats": "GET", "/ask": "POST", "/ask-batch": "POST",
+                  "/ingest": "POST", "/job": "POST", "/delete": "POST"}
+        if path not in routes:
+            raise HTTPError(404, f"no route {path}")
+        if method != routes[path]:
+            raise HTTPError(405, f"{path} expects {routes[path]}")
+
+        if path == "/health":
+            return await self._send_json(writer, 200, {"status": "ok", **self._load()}, keep_alive)
+        if path == "/stats":
+            return await self._send_json(writer, 200, await self._run(self.queries, _stats, self._load()), keep_alive)
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError as e:
+            raise HTTPError(400, f"invalid JSON body: {e}")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "JSON body must be an object")
+
+        if path in ("/ask", "/ask-batch"):
+            gate, pool = self.query_gate, self.queries
+        else:
+            gate, pool = self.write_gate, self.writer
+        gate.enter()
+        try:
+            if path == "/ask":
+                q = payload.get("question")
+                if not isinstance(q, str) or not q.strip():
+                    raise HTTPError(400, "'question' is required")
+                args = (q, _top_k(payload), _where(payload))
+                if payload.get("stream"):
+                    return await self._send_ndjson(writer, _ask_stream_items(*args), keep_alive)
+                return await self._send_json(writer, 200, await self._run(pool, _ask, *args), keep_alive)
+            if path == "/ask-batch":
+                qs = payload.get("questions")
+                if not isinstance(qs, list):
+                    raise HTTPError(400, "'questions' must be a list")
+                from src.retriever import ask_many
+                items = ask_many(qs, top_k=_top_k(payload), where=_where(payload))
+                return await self._send_ndjson(writer, items, keep_alive)
+            if path == "/ingest":
+                return await self._send_json(writer, 202, await self._run(pool, _ingest, payload), keep_alive)
+            if path == "/job":
+                return await self._send_json(writer, 200, await self._run(pool, _job, payload), keep_alive)
+            if path == "/delete":
+                doc_id = payload.get("doc_id")
+                if not isinstance(doc_id, str) or not doc_id:
+                    raise HTTPError(400, "'doc_id' is required")
+                return await self._send_json(writer, 200, await self._run(pool, _delete, doc_id), keep_alive)
+        finally:
+            gate.leave()
+
+    async def _run(self, pool: ThreadPoolExecutor, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+    def _load(self) -> Dict:
+        return {"queries_active": self.query_gate.active, "queries_rejected": self.query_gate.rejected,
+                "writes_active": self.write_gate.active, "writes_rejected": self.write_gate.rejected,
+                "served": self.served}
+
+# ---- blocking work (runs on the pools) ----
+
+def _top_k(payload: Dict, default: int = 6) -> int:
+    try:
+        return max(1, int(payload.get("top_k") or default))
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"'top_k' must be an integer, got {payload.get('top_k')!r}")
+
+def _where(payload: Dict) -> Optional[Dict]:
+    where = payload.get("where")
+    if where is not None and not isinstance(where, dict):
+        raise HTTPError(400, "'where' must be an object")
+    return where
+
+def _ask(question: str, top_k: int, where: Optional[Dict]) -> Dict:
+    from src.retriever import ask
+    return ask(question, top_k=top_k, where=where)
+
+def _ask_stream_items(question: str, top_k: int, where: Optional[Dict]) -> Iterator[Dict]:
+    from src.retriever import ask_stream
+    res = ask_stream(question, top_k=top_k, where=where)
+    yield {"contexts": res["contexts"]}
+    for piece in res["stream"]:
+        yield {"delta": piece}
+    yield {"done": True}
+
+def _int(payload: Dict, key: str, default: int, lo: int, hi: Optional[int] = None) -> int:
+    value = payload.get(key)
+    if value is None:
+        return default
+    error = HTTPError(400, f"'{key}' must be an integer "
+                           f"{f'between {lo} and {hi}' if hi is not None else f'of at least {lo}'}, got {value!r}")
+    if isinstance(value, bool):
+        raise error
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        raise error
+    if n < lo or (hi is not None and n > hi):
+        raise error
+    return n
+
+def _ingest(payload: Dict) -> Dict:
+    """Queue an ingest job (or return the one already queued for the same target)."""
+    from src import jobs
+    if payload.get("url"):
+        kind, target, opts = "youtube", payload["url"], {}
+    elif payload.get("path"):
+        kind, target = "path", payload["path"]
+        opts = {"force": bool(payload.get("force")),
+                "workers": _int(payload, "workers", 1, 1, MAX_INGEST_WORKERS),
+                "preview": _int(payload, "preview", 0, 0)}
+    else:
+        raise HTTPError(400, "'path' or 'url' is required")
+    if not isinstance(target, str):
+        raise HTTPError(400, f"'{'url' if kind == 'youtube' else 'path'}' must be a string")
+    if jobs.active(kind, target) is None and jobs.counts().get("pending", 0) >= MAX_INGEST_QUEUE:
+        raise HTTPError(503, "ingest queue full, retry shortly")
+    return jobs.submit(kind, target, **opts)
+
+def _job(payload: Dict) -> Dict:
+    from src import jobs
+    job_id = _int(payload, "id", 0, 1)
+    job = jobs.cancel(job_id) if payload.get("cancel") else jobs.get(job_id)
+    if job is None:
+        raise HTTPError(404, f"no job {job_id}")
+    return job
+
+def _delete(doc_id: str) -> Dict:
+    from src import manifest
+    from src.indexer import delete_by_prefix
+    n = delete_by_prefix(doc_id)
+    try:
+        # otherwise an unchanged file would be skipped by the next incremental ingest
+        manifest.forget(doc_id)
+    except Exception as e:
+        print(f"[Manifest] forget failed for {doc_id}: {e}")
+    return {"doc_id": doc_id, "deleted_chunks": n}
+
+def _stats(load: Dict) -> Dict:
+    from src import embed_cache, jobs, query_cache, rerank
+    return {"server": load, "embedding_cache": embed_cache.stats(), "query_cache": query_cache.stats(),
+            "rerank": rerank.stats(), "jobs": jobs.counts()}
+
+def serve(host: str = SERVER_HOST, port: int = SERVER_PORT) -> None:
+    # a server should keep Whisper resident unless told otherwise
+    os.environ.setdefault("WHISPER_IDLE_TIMEOUT", "0")
+    asyncio.run(Server(host, port).serve())
+
+if __name__ == "__main__":
+    serve()
@@ -1,6 +1,11 @@
 import os
+import hashlib
+import sqlite3
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Union
+from urllib.parse import urlparse
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
@@ -11,9 +16,52 @@ def _resolve_dir(env_key: str, default_rel: str) -> Path:
 
 UPLOAD_DIR: Path = _resolve_dir("UPLOAD_DIR", "data/uploads")
 CHROMA_DIR: Path = _resolve_dir("CHROMA_DIR", "data/chroma")
+# created by whoever writes to them (app upload, indexer), not at import
 
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-CHROMA_DIR.mkdir(parents=True, exist_ok=True)
+def connect_sqlite(path: Union[str, Path]) -> sqlite3.Connection:
+    """
+    Open a SQLite database that several ingest processes may share
+    (WAL journal + busy timeout instead of 'database is locked' errors).
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+@contextmanager
+def file_lock(path: Union[str, Path]):
+    """Exclusive advisory lock on `path` shared by all processes; blocks until it is free."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as fh:
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                try:
+                    fh.seek(0)
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:   # LK_LOCK gives up after ~10 s
+                    time.sleep(0.1)
+            try:
+                yield
+            finally:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+def file_sha256(path: Union[str, Path], block: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(block), b""):
+            h.update(buf)
+    return h.hexdigest()
 
 def safe_filename(name: str) -> str:
     """
@@ -22,5 +70,13 @@ def safe_filename(name: str) -> str:
     name = os.path.basename(name or "")
     return name.replace("\\", "_").replace("/", "_").strip() or "file"
 
+def url_host(url: str) -> str:
+    """Lower-cased host of a URL without a leading 'www.' ("" if there is none)."""
+    try:
+        host = (urlparse(url if "//" in (url or "") else f"//{url}").hostname or "").lower()
+    except ValueError:
+        return ""
+    return host[4:] if host.startswith("www.") else host
+
 def clean_text(s: str) -> str:
     return "\n".join(line.strip() for line in (s or "").splitlines() if line.strip())
@@ -0,0 +1,377 @@
+import os
+import re
+import json
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils import PROJECT_ROOT, connect_sqlite, file_lock
+
+VECTOR_DIR = os.getenv("VECTOR_DIR", str(PROJECT_ROOT / "data" / "vectors"))
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32").lower()
+
+# metadata keys that get an expression index, so prefilters on them skip the table scan
+INDEXED_META = ("type", "source", "doc_id")
+_SCORE_BLOCK = 8192
+_KEY = re.compile(r"^[\w.\-]+$")
+
+def _json_path(key: str) -> str:
+    if not _KEY.match(key):
+        raise ValueError(f"unsupported metadata key in filter: {key!r}")
+    return f"json_extract(meta, '$.\"{key}\"')"
+
+def _sql_where(where: Dict) -> Tuple[str, list]:
+    """Translate a Chroma-style `where` ($and/$or/$eq/$ne/$in/$nin/$gt/...) to SQL."""
+    parts, params = [], []
+    for k, cond in where.items():
+        if k in ("$and", "$or"):
+            subs = [_sql_where(w) for w in cond]
+            if subs:
+                parts.append("(" + (" AND " if k == "$and" else " OR ").join(s for s, _ in subs) + ")")
+                for _, p in subs:
+                    params.extend(p)
+            continue
+        col = _json_path(k)
+        ops = cond if isinstance(cond, dict) else {"$eq": cond}
+        for op, arg in ops.items():
+            if op in ("$in", "$nin"):
+                arg = list(arg)
+                if not arg:
+                    parts.append("0" if op == "$in" else "1")
+                    continue
+                neg = "NOT " if op == "$nin" else ""
+                parts.append(f"{col} {neg}IN ({','.join('?' * len(arg))})")
+                params.extend(arg)
+            elif op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+                sym = {"$eq": "=", "$ne": "IS NOT", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}[op]
+                parts.append(f"{col} {sym} ?")
+                params.append(arg)
+            else:
+                raise ValueError(f"unsupported filter operator: {op}")
+    return (" AND ".join(parts) or "1"), params
+
+def _normalize(vecs) -> np.ndarray:
+    m = np.asarray(vecs, dtype=np.float32)
+    if m.ndim == 1:
+        m = m[None, :]
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+class FlatStore:
+    """
+    Exact vector store: unit-normalised embeddings in a memory-mapped matrix
+    (float32 or float16) plus a SQLite table of ids, documents and metadata.
+    Speaks the subset of the Chroma collection API the indexer uses
+    (upsert / query / get / delete / count), so it can be swapped in for it.
+
+    Several processes may share a directory: writes hold a file lock, and every
+    operation first picks up rows other processes wrote (the SQLite side table carries
+    a write generation and the row high-water mark; the matrix is remapped when it grew).
+    """
+
+    def __init__(self, path: str, dtype: str = VECTOR_DTYPE):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = connect_sqlite(self.path / "meta.sqlite3")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                document TEXT NOT NULL,
+                meta TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        for key in INDEXED_META:
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS rows_{key} ON rows ({_json_path(key)})")
+        self._db.commit()
+
+        info = dict(self._db.execute("SELECT key, value FROM info").fetchall())
+        self.dim = int(info.get("dim", 0))
+        self.dtype = np.dtype(info.get("dtype", "float16" if dtype == "float16" else "float32"))
+        self._gen = int(info.get("gen", 0))     # write generation this view reflects
+        self._mat = None
+        self._load_rows(int(info.get("rows", 0)))
+        if self.dim:
+            self._open(max(self._rows, self._capacity_on_disk()))
+
+    def _load_rows(self, high_water: int) -> None:
+        """Rebuild the live-row mask and free list from the rows table."""
+        live = np.fromiter((r for (r,) in self._db.execute("SELECT row FROM rows")), dtype=np.int64)
+        self._rows = max(high_water, int(live.max()) + 1 if len(live) else 0)   # high-water mark of used matrix rows
+        self._alive = np.zeros(self._rows, dtype=bool)
+        self._alive[live] = True
+        self._free = np.flatnonzero(~self._alive)[::-1].tolist()
+
+    def _sync(self) -> None:
+        """Catch up with writes made by other processes (one small query when nothing changed)."""
+        info = dict(self._db.execute("SELECT key, value FROM info WHERE key IN ('gen', 'rows', 'dim', 'dtype')").fetchall())
+        gen = int(info.get("gen", 0))
+        if gen == self._gen:
+            return
+        if not self.dim and info.get("dim"):
+            self.dim = int(info["dim"])
+            self.dtype = np.dtype(info.get("dtype", self.dtype.name))
+        self._load_rows(int(info.get("rows", 0)))
+        if self.dim:
+            cap = 0 if self._mat is None else self._mat.shape[0]
+            if max(self._rows, self._capacity_on_disk()) > cap:
+                if self._mat is not None:
+                    self._mat.flush()
+                    self._mat = None
+                self._open(max(self._rows, self._capacity_on_disk()))
+        self._gen = gen
+        self._on_reload()
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive write section across threads and processes, on an up-to-date view."""
+        with self._lock, file_lock(self.path / "write.lock"):
+            self._sync()
+            yield
+
+    # ---- matrix file ----
+
+    def _file(self) -> Path:
+        return self.path / ("vectors.f16" if self.dtype == np.float16 else "vectors.f32")
+
+    def _capacity_on_disk(self) -> int:
+        f = self._file()
+        return f.stat().st_size // (self.dim * self.dtype.itemsize) if f.exists() else 0
+
+    def _open(self, capacity: int) -> None:
+        f = self._file()
+        size = capacity * self.dim * self.dtype.itemsize
+        if not f.exists() or f.stat().st_size < size:
+            with open(f, "ab") as fh:
+                fh.truncate(size)
+        self._mat = np.memmap(f, dtype=self.dtype, mode="r+", shape=(capacity, self.dim)) if capacity else None
+
+    def _reserve(self, n_rows: int) -> None:
+        cap = 0 if self._mat is None else self._mat.shape[0]
+        if n_rows <= cap:
+            return
+        new_cap = max(1024, cap)
+        while new_cap < n_rows:
+            new_cap *= 2
+        if self._mat is not None:
+            self._mat.flush()
+            self._mat = None
+        self._open(new_cap)
+
+    def _save_info(self) -> None:
+        """Record the layout and bump the write generation; call inside the write's transaction."""
+        self._gen += 1
+        self._db.executemany(
+            "INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+            [("dim", str(self.dim)), ("dtype", self.dtype.name), ("rows", str(self._rows)), ("gen", str(self._gen))],
+        )
+
+    def _lookup(self, ids: Iterable[str]) -> Dict[str, int]:
+        ids = list(ids)
+        out: Dict[str, int] = {}
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            q = f"SELECT id, row FROM rows WHERE id IN ({','.join('?' * len(part))})"
+            out.update(dict(self._db.execute(q, part).fetchall()))
+        return out
+
+    # ---- collection API ----
+
+    def count(self) -> int:
+        with self._lock:
+            self._sync()
+            return int(self._alive.sum())
+
+    def upsert(self, ids: List[str], embeddings, documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict]] = None) -> None:
+        if not ids:
+            return
+        vecs = _normalize(embeddings)
+        if len(vecs) != len(ids):
+            raise ValueError(f"got {len(vecs)} embeddings for {len(ids)} ids")
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        with self._writing():
+            if not self.dim:
+                self.dim = vecs.shape[1]
+            elif vecs.shape[1] != self.dim:
+                raise ValueError(f"embedding dimension {vecs.shape[1]} does not match collection dimension {self.dim}")
+            existing = self._lookup(ids)
+            rows = []
+            for cid in ids:
+                if cid in existing:
+                    rows.append(existing[cid])
+                elif self._free:
+                    rows.append(self._free.pop())
+                else:
+                    rows.append(self._rows)
+                    self._rows += 1
+            self._reserve(self._rows)
+            if len(self._alive) < self._rows:
+                self._alive = np.concatenate([self._alive, np.zeros(self._rows - len(self._alive), dtype=bool)])
+            rows_arr = np.asarray(rows)
+            self._mat[rows_arr] = vecs.astype(self.dtype)
+            self._mat.flush()
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO rows (row, id, document, meta) VALUES (?, ?, ?, ?)",
+                    [(r, cid, d or "", json.dumps(m or {}, ensure_ascii=False))
+                     for r, cid, d, m in zip(rows, ids, documents, metadatas)],
+                )
+                self._save_info()
+            self._alive[rows_arr] = True
+            self._on_upsert(rows_arr, vecs)
+
+    def add(self, ids: List[str], embeddings, documents=None, metadatas=None) -> None:
+        self.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None) -> None:
+        with self._writing():
+            if ids is not None:
+                rows = list(self._lookup(ids).values())
+            elif where:
+                sql, params = _sql_where(where)
+                rows = [r for (r,) in self._db.execute(f"SELECT row FROM rows WHERE {sql}", params)]
+            else:
+                return
+            if not rows:
+                return
+            with self._db:
+                for i in range(0, len(rows), 500):
+                    part = rows[i:i + 500]
+                    self._db.execute(f"DELETE FROM rows WHERE row IN ({','.join('?' * len(part))})", part)
+                self._save_info()
+            self._alive[rows] = False
+            self._free = sorted(set(self._free) | set(rows), reverse=True)
+            self._on_delete(np.asarray(rows))
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Optional[List[str]] = None) -> Dict:
+        include = ["documents", "metadatas"] if include is None else include
+        sql, params = _sql_where(where) if where else ("1", [])
+        if ids is not None:
+            ids = list(ids)
+            if not ids:
+                return {"ids": [], "documents": [], "metadatas": [], "embeddings": None}
+            sql += f" AND id IN ({','.join('?' * len(ids))})"
+            params = params + ids
+        q = f"SELECT row, id, document, meta FROM rows WHERE {sql} ORDER BY row"
+        if limit is not None or offset:
+            q += " LIMIT ? OFFSET ?"
+            params = params + [-1 if limit is None else int(limit), int(offset or 0)]
+        with self._lock:
+            self._sync()
+            res = self._db.execute(q, params).fetchall()
+            embs = None
+            if "embeddings" in include:
+                embs = np.asarray(self._mat[[r[0] for r in res]], dtype=np.float32) if res else np.zeros((0, self.dim))
+        return {
+            "ids": [r[1] for r in res],
+            "documents": [r[2] for r in res] if "documents" in include else None,
+            "metadatas": [json.loads(r[3]) for r in res] if "metadatas" in include else None,
+            "embeddings": embs,
+        }
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict] = None,
+              include: Optional[List[str]] = None) -> Dict:
+        """Exact cosine top-k; `where` prefilters rows in SQLite before any scoring."""
+        include = ["documents", "metadatas", "distances"] if include is None else include
+        Q = _normalize(query_embeddings)
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": None}
+        with self._lock:
+            self._sync()
+            cand = None
+            if where:
+                sql, params = _sql_where(where)
+                cand = np.fromiter((r for (r,) in self._db.execute(f"SELECT row FROM rows WHERE {sql}", params)), dtype=np.int64)
+                cand.sort()   # sequential reads from the memory map
+            if not self.dim or self._mat is None:
+                top = [([], [])] * len(Q)
+            else:
+                top = self._search(Q, max(1, int(n_results)), cand)
+            for rows, sims in top:
+                rec = {}
+                if len(rows):
+                    part = [int(r) for r in rows]
+                    qs = f"SELECT row, id, document, meta FROM rows WHERE row IN ({','.join('?' * len(part))})"
+                    rec = {r[0]: r for r in self._db.execute(qs, part)}
+                pairs = [(rec[int(r)], float(s)) for r, s in zip(rows, sims) if int(r) in rec]
+                out["ids"].append([p[0][1] for p in pairs])
+                out["documents"].append([p[0][2] for p in pairs])
+                out["metadatas"].append([json.loads(p[0][3]) for p in pairs])
+                out["distances"].append([1.0 - s for _, s in pairs])
+        for k in ("documents", "metadatas", "distances"):
+            if k not in include:
+                out[k] = None
+        return out
+
+    # ---- scoring (overridden by compressed indexes) ----
+
+    def _scores(self, rows: Optional[np.ndarray], Q: np.ndarray) -> np.ndarray:
+        """Exact similarities (len(rows) x len(Q)), computed block-wise so float16 stays cheap."""
+        n = self._rows if rows is None else len(rows)
+        out = np.empty((n, len(Q)), dtype=np.float32)
+        QT = Q.T.astype(np.float32)
+        for s in range(0, n, _SCORE_BLOCK):
+            e = min(n, s + _SCORE_BLOCK)
+            block = self._mat[s:e] if rows is None else self._mat[rows[s:e]]
+            out[s:e] = np.asarray(block, dtype=np.float32) @ QT
+        return out
+
+    def _search(self, Q: np.ndarray, k: int, cand: Optional[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        rows = cand if cand is not None else None
+        S = self._scores(rows, Q)
+        if rows is None:
+            S[~self._alive[:self._rows]] = -np.inf
+            rows = np.arange(self._rows)
+        return [_top_k(rows, S[:, j], k) for j in range(len(Q))]
+
+    def _on_upsert(self, rows: np.ndarray, vecs: np.ndarray) -> None:
+        pass
+
+    def _on_reload(self) -> None:
+        """Another process changed the store; drop anything derived from the old rows."""
+        pass
+
+    def _on_delete(self, rows: np.ndarray) -> None:
+        pass
+
+def _top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if not len(scores):
+        return rows[:0], scores[:0]
+    k = min(k, len(scores))
+    idx = np.argpartition(-scores, k - 1)[:k]
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+    keep = np.isfinite(scores[idx])
+    return rows[idx][keep], scores[idx][keep]
+
+def import_collection(src, dst, page: int = 2000) -> int:
+    """Copy every record (embeddings included) from one collection-like store to another."""
+    offset, n = 0, 0
+    while True:
+        res = src.get(include=["embeddings", "documents", "metadatas"], limit=page, offset=offset)
+        ids = res.get("ids") or []
+        if ids:
+            dst.upsert(ids=ids, embeddings=np.asarray(res["embeddings"], dtype=np.float32),
+                       documents=res.get("documents"), metadatas=res.get("metadatas"))
+            n += len(ids)
+        if len(ids) < page:
+            return n
+        offset += page
+
+def open_store(name: str, backend: str = "flat"):
+    """Open the store for collection `name`; "ivfpq" adds the compressed ANN index on top."""
+    path = os.path.join(VECTOR_DIR, name)
+    if backend == "ivfpq":
+        from src.ivfpq import IVFPQStore
+        return IVFPQStore(path)
+    return FlatStore(path)
@@ -0,0 +1,59 @@
+"""
+Every store (Chroma, manifest, registry, lexical index, job queue) lives in a throwaway
+directory and embeddings come from a word-hash embedder, so the suite needs no network,
+API key or model download. The environment is set before any src module is imported.
+"""
+import os
+import re
+import hashlib
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="multimodal-rag-tests-")
+
+os.environ.update({
+    "EMBEDDING_PROVIDER": "local",
+    "CHAT_PROVIDER": "local",
+    "GOOGLE_API_KEY": "",
+    "RERANK": "0",
+    "EMBED_CACHE": "0",
+    "VECTOR_BACKEND": "chroma",
+    "COLLECTION_NAME": "tests",
+    "CHROMA_DIR": os.path.join(_TMP, "chroma"),
+    "MANIFEST_PATH": os.path.join(_TMP, "manifest.sqlite3"),
+    "REGISTRY_PATH": os.path.join(_TMP, "registry.sqlite3"),
+    "EMBED_CACHE_PATH": os.path.join(_TMP, "embed_cache.sqlite3"),
+    "LEXICAL_DIR": os.path.join(_TMP, "lexical"),
+    "JOBS_PATH": os.path.join(_TMP, "jobs.sqlite3"),
+})
+
+import pytest
+
+DIM = 64
+
+def hash_embed(texts, provider=None, task_type=None):
+    """Bag of hashed words, L2-normalised: texts sharing words end up close together."""
+    out = []
+    for text in texts:
+        v = [0.0] * DIM
+        for w in re.findall(r"\w+", (text or "").lower()):
+            v[int(hashlib.md5(w.encode()).hexdigest(), 16) % DIM] += 1.0
+        norm = sum(x * x for x in v) ** 0.5 or 1.0
+        out.append([x / norm for x in v])
+    return out
+
+@pytest.fixture(autouse=True)
+def fake_embeddings(monkeypatch):
+    from src import llm
+    monkeypatch.setattr(llm, "_embed_uncached", hash_embed)
+
+@pytest.fixture
+def docs(tmp_path):
+    """A folder of small text files; returns their paths in name order."""
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta",
+             "iota", "kappa", "lambda", "mu"]
+    paths = []
+    for i, w in enumerate(words):
+        p = tmp_path / f"f{i:02d}.txt"
+        p.write_text(f"Notes about {w}. The {w} section explains {w} in detail.\n")
+        paths.append(p)
+    return paths
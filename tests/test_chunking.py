@@ -0,0 +1,68 @@
+import random
+import re
+
+import pytest
+
+from src import chunking
+
+WORDS = "retrieval index vector chunk query answer model embedding token slide page".split()
+
+def _text(seed: int, slides: int = 6) -> str:
+    rnd = random.Random(seed)
+    parts = []
+    for n in range(1, slides + 1):
+        parts.append(f"[Slide {n}]")
+        for _ in range(rnd.randint(1, 6)):
+            words = [rnd.choice(WORDS) for _ in range(rnd.choice([3, 8, 20, 150]))]   # some oversized
+            parts.append(" ".join(words).capitalize() + rnd.choice([".", "!", "?", ""]))
+    return "\n".join(parts)
+
+@pytest.fixture
+def budget(monkeypatch):
+    monkeypatch.setattr(chunking, "CHUNK_SIZE", 200)
+    monkeypatch.setattr(chunking, "CHUNK_TOKENS", 40)
+    monkeypatch.setattr(chunking, "CHUNK_OVERLAP_UNITS", 0)
+
+def _size(mode, piece):
+    return chunking.count_tokens(piece) if mode == "tokens" else len(piece)
+
+@pytest.mark.parametrize("mode", ["structure", "tokens"])
+@pytest.mark.parametrize("seed", range(5))
+def test_chunks_stay_within_budget(budget, mode, seed):
+    text = _text(seed)
+    limit = chunking.CHUNK_TOKENS if mode == "tokens" else chunking.CHUNK_SIZE
+    assert all(_size(mode, text[a:b]) <= limit for a, b in chunking.chunk_spans(text, mode))
+
+@pytest.mark.parametrize("mode", ["structure", "tokens"])
+@pytest.mark.parametrize("seed", range(5))
+def test_spans_cover_the_text_in_order(budget, mode, seed):
+    text = _text(seed)
+    spans = chunking.chunk_spans(text, mode)
+    assert all(0 <= a < b <= len(text) for a, b in spans)
+    assert all(b1 <= a2 for (_a1, b1), (a2, _b2) in zip(spans, spans[1:]))   # no overlap units
+    # every non-space character is in exactly one chunk, and chunks start/end on text
+    covered = "".join(text[a:b] for a, b in spans)
+    assert re.sub(r"\s", "", covered) == re.sub(r"\s", "", text)
+    assert all(text[a:b] == text[a:b].strip() for a, b in spans)
+
+@pytest.mark.parametrize("mode", ["structure", "tokens"])
+def test_chunks_never_cross_a_slide_marker(budget, mode):
+    text = _text(7, slides=10)
+    for a, b in chunking.chunk_spans(text, mode):
+        markers = [m.start() for m in re.finditer(r"\[Slide \d+\]", text[a:b])]
+        assert markers in ([], [0])
+
+@pytest.mark.parametrize("mode", ["structure", "tokens"])
+def test_lone_marker_leads_the_oversized_sentence(budget, mode):
+    text = "[Slide 1]\nShort intro.\n[Slide 2]\n" + "word " * 120 + "end.\n[Slide 3]\nTail."
+    pieces = [text[a:b] for a, b in chunking.chunk_spans(text, mode)]
+    assert not any(re.fullmatch(r"\[Slide \d+\]", p.strip()) for p in pieces)
+    assert pieces[0] == "[Slide 1]\nShort intro."
+    assert pieces[1].startswith("[Slide 2]\nword word")
+    assert pieces[-1] == "[Slide 3]\nTail."
+
+def test_fixed_mode_windows(monkeypatch):
+    monkeypatch.setattr(chunking, "CHUNK_SIZE", 100)
+    monkeypatch.setattr(chunking, "CHUNK_OVERLAP", 20)
+    spans = chunking.chunk_spans("x" * 250, "fixed")
+    assert spans == [(0, 100), (80, 180), (160, 250), (240, 250)]
@@ -0,0 +1,66 @@
+import pytest
+
+from src import embed_cache, llm
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBED_CACHE", "1")
+    monkeypatch.setattr(embed_cache, "CACHE_PATH", str(tmp_path / "embed_cache.sqlite3"))
+    monkeypatch.setattr(embed_cache, "_conn", None)
+    monkeypatch.setattr(embed_cache, "_counters", {"hits": 0, "misses": 0, "writes": 0, "evictions": 0})
+    calls = []
+    fake = llm._embed_uncached                                  # the suite's word-hash embedder
+
+    def embed(texts, provider, task_type):
+        calls.append(list(texts))
+        return fake(texts, provider, task_type)
+
+    monkeypatch.setattr(llm, "_embed_uncached", embed)
+    yield calls
+    if embed_cache._conn is not None:
+        embed_cache._conn.close()
+
+def test_hits_skip_the_embedder(cache):
+    first = llm.embed_texts(["apple pie", "banana bread", "apple pie"])
+    assert cache == [["apple pie", "banana bread"]]           # duplicates embedded once
+    again = llm.embed_texts(["banana bread", "cherry tart", "apple pie"])
+    assert cache[1:] == [["cherry tart"]]
+    assert again[0] == pytest.approx(first[1]) and again[2] == pytest.approx(first[0])
+
+    s = embed_cache.stats()
+    assert s["process"]["hits"] == 2 and s["process"]["misses"] == 4
+    assert s["total"]["entries"] == 3
+
+def test_task_type_is_part_of_the_key(cache):
+    llm.embed_texts(["apple pie"], task_type="retrieval_document")
+    llm.embed_texts(["apple pie"], task_type="retrieval_query")
+    assert len(cache) == 2
+    llm.embed_texts(["apple pie"], task_type="retrieval_query")
+    assert len(cache) == 2
+
+def test_disabled_cache_is_bypassed(cache, monkeypatch):
+    monkeypatch.setenv("EMBED_CACHE", "0")
+    llm.embed_texts(["apple pie"])
+    llm.embed_texts(["apple pie"])
+    assert len(cache) == 2 and embed_cache._conn is None
+
+def test_least_recently_used_are_evicted(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embed_cache.time, "time", lambda: now[0])
+    vec = 64 * 4                                               # bytes per float32 vector
+    monkeypatch.setattr(embed_cache, "CACHE_MAX_MB", 4.5 * vec / (1024 * 1024))
+
+    for word in ("one", "two", "three", "four"):
+        now[0] += 1
+        llm.embed_texts([word])
+    now[0] += 1
+    llm.embed_texts(["one"])                                  # touch: "two" is now the oldest
+    now[0] += 1
+    llm.embed_texts(["five"])                                 # 5 vectors > 4.5: trim to under 4.05
+
+    s = embed_cache.stats()
+    assert s["process"]["evictions"] == 1
+    assert s["total"]["entries"] == 4 and s["total"]["bytes"] == 4 * vec
+    del cache[:]
+    llm.embed_texts(["one", "two", "three", "four", "five"])
+    assert cache == [["two"]]
@@ -0,0 +1,93 @@
+import json
+import time
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.embed_scheduler import TokenBucket, plan_batches, run_batched, is_retryable
+
+@pytest.fixture
+def endpoint():
+    """
+    Local fake embedding endpoint: POST {"texts": [...]} -> {"embeddings": [[...], ...]}.
+    `fail` holds status codes to answer with before succeeding; every request is logged.
+    """
+    state = {"fail": [], "requests": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            state["requests"].append((time.monotonic(), body["texts"]))
+            if state["fail"]:
+                self.send_response(state["fail"].pop(0))
+                self.end_headers()
+                return
+            out = json.dumps({"embeddings": [[float(len(t)), 1.0] for t in body["texts"]]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def embed_batch(texts):
+        req = urllib.request.Request(f"http://127.0.0.1:{server.server_port}/embed",
+                                     data=json.dumps({"texts": texts}).encode(),
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=5) as res:   # HTTPError carries .code
+            return json.loads(res.read())["embeddings"]
+
+    yield embed_batch, state
+    server.shutdown()
+
+def test_batches_respect_text_and_size_limits(endpoint):
+    embed_batch, state = endpoint
+    texts = [f"text {i} " + "x" * (i * 7 % 50) for i in range(40)]
+    vecs = run_batched(texts, embed_batch, max_texts=8, max_chars=120, concurrency=3, base_delay=0.01)
+
+    assert [v[0] for v in vecs] == [float(len(t)) for t in texts]   # input order
+    sent = [batch for _t, batch in state["requests"]]
+    assert sum(len(b) for b in sent) == len(texts)
+    assert all(len(b) <= 8 and (len(b) == 1 or sum(map(len, b)) <= 120) for b in sent)
+
+def test_oversized_text_gets_its_own_batch():
+    assert plan_batches(["a" * 10, "b" * 500, "c"], max_texts=10, max_chars=100) == [(0, 1), (1, 2), (2, 3)]
+
+def test_retries_after_429_and_5xx(endpoint):
+    embed_batch, state = endpoint
+    state["fail"] = [429, 503]
+    vecs = run_batched(["a", "bb"], embed_batch, base_delay=0.01, max_delay=0.02)
+    assert vecs == [[1.0, 1.0], [2.0, 1.0]]
+    assert len(state["requests"]) == 3
+
+def test_no_retry_on_client_error(endpoint):
+    embed_batch, state = endpoint
+    state["fail"] = [400]
+    with pytest.raises(Exception) as err:
+        run_batched(["a"], embed_batch, base_delay=0.01)
+    assert getattr(err.value, "code", None) == 400 and not is_retryable(err.value)
+    assert len(state["requests"]) == 1
+
+def test_gives_up_after_the_retry_budget(endpoint):
+    embed_batch, state = endpoint
+    state["fail"] = [500] * 10
+    with pytest.raises(Exception):
+        run_batched(["a"], embed_batch, retries=2, base_delay=0.01, max_delay=0.02)
+    assert len(state["requests"]) == 3
+
+def test_rate_limit_is_respected(endpoint):
+    embed_batch, state = endpoint
+    rate = 20.0
+    run_batched([f"t{i}" for i in range(6)], embed_batch, max_texts=1, concurrency=4,
+                bucket=TokenBucket(rate, capacity=1))
+    stamps = sorted(t for t, _b in state["requests"])
+    assert len(stamps) == 6
+    # one token up front, then one every 1/rate seconds (small slack for timer jitter)
+    assert stamps[-1] - stamps[0] >= (len(stamps) - 1) / rate * 0.9
@@ -0,0 +1,30 @@
+from src.indexer import add_document, search, lexical_search
+from src.retriever import fuse, retrieve
+
+def _add(path, text):
+    add_document(str(path), text, {"source": "file", "path": str(path), "dir": str(path.parent),
+                                   "type": "text", "ext": ".txt"})
+
+def test_exact_identifier_found_by_bm25_ranks_first(tmp_path):
+    # short notes that mention "err" and "203" as separate words win the dense side
+    for i in range(6):
+        _add(tmp_path / f"note{i}.txt", f"Err 203 startup note {i}.")
+    target = tmp_path / "codes.txt"
+    _add(target, "Error reference. ERR-203 means the cache volume is full; free space and restart. "
+                 "Other codes are listed in the operations handbook with their usual remedies, "
+                 "escalation contacts, dashboards and the history of past incidents.")
+    where = {"dir": str(tmp_path)}
+
+    dense = search("ERR-203", top_k=3, where=where)
+    lexical = lexical_search("ERR-203", top_k=3, where=where)
+    assert str(target) not in [m["path"] for _d, m in dense]
+    assert [m["path"] for _d, m in lexical] == [str(target)]
+
+    hits = retrieve("ERR-203", 3, where)
+    assert hits[0][1]["path"] == str(target)
+    assert "ERR-203" in hits[0][0]
+
+def test_rrf_rewards_agreement():
+    a, b, c = ("a", {"chunk": 0, "doc_id": "a"}), ("b", {"chunk": 0, "doc_id": "b"}), ("c", {"chunk": 0, "doc_id": "c"})
+    # "b" is second in both lists and beats each list's own winner
+    assert [d for d, _m in fuse([[a, b], [c, b]])] == ["b", "a", "c"]
@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("pytesseract")
+from PIL import Image
+
+from src.extractors import image_extractor as ie
+
+@pytest.fixture
+def tesseract(monkeypatch):
+    """Fake Tesseract: confidence per (orientation, psm); records every call."""
+    calls = []
+    conf = {}
+
+    def fake_conf(img, psm):
+        shape = "wide" if img.size[0] > img.size[1] else "tall"
+        calls.append(("data", shape, psm))
+        return conf.get((shape, psm), 0.0)
+
+    def fake_pass(img, psm):
+        shape = "wide" if img.size[0] > img.size[1] else "tall"
+        calls.append(("string", shape, psm))
+        return f"Invoice 42\n{shape} psm {psm}"
+
+    monkeypatch.setattr(ie, "_tesseract_conf", fake_conf)
+    monkeypatch.setattr(ie, "_tesseract_pass", fake_pass)
+    monkeypatch.setattr(ie, "_detect_rotation", lambda img: None)
+    return calls, conf
+
+def _image():
+    return Image.new("RGB", (300, 200), "white")
+
+def test_confident_first_pass_stops_at_once(tesseract):
+    calls, conf = tesseract
+    conf[("wide", 6)] = 92
+    assert ie._tesseract_image(_image()) == "Invoice 42\nwide psm 6"
+    assert calls == [("data", "wide", 6), ("string", "wide", 6)]
+
+def test_no_text_hands_over_without_full_grid(tesseract):
+    calls, _conf = tesseract
+    assert ie._tesseract_image(_image()) == ""
+    assert len(calls) == 4 and all(kind == "data" for kind, _s, _p in calls)
+
+def test_weak_text_probes_other_rotations_at_best_psm(tesseract):
+    calls, conf = tesseract
+    conf[("wide", 3)] = 40
+    conf[("tall", 3)] = 65
+    assert ie._tesseract_image(_image()) == "Invoice 42\ntall psm 3"
+    rotation_probes = calls[4:-1]
+    assert len(rotation_probes) == 3 and {p for _k, _s, p in rotation_probes} == {3}
+    assert calls[-1] == ("string", "tall", 3)
+    assert len(calls) == 8
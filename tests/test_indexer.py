@@ -0,0 +1,26 @@
+from src import indexer, registry
+from src.indexer import add_document, delete_by_prefix, search, lexical_search
+from src.retriever import retrieve
+
+def test_write_invalidates_cached_results(tmp_path):
+    where = {"dir": str(tmp_path)}
+    meta = {"source": "file", "dir": str(tmp_path), "type": "text", "ext": ".txt"}
+    first = str(tmp_path / "first.txt")
+    add_document(first, "Harbor cranes unload containers at night.", {**meta, "path": first})
+
+    before = search("quokka habitat", top_k=5, where=where)
+    before_lex = lexical_search("quokka habitat", top_k=5, where=where)
+    assert [m["path"] for _d, m in before] == [first] and before_lex == []
+    gen = registry.generation(indexer.COLL_NAME)
+
+    second = str(tmp_path / "second.txt")
+    add_document(second, "The quokka habitat is Rottnest Island.", {**meta, "path": second})
+    assert registry.generation(indexer.COLL_NAME) > gen
+
+    after = search("quokka habitat", top_k=5, where=where)
+    assert {m["path"] for _d, m in after} == {first, second}
+    assert [m["path"] for _d, m in lexical_search("quokka habitat", top_k=5, where=where)] == [second]
+    assert retrieve("quokka habitat", 1, where)[0][1]["path"] == second
+
+    delete_by_prefix(second)
+    assert [m["path"] for _d, m in search("quokka habitat", top_k=5, where=where)] == [first]
@@ -0,0 +1,81 @@
+from src import ingest, manifest
+from src.indexer import find_docs
+
+def _boom(path):
+    raise RuntimeError("parser crashed")
+
+def test_unchanged_files_are_skipped(tmp_path, docs):
+    first = ingest.ingest_path(str(tmp_path))
+    assert first["new"] == len(docs) and first["files_ingested"] == len(docs)
+
+    second = ingest.ingest_path(str(tmp_path))
+    assert second["unchanged"] == len(docs) and second["files_ingested"] == 0
+    assert all(r["skipped"] == "unchanged" for r in second["results"])
+
+    docs[0].write_text("Rewritten notes about omega.\n")
+    third = ingest.ingest_path(str(tmp_path))
+    assert third["changed"] == 1 and third["unchanged"] == len(docs) - 1
+
+def test_force_reindexes_unchanged_files(tmp_path, docs):
+    ingest.ingest_path(str(tmp_path))
+    again = ingest.ingest_path(str(tmp_path), force=True)
+    assert again["files_ingested"] == len(docs)
+    assert {r["status"] for r in again["results"]} == {"unchanged"}
+
+def test_settings_change_reindexes(tmp_path, docs, monkeypatch):
+    ingest.ingest_path(str(tmp_path))
+    monkeypatch.setattr(ingest, "META_SCHEMA", ingest.META_SCHEMA + 1)
+    again = ingest.ingest_path(str(tmp_path))
+    assert again["changed"] == len(docs)
+
+def test_empty_file_is_recorded(tmp_path):
+    p = tmp_path / "empty.txt"
+    p.write_text("   \n")
+    res = ingest.ingest_path(str(tmp_path))["results"][0]
+    assert res["skipped"] == "no text extracted"
+    assert manifest.check(str(p), ingest._ingest_settings(".txt"))[0] == "unchanged"
+
+def test_failed_extraction_is_not_recorded(tmp_path, docs, monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(ingest, "_extract_text", _boom)
+        res = ingest.ingest_path(str(tmp_path))["results"][0]
+    assert res["skipped"].startswith("extract failed: parser crashed")
+    assert manifest.check(str(docs[0]), ingest._ingest_settings(".txt"))[0] == "new"
+
+    retry = ingest.ingest_path(str(tmp_path))
+    assert retry["new"] == len(docs) and retry["files_ingested"] == len(docs)
+
+def test_failed_reextraction_keeps_indexed_chunks(tmp_path, docs, monkeypatch):
+    ingest.ingest_path(str(tmp_path))
+    monkeypatch.setattr(ingest, "_extract_text", _boom)
+    again = ingest.ingest_path(str(tmp_path), force=True)
+    assert all(r["skipped"].startswith("extract failed") for r in again["results"])
+    assert str(docs[0]) in find_docs(str(docs[0]))
+    assert manifest.check(str(docs[0]), ingest._ingest_settings(".txt"))[0] == "unchanged"
+
+def test_manifest_is_safe_across_threads(tmp_path):
+    import threading
+    files = []
+    for i in range(40):
+        p = tmp_path / f"t{i}.txt"
+        p.write_text(f"file {i}")
+        files.append(p)
+    settings, errors = ingest._ingest_settings(".txt"), []
+
+    def work(part):
+        try:
+            for p in part:
+                status, fp = manifest.check(str(p), settings)
+                manifest.record(str(p), settings, 1, fp)
+                assert manifest.check(str(p), settings)[0] == "unchanged"
+                manifest.forget(str(p))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(files[i::8],)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert all(manifest.check(str(p), settings)[0] == "new" for p in files)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from src import ivfpq
+from src.ivfpq import IVFPQStore
+from src.vector_store import FlatStore
+
+N, DIM = 3000, 64
+
+def _data(seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((60, DIM)).astype(np.float32)
+    X = centers[rng.integers(0, 60, N)] + 0.5 * rng.standard_normal((N, DIM)).astype(np.float32)
+    Q = X[rng.choice(N, 100)] + 0.3 * rng.standard_normal((100, DIM)).astype(np.float32)
+    return X, Q
+
+@pytest.fixture
+def approximate(monkeypatch):
+    # few lists and a short shortlist, so the search really is approximate
+    monkeypatch.setattr(ivfpq, "IVF_NPROBE", 4)
+    monkeypatch.setattr(ivfpq, "IVF_RERANK", 20)
+
+@pytest.fixture
+def trained(tmp_path, approximate):
+    X, Q = _data()
+    s = IVFPQStore(str(tmp_path / "ivf"))
+    s.upsert(ids=[f"v{i}" for i in range(N)], embeddings=X,
+             metadatas=[{"type": "pdf" if i % 2 else "text", "doc_id": f"d{i % 50}"} for i in range(N)])
+    info = s.train(m=16)
+    assert info["vectors"] == N and info["m"] == 16
+    return s, X, Q
+
+def _recall(a, e):
+    return np.mean([len(set(x) & set(y)) / len(y) for x, y in zip(a, e)])
+
+def test_untrained_is_exact_and_training_needs_data(tmp_path):
+    X, _Q = _data()
+    s = IVFPQStore(str(tmp_path / "ivf"))
+    s.upsert(ids=[f"v{i}" for i in range(100)], embeddings=X[:100])
+    assert s.query(query_embeddings=X[42:43], n_results=1)["ids"][0] == ["v42"]
+    with pytest.raises(ValueError):
+        s.train()
+
+def test_recall_after_training(trained, tmp_path):
+    s, _X, Q = trained
+    exact = FlatStore(str(tmp_path / "ivf")).query(query_embeddings=Q, n_results=10)["ids"]
+    approx = s.query(query_embeddings=Q, n_results=10)["ids"]
+    assert _recall(approx, exact) >= 0.9
+    assert s.recall(n_queries=100) >= 0.9
+
+def test_writes_after_training_are_encoded(trained):
+    s, X, _Q = trained
+    new = X[:5] + 0.01
+    s.upsert(ids=[f"n{i}" for i in range(5)], embeddings=new)
+    assert (np.asarray(s._lists[s._rows - 5:s._rows]) > 0).all()
+    assert s.query(query_embeddings=new[2:3], n_results=1)["ids"][0] == ["n2"]
+    s.delete(ids=["n2", "v2"])
+    assert not {"n2", "v2"} & set(s.query(query_embeddings=new[2:3], n_results=10)["ids"][0])
+
+@pytest.mark.parametrize("where", [
+    {"$and": [{"type": {"$in": ["pdf"]}}, {"doc_id": {"$in": ["d1", "d3"]}}]},   # selective: exact path
+    {"type": {"$in": ["pdf", "image"]}},                                       # broad: IVF path
+])
+def test_where_is_respected(trained, where):
+    s, X, _Q = trained
+    res = s.query(query_embeddings=X[1:2], n_results=10, where=where)
+    assert res["ids"][0][0] == "v1"
+    for m in res["metadatas"][0]:
+        assert m["type"] == "pdf"
+        assert "$and" not in where or m["doc_id"] in ("d1", "d3")
+
+def test_other_instance_picks_up_the_model(tmp_path, approximate):
+    X, Q = _data()
+    s = IVFPQStore(str(tmp_path / "ivf"))
+    s.upsert(ids=[f"v{i}" for i in range(N)], embeddings=X)
+    other = IVFPQStore(str(tmp_path / "ivf"))
+    assert other._model is None
+    s.train(m=16)
+    exact = FlatStore(str(tmp_path / "ivf")).query(query_embeddings=Q, n_results=10)["ids"]
+    assert _recall(other.query(query_embeddings=Q, n_results=10)["ids"], exact) >= 0.9
+    assert other._model is not None and other._lists is not None
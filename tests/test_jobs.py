@@ -0,0 +1,47 @@
+import pytest
+
+from src import ingest, jobs
+
+@pytest.fixture(autouse=True)
+def empty_queue():
+    """run_one takes the oldest pending job, so start every test with none pending."""
+    for job in jobs.list_jobs("pending", limit=10000):
+        jobs.cancel(job["id"])
+
+def test_same_target_is_deduped_and_merged(tmp_path):
+    first = jobs.submit("path", str(tmp_path), workers=1)
+    again = jobs.submit("path", str(tmp_path), force=True, workers=2, preview=100)
+    assert again["deduped"] and again["id"] == first["id"]
+    assert again["options"] == {"force": True, "workers": 2, "preview": 100}
+    pending = [j for j in jobs.list_jobs("pending", limit=10000) if j["target"] == str(tmp_path)]
+    assert len(pending) == 1
+
+def test_cancel_pending_job(tmp_path):
+    job = jobs.submit("path", str(tmp_path))
+    assert jobs.cancel(job["id"])["status"] == "cancelled"
+    again = jobs.submit("path", str(tmp_path))
+    assert again["id"] != job["id"] and "deduped" not in again
+
+def test_run_one_ingests_the_target(tmp_path, docs):
+    job = jobs.submit("path", str(tmp_path))
+    done = jobs.run_one()
+    assert done["id"] == job["id"] and done["status"] == "done" and done["progress"] == 1.0
+    assert done["result"]["files_ingested"] == len(docs)
+    assert jobs.run_one() is None
+
+def test_cancel_running_job_stops_between_files(tmp_path, docs, monkeypatch):
+    job = jobs.submit("path", str(tmp_path))
+    real = ingest._index_job
+    def index_then_cancel(*args, **kwargs):
+        res = real(*args, **kwargs)
+        jobs.cancel(job["id"])   # arrives while the job is running
+        return res
+    monkeypatch.setattr(ingest, "_index_job", index_then_cancel)
+
+    done = jobs.run_one()
+    assert done["status"] == "cancelled" and done["cancel"]
+    assert 0 < done["result"]["files_scanned"] < len(docs)
+
+def test_unknown_kind_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        jobs.submit("ftp", str(tmp_path))
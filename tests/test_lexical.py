@@ -0,0 +1,35 @@
+import itertools
+
+from src import lexical
+from src.indexer import matches_where
+
+def _index(collection, metas, text="alpha beta gamma"):
+    for i, meta in enumerate(metas):
+        lexical.index_document(collection, f"doc{i}", [f"doc{i}-0"], [text], [meta])
+
+def test_narrow_filter_keeps_full_recall():
+    metas = [{"source": "file", "dir": "/rare" if i % 50 == 0 else "/common", "path": f"/x/{i}.txt"}
+             for i in range(500)]
+    _index("narrow", metas)
+    hits = lexical.search("narrow", "alpha", top_k=6, where={"dir": "/rare"})
+    assert len(hits) == 6 and {m["dir"] for _c, _d, m, _s in hits} == {"/rare"}
+
+def test_filters_match_matches_where():
+    metas = [{"source": s, "type": t, "ext": e, "path": f"/d/{n}{e}"}
+             for n, (s, t, e) in enumerate(itertools.product(("file", "youtube"), ("text", "image"), (".txt", ".png")))]
+    metas.append({"source": "youtube", "url": "https://youtube.com/watch?v=1", "url_host": "youtube.com"})
+    _index("filters", metas)
+    wheres = [
+        {"source": "file"},
+        {"type": {"$ne": "image"}},
+        {"ext": {"$in": [".png"]}},
+        {"ext": {"$nin": [".png"]}},
+        {"path": {"$in": []}},
+        {"$and": [{"source": "youtube"}, {"type": "text"}]},
+        {"$or": [{"url_host": "youtube.com"}, {"path": {"$in": ["/d/0.txt", "/d/3.png"]}}]},
+        {"source": "file", "$or": [{"ext": ".txt"}, {"type": "image"}]},
+    ]
+    for where in wheres:
+        got = sorted(c for c, _d, _m, _s in lexical.search("filters", "alpha", top_k=100, where=where))
+        want = sorted(f"doc{i}-0" for i, m in enumerate(metas) if matches_where(m, where))
+        assert got == want, where
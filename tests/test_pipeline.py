@@ -0,0 +1,72 @@
+import threading
+
+from src import pipeline
+from src.ingest import ingest_path
+from src.pipeline import ingest_files
+
+def _stop_after(n):
+    calls = {"n": 0}
+    def stop():
+        calls["n"] += 1
+        return calls["n"] > n
+    return stop
+
+def _subsequence(part, whole):
+    it = iter(whole)
+    return all(x in it for x in part)
+
+def test_results_keep_file_order(docs):
+    results = ingest_files(docs, workers=2)
+    assert [r["path"] for r in results] == [str(p) for p in docs]
+    assert all(r["status"] == "new" and r["added_chunks"] for r in results)
+
+def test_same_shape_as_serial_ingest(tmp_path, docs):
+    serial = ingest_path(str(tmp_path), force=True, workers=1)
+    parallel = ingest_path(str(tmp_path), force=True, workers=2)
+    assert [r["path"] for r in serial["results"]] == [r["path"] for r in parallel["results"]]
+    assert [sorted(r) for r in serial["results"]] == [sorted(r) for r in parallel["results"]]
+
+def test_stop_leaves_out_unstarted_files(tmp_path, docs):
+    scan = [r["path"] for r in ingest_path(str(tmp_path))["results"]]
+    for workers in (1, 2):
+        res = ingest_path(str(tmp_path), force=True, workers=workers, stop=_stop_after(2))
+        paths = [r["path"] for r in res["results"]]
+        assert 0 < len(paths) < len(docs) and res["files_scanned"] == len(paths)
+        assert _subsequence(paths, scan)
+        assert all(r.get("added_chunks") for r in res["results"])
+
+def test_prepare_failure_does_not_stall_the_pipeline(docs, monkeypatch):
+    real = pipeline.prepare_document
+    def prepare(doc_id, *args, **kwargs):
+        if doc_id == str(docs[3]):
+            raise ValueError("bad document")
+        return real(doc_id, *args, **kwargs)
+    monkeypatch.setattr(pipeline, "prepare_document", prepare)
+
+    results = ingest_files(docs, workers=2, incremental=False)
+    assert len(results) == len(docs)
+    assert results[3]["skipped"] == "index failed: bad document"
+    assert all(r.get("added_chunks") for i, r in enumerate(results) if i != 3)
+
+def test_dead_embedder_raises_instead_of_hanging(docs, monkeypatch):
+    monkeypatch.setattr(pipeline, "_embedder", lambda in_q, out_q: None)   # exits without draining
+    outcome = {}
+
+    def run():
+        try:
+            outcome["results"] = ingest_files(docs, workers=1, incremental=False)
+        except Exception as e:
+            outcome["error"] = e
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    t.join(120)
+    assert not t.is_alive(), "ingest_files hung on a dead embedder thread"
+    assert isinstance(outcome.get("error"), RuntimeError)
+    assert "embedder" in str(outcome["error"])
+
+def test_preview_matches_serial_ingest(tmp_path, docs):
+    serial = ingest_path(str(tmp_path), force=True, workers=1, preview=20)
+    parallel = ingest_path(str(tmp_path), force=True, workers=2, preview=20)
+    assert [r["preview"] for r in parallel["results"]] == [r["preview"] for r in serial["results"]]
+    assert all(0 < len(r["preview"]) <= 20 for r in parallel["results"])
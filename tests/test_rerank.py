@@ -0,0 +1,68 @@
+import time
+import threading
+
+import pytest
+
+from src import rerank
+from src.query_cache import TTLCache
+
+class FakeCrossEncoder:
+    """Scores a pair by how often the query's words occur in the text; `ms` per pair."""
+
+    def __init__(self, ms: float = 0.0):
+        self.ms = ms
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        time.sleep(self.ms * len(pairs) / 1000)
+        return [sum(text.lower().count(w) for w in query.lower().split()) for query, text in pairs]
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeCrossEncoder()
+    monkeypatch.setattr(rerank, "_get_model", lambda: fake)
+    monkeypatch.setattr(rerank, "_scores", TTLCache(10000, 3600))
+    monkeypatch.setattr(rerank, "_ms_per_pair", None)
+    monkeypatch.setattr(rerank, "_skips", 0)
+    monkeypatch.setattr(rerank, "_counts", {"reranked": 0, "skipped_budget": 0, "failed": 0})
+    return fake
+
+def _hits(n, tag=""):
+    return [(f"chunk {i} {tag} " + "apple " * (i % 5), {"i": i}) for i in range(n)]
+
+def test_reorders_by_score(model):
+    out = rerank.rerank("apple", _hits(8), top_k=3)
+    assert [m["i"] for _d, m in out] == [4, 3, 2]
+    assert out[0][1]["rerank_score"] == 4
+
+def test_skips_over_budget_and_probes_every_nth(model, monkeypatch):
+    monkeypatch.setattr(rerank, "RERANK_BUDGET_MS", 5)
+    monkeypatch.setattr(rerank, "RERANK_PROBE_EVERY", 5)
+    model.ms = 2.0                                   # 10 pairs ~ 20 ms: over budget
+    for q in range(10):
+        rerank.rerank(f"apple {q}", _hits(10), top_k=3)
+    s = rerank.stats()
+    # the first query measures; after that only the 5th over-budget query is scored (a probe)
+    assert s["reranked"] == 2 and s["skipped_budget"] == 8
+
+    model.ms = 0.0                                   # the machine got fast again
+    for q in range(10, 20):
+        rerank.rerank(f"apple {q}", _hits(10), top_k=3)
+    assert rerank.stats()["ms_per_pair"] < 0.5
+    assert rerank.stats()["reranked"] > 5
+
+def test_concurrent_queries_keep_counters_consistent(model):
+    model.ms = 0.05
+    threads, per_thread = 8, 25
+
+    def worker(t):
+        for q in range(per_thread):
+            rerank.rerank(f"apple {t} {q}", _hits(6, tag=str(t)), top_k=2)
+
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    s = rerank.stats()
+    assert s["reranked"] + s["skipped_budget"] + s["failed"] == threads * per_thread
+    assert s["reranked"] == threads * per_thread        # well within the default budget
@@ -0,0 +1,31 @@
+from src.ingest import ingest_path
+from src.retriever import ask_many
+
+class _BrokenItem(dict):
+    def get(self, *args):
+        raise KeyError("broken")
+
+def test_ask_many_isolates_invalid_items(tmp_path, docs):
+    ingest_path(str(tmp_path))
+    items = [
+        "What are the notes about alpha?",
+        {"id": "b", "question": "What does the beta section explain?"},
+        42,
+        {"question": "gamma?", "top_k": "many"},
+        {"question": "gamma?", "where": "a folder"},
+        {"id": "blank", "question": "  "},
+        _BrokenItem(question="delta?"),
+        "What are the notes about kappa?",
+    ]
+    out = list(ask_many(items, top_k=2, where={"dir": str(tmp_path)}, batch=3))
+
+    assert [o["id"] for o in out] == [0, "b", 2, 3, 4, "blank", 6, 7]
+    errors = {o["id"]: o.get("error") for o in out}
+    assert errors[2].startswith("expected a question string or object")
+    assert errors[3] == "invalid top_k: 'many'"
+    assert errors[4] == "where must be an object"
+    assert errors[6] == "invalid item: 'broken'"
+    assert errors["blank"] == "missing question"
+    for o in (out[0], out[1], out[7]):
+        assert "error" not in o and o["answer"] and o["contexts"]
+    assert "kappa" in out[7]["contexts"][0][0]
@@ -0,0 +1,45 @@
+import pytest
+
+from src import jobs, server
+from src.server import HTTPError, _ingest, _job
+
+@pytest.fixture(autouse=True)
+def empty_queue():
+    for job in jobs.list_jobs("pending", limit=10000):
+        jobs.cancel(job["id"])
+
+@pytest.mark.parametrize("workers", ["x", -5, 0, True, 10_000, [2]])
+def test_invalid_workers_is_a_bad_request(tmp_path, workers):
+    with pytest.raises(HTTPError) as err:
+        _ingest({"path": str(tmp_path), "workers": workers})
+    assert err.value.status == 400 and "'workers'" in str(err.value)
+
+def test_ingest_queues_a_deduplicated_job(tmp_path):
+    first = _ingest({"path": str(tmp_path), "workers": "1"})
+    assert first["status"] == "pending" and first["kind"] == "path"
+    again = _ingest({"path": str(tmp_path), "force": True, "preview": 50})
+    assert again["deduped"] and again["id"] == first["id"]
+    assert again["options"] == {"force": True, "workers": 1, "preview": 50}
+
+def test_full_queue_rejects_new_targets_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "MAX_INGEST_QUEUE", 2)
+    queued = [_ingest({"path": str(tmp_path / f"d{i}")}) for i in range(2)]
+    with pytest.raises(HTTPError) as err:
+        _ingest({"path": str(tmp_path / "d9")})
+    assert err.value.status == 503
+    assert _ingest({"path": str(tmp_path / "d0")})["id"] == queued[0]["id"]
+
+def test_job_status_and_cancel(tmp_path):
+    job = _ingest({"path": str(tmp_path)})
+    assert _job({"id": job["id"]})["status"] == "pending"
+    assert _job({"id": job["id"], "cancel": True})["status"] == "cancelled"
+    with pytest.raises(HTTPError) as err:
+        _job({"id": 10 ** 9})
+    assert err.value.status == 404
+    with pytest.raises(HTTPError):
+        _job({"id": "abc"})
+
+def test_missing_target_is_a_bad_request():
+    with pytest.raises(HTTPError) as err:
+        _ingest({})
+    assert err.value.status == 400
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from src.vector_store import FlatStore, import_collection
+
+def _vecs(n, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+@pytest.fixture
+def store(tmp_path):
+    s = FlatStore(str(tmp_path / "flat"))
+    X = _vecs(30)
+    s.upsert(ids=[f"c{i}" for i in range(30)], embeddings=X, documents=[f"doc {i}" for i in range(30)],
+             metadatas=[{"type": ["pdf", "text", "image"][i % 3], "doc_id": f"d{i // 10}", "n": i} for i in range(30)])
+    return s, X
+
+def test_query_is_exact_cosine(store):
+    s, X = store
+    res = s.query(query_embeddings=X[7:8], n_results=3)
+    assert res["ids"][0][0] == "c7" and res["documents"][0][0] == "doc 7"
+    assert res["distances"][0][0] == pytest.approx(0.0, abs=1e-5)
+    assert res["distances"][0] == sorted(res["distances"][0])
+
+def test_upsert_replaces_in_place(store):
+    s, X = store
+    s.upsert(ids=["c7"], embeddings=X[20:21], documents=["moved"], metadatas=[{"type": "text"}])
+    assert s.count() == 30
+    res = s.query(query_embeddings=X[20:21], n_results=2)
+    assert set(res["ids"][0]) == {"c7", "c20"}
+    assert s.get(ids=["c7"])["documents"] == ["moved"]
+    with pytest.raises(ValueError):
+        s.upsert(ids=["bad"], embeddings=_vecs(1, dim=8))
+
+def test_where_and_in(store):
+    s, X = store
+    where = {"$and": [{"type": {"$in": ["pdf", "image"]}}, {"doc_id": "d1"}]}
+    want = {f"c{i}" for i in range(10, 20) if i % 3 != 1}
+    assert set(s.get(where=where)["ids"]) == want
+    res = s.query(query_embeddings=X[13:14], n_results=30, where=where)
+    assert set(res["ids"][0]) == want
+    assert all(m["type"] != "text" and m["doc_id"] == "d1" for m in res["metadatas"][0])
+    assert s.get(where={"type": {"$in": []}})["ids"] == []
+
+def test_delete_frees_rows_for_reuse(store):
+    s, X = store
+    s.delete(ids=["c0", "c1"])
+    s.delete(where={"doc_id": "d2"})
+    assert s.count() == 18
+    assert not {"c0", "c1", "c25"} & set(s.query(query_embeddings=X[:2], n_results=30)["ids"][0])
+    rows = s._rows
+    s.upsert(ids=["new"], embeddings=X[0:1])
+    assert s._rows == rows and s.count() == 19
+    assert s.query(query_embeddings=X[0:1], n_results=1)["ids"][0] == ["new"]
+
+def test_second_instance_sees_writes(store, tmp_path):
+    s, X = store
+    other = FlatStore(str(tmp_path / "flat"))
+    assert other.count() == 30
+    more = _vecs(2000, seed=1)          # grows the matrix past its first capacity
+    s.upsert(ids=[f"m{i}" for i in range(2000)], embeddings=more)
+    s.delete(ids=["c3"])
+    assert other.count() == 2029
+    assert other.query(query_embeddings=more[1500:1501], n_results=1)["ids"][0] == ["m1500"]
+    assert "c3" not in other.get(where={"doc_id": "d0"})["ids"]
+    other.upsert(ids=["from-other"], embeddings=X[3:4])
+    assert s.query(query_embeddings=X[3:4], n_results=1)["ids"][0] == ["from-other"]
+
+def test_reopen_and_import(store, tmp_path):
+    s, X = store
+    again = FlatStore(str(tmp_path / "flat"))
+    assert again.count() == 30
+    assert again.query(query_embeddings=X[5:6], n_results=1)["ids"][0] == ["c5"]
+    copy = FlatStore(str(tmp_path / "copy"), dtype="float16")
+    assert import_collection(again, copy, page=7) == 30
+    assert copy.query(query_embeddings=X[5:6], n_results=1)["ids"][0] == ["c5"]
+    assert copy.get(ids=["c5"])["metadatas"] == [{"type": "image", "doc_id": "d0", "n": 5}]
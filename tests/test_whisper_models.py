@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from src.extractors import whisper_models
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+
+    def fake_load(backend, size, device, compute_type):
+        time.sleep(0.01)
+        calls.append((backend, size, device, compute_type))
+        return object()
+
+    monkeypatch.setattr(whisper_models, "_load", fake_load)
+    monkeypatch.setattr(whisper_models, "_models", {})
+    monkeypatch.setenv("WHISPER_IDLE_TIMEOUT", "0")          # no reaper thread; tests call unload_idle
+    monkeypatch.setenv("WHISPER_MODEL", "base")
+    monkeypatch.setenv("WHISPER_DEVICE", "cpu")
+    monkeypatch.setenv("WHISPER_COMPUTE", "int8")
+    return calls
+
+def test_same_key_reuses_the_model(loads):
+    with whisper_models.use_model("faster") as a:
+        pass
+    with whisper_models.use_model("faster", "base", "cpu", "int8") as b:
+        pass
+    assert a is b and loads == [("faster", "base", "cpu", "int8")]
+
+    with whisper_models.use_model("faster", compute_type="float16") as c:
+        pass
+    with whisper_models.use_model("openai") as d:
+        pass
+    assert len({id(a), id(c), id(d)}) == 3
+    assert loads[1:] == [("faster", "base", "cpu", "float16"), ("openai", "base", "cpu", "int8")]
+
+def test_concurrent_first_use_loads_once(loads):
+    seen = []
+
+    def worker():
+        with whisper_models.use_model("faster") as m:
+            seen.append(m)
+
+    pool = [threading.Thread(target=worker) for _ in range(8)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    assert len(loads) == 1 and len({id(m) for m in seen}) == 1
+
+def test_idle_models_are_evicted(loads, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(whisper_models.time, "time", lambda: now[0])
+    with whisper_models.use_model("faster"):
+        pass
+    with whisper_models.use_model("openai"):
+        now[0] += 50
+        assert whisper_models.unload_idle(30) == 1         # the borrowed model stays
+    now[0] += 10
+    assert whisper_models.unload_idle(30) == 0             # openai was returned 10 s ago
+    now[0] += 30
+    assert whisper_models.unload_idle(30) == 1
+    assert whisper_models._models == {}
+
+    with whisper_models.use_model("faster"):
+        pass
+    assert loads.count(("faster", "base", "cpu", "int8")) == 2    # reloaded after eviction